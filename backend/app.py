@@ -1,17 +1,42 @@
+import json
 import os
-from flask import Flask, request, jsonify
+import time
+
+# Início da inicialização do módulo (relatado em /health como startup_seconds)
+_init_started = time.perf_counter()
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 import uuid
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 
 from models.schemas import VacationInfo, TravelPlan, TripHistory
-from services.ai_service import AIService
+from services.ai_service import AIService, PROMPT_MODES, OUTPUT_MODES
 from services.weather_service import WeatherService
 from services.activities_service import ActivitiesService
 from services.image_service import ImageService
+from services.gathering_service import ContextGatherer
+from services.planning_service import ActivityPlanner, PLANNER_MODES
+from services.batch_service import BatchItineraryRunner
+from services.model_router import GeminiBackend, ModelRouter, OpenAIBackend
+from services.job_service import JobQueue, QueueFullError
 from utils.validators import TripValidator
+from utils.interests import aggregate_interests
+from storage.trip_store import TripConflictError, TripStore
+from storage.job_store import JobStore
+from utils.http_client import http_clients_health
+from utils.singleflight import singleflight_stats
+from utils.cache import build_cache
+from utils.dates import date_range
+from utils.fingerprint import vacation_fingerprint
+from utils.rate_limiter import RateLimitExceeded, llm_priority, rate_limiter_stats
+from utils.prompts import prompt_template_stats
+from utils.webhooks import InvalidCallbackURL
+from utils.metrics import (
+    HTTP_DURATION, process_stats, registry, render_counter, render_gauge, request_timings, server_timing_header,
+    stage_span, start_request_timings, upstream_health
+)
 
 load_dotenv()
 
@@ -19,20 +44,366 @@ app = Flask(__name__)
 CORS(app)
 
 # Inicializar serviços
-ai_service = AIService(
-    api_key=os.getenv("OPENAI_API_KEY"),
-    base_url=os.getenv("OPENAI_BASE_URL")
-)
-weather_service = WeatherService()
-activities_service = ActivitiesService()
-image_service = ImageService()
+if os.getenv("FAKE_BACKENDS", "false").lower() == "true":
+    # Upstreams simulados e offline, para desenvolvimento e benchmarks
+    from services.fake_backends import (
+        FakeAsyncHTTPClient, FakeAsyncOpenAIClient, FakeBehavior, FakeGeminiClient, FakeHTTPClient, FakeOpenAIClient
+    )
+
+    fake_behavior = FakeBehavior(
+        latency_ms=float(os.getenv("FAKE_LATENCY_MS", "50")),
+        jitter_ms=float(os.getenv("FAKE_JITTER_MS", "10")),
+        error_rate=float(os.getenv("FAKE_ERROR_RATE", "0")),
+        seed=int(os.getenv("FAKE_SEED", "42")),
+        malformed_rate=float(os.getenv("FAKE_MALFORMED_RATE", "0")),
+        upstream_latency_ms={
+            upstream.strip(): float(latency)
+            for upstream, _, latency in (
+                item.partition(":") for item in os.getenv("FAKE_UPSTREAM_LATENCY_MS", "").split(",") if item.strip()
+            )
+        }
+    )
+    model_router = ModelRouter.from_env({
+        "openai": OpenAIBackend(
+            "fake", client=FakeOpenAIClient(fake_behavior), async_client=FakeAsyncOpenAIClient(fake_behavior)
+        ),
+        "gemini": GeminiBackend("fake", client=FakeGeminiClient(fake_behavior))
+    })
+    ai_service = AIService(api_key="fake", router=model_router)
+    weather_service = WeatherService(
+        api_key="fake",
+        http_client=FakeHTTPClient("openweather", fake_behavior),
+        async_http_client=FakeAsyncHTTPClient("openweather", fake_behavior)
+    )
+    activities_service = ActivitiesService(router=model_router)
+    image_service = ImageService(
+        unsplash_access_key="fake",
+        http_client=FakeHTTPClient("unsplash", fake_behavior),
+        async_http_client=FakeAsyncHTTPClient("unsplash", fake_behavior)
+    )
+else:
+    fake_behavior = None
+    # Roteador de modelos compartilhado: cada tarefa pode ser atendida por qualquer provedor configurado
+    model_router = ModelRouter.from_env({
+        "openai": OpenAIBackend(os.getenv("OPENAI_API_KEY"), os.getenv("OPENAI_BASE_URL")),
+        "gemini": GeminiBackend(os.getenv("GEMINI_API_KEY"))
+    })
+    ai_service = AIService(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        base_url=os.getenv("OPENAI_BASE_URL"),
+        router=model_router
+    )
+    weather_service = WeatherService()
+    activities_service = ActivitiesService(router=model_router)
+    image_service = ImageService()
+context_gatherer = ContextGatherer(weather_service, activities_service, image_service)
+activity_planner = ActivityPlanner(weather_service)
+BATCH_MAX_TRIPS = int(os.getenv("BATCH_MAX_TRIPS", "100"))
+# Quem escolhe as atividades do plano: llm, solver ou offline
+DEFAULT_PLANNER_MODE = os.getenv("ITINERARY_PLANNER_MODE", "llm")
+
+trip_store = TripStore.from_env()
+job_queue = JobQueue(JobStore.from_env())
+# Cache de planos completos (desativado por padrão: PLAN_CACHE_BACKEND=none)
+plan_cache = build_cache("plan", default_ttl=3600, default_max_entries=500, default_backend="none")
 
-trip_history: Dict[str, TripHistory] = {}
+# Cabeçalho Server-Timing com a duração de cada etapa da requisição
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "false").lower() == "true"
+
+@app.before_request
+def _start_request_metrics():
+    g.request_started = time.perf_counter()
+    start_request_timings()
+
+@app.after_request
+def _record_request_metrics(response):
+    elapsed = time.perf_counter() - g.get("request_started", time.perf_counter())
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    HTTP_DURATION.observe(elapsed, endpoint=endpoint, method=request.method, status=response.status_code)
+    if SERVER_TIMING_ENABLED:
+        response.headers["Server-Timing"] = server_timing_header(request_timings() + [("total", elapsed)])
+    return response
+
+def _upstreams_health() -> Tuple[Dict[str, Dict], bool]:
+    """Saúde por serviço externo (chamadas, erros, latência e circuito) e se algum está degradado"""
+    circuits = http_clients_health()
+    calls = upstream_health()
+    upstreams = {}
+    for name in sorted(set(circuits) | set(calls)):
+        upstreams[name] = dict(calls.get(name, {}))
+        if name in circuits:
+            upstreams[name]["circuit"] = circuits[name]
+
+    degraded = any(
+        upstream.get("circuit", {}).get("state") == "open" or upstream.get("consecutive_errors", 0) >= 5
+        for upstream in upstreams.values()
+    )
+    return upstreams, degraded
 
 @app.route("/health", methods=["GET"])
 def health_check():
     """Endpoint de verificação da API"""
-    return jsonify({"status": "healthy", "timestamp": datetime.now().isoformat()})
+    upstreams, degraded = _upstreams_health()
+    return jsonify({
+        "status": "degraded" if degraded else "healthy",
+        "timestamp": datetime.now().isoformat(),
+        "caches": {
+            "weather": weather_service.cache_stats(),
+            "activities": activities_service.store.stats() if activities_service.store else None,
+            "images": image_service.cache_stats(),
+            "plans": plan_cache.stats()
+        },
+        "trip_store": trip_store.stats(),
+        "upstreams": upstreams,
+        "coalescing": singleflight_stats(),
+        "rate_limits": rate_limiter_stats(),
+        "models": model_router.stats(),
+        "prompts": prompt_template_stats(),
+        "jobs": job_queue.stats(),
+        "process": process_stats(STARTUP_SECONDS),
+        "fake_backends": fake_behavior.snapshot() if fake_behavior else None
+    })
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Métricas no formato texto do Prometheus"""
+    job_stats = job_queue.stats()
+    caches = {
+        "weather": weather_service.cache_stats(),
+        "images": image_service.cache_stats(),
+        "plans": plan_cache.stats()
+    }
+    body = registry.render()
+    body += render_gauge("agentsville_jobs", "Jobs assíncronos por estado", [
+        ({"state": "queued"}, job_stats["queue_depth"]),
+        ({"state": "running"}, job_stats["running"])
+    ])
+    body += render_counter("agentsville_cache_lookups_total", "Consultas aos caches desde o início do processo", [
+        ({"cache": name, "result": result}, stats.get(result))
+        for name, stats in caches.items() for result in ("hits", "misses")
+    ])
+    process = process_stats(STARTUP_SECONDS)
+    body += render_gauge("agentsville_process_startup_seconds", "Tempo de inicialização do app", [
+        ({}, process["startup_seconds"])
+    ])
+    body += render_gauge("agentsville_process_max_rss_bytes", "Pico de memória residente do processo", [
+        ({}, process["max_rss_bytes"])
+    ])
+    return Response(body, mimetype="text/plain; version=0.0.4")
+
+def _trip_dates(vacation_info: VacationInfo) -> List[str]:
+    """Retorna as datas da viagem no formato YYYY-MM-DD"""
+    return date_range(vacation_info.date_of_arrival, vacation_info.date_of_departure)
+
+def _pin_plan_activities(travel_plan: TravelPlan):
+    """Fixa no catálogo as atividades usadas pelo plano salvo, para que sigam consultáveis pelo id"""
+    activities_service.pin_activities([
+        recommendation.activity.activity_id
+        for day in travel_plan.itinerary_days
+        for recommendation in day.activity_recommendations
+    ])
+
+def _finalize_travel_plan(vacation_info: VacationInfo, travel_plan: TravelPlan, context: Dict,
+                          planning_errors: Optional[List[str]] = None) -> Dict:
+    """Valida o plano gerado e, se estiver correto, salva no histórico"""
+    with stage_span("validate"):
+        plan_validation_errors = (planning_errors or []) + TripValidator.validate_travel_plan(vacation_info, travel_plan)
+    if plan_validation_errors:
+        return {
+            "warning": "Plano gerado com problemas",
+            "validation_errors": plan_validation_errors,
+            "travel_plan": travel_plan.model_dump()
+        }
+    
+    # Salvar no histórico
+    trip_id = str(uuid.uuid4())
+    with stage_span("save"):
+        trip_store.save(TripHistory(
+            id=trip_id,
+            vacation_info=vacation_info,
+            travel_plan=travel_plan,
+            created_at=datetime.now()
+        ))
+        _pin_plan_activities(travel_plan)
+    
+    return {
+        "trip_id": trip_id,
+        "travel_plan": travel_plan.model_dump(),
+        "destination_images": context["gallery"],
+        "weather_forecast": context["weather"]
+    }
+
+def _invalid_mode_error(prompt_mode: Optional[str], output_mode: Optional[str],
+                        planner_mode: Optional[str] = None) -> Optional[Dict]:
+    """Retorna o corpo do erro se algum modo de prompt informado for inválido"""
+    if (
+        (prompt_mode and prompt_mode not in PROMPT_MODES)
+        or (output_mode and output_mode not in OUTPUT_MODES)
+        or (planner_mode and planner_mode not in PLANNER_MODES)
+    ):
+        return {
+            "error": "Modo de prompt inválido",
+            "details": {
+                "prompt_mode": list(PROMPT_MODES),
+                "output_mode": list(OUTPUT_MODES),
+                "planner": list(PLANNER_MODES)
+            }
+        }
+    return None
+
+def _invalid_mode_response(prompt_mode: Optional[str], output_mode: Optional[str],
+                           planner_mode: Optional[str] = None):
+    """Retorna a resposta de erro se algum modo de prompt informado for inválido"""
+    error = _invalid_mode_error(prompt_mode, output_mode, planner_mode)
+    return (jsonify(error), 400) if error else None
+
+@app.errorhandler(RateLimitExceeded)
+def _rate_limited_response(e: RateLimitExceeded):
+    """Resposta 429 quando a chamada ao LLM é recusada por cota (limitador local ou 429 do provedor)"""
+    response = jsonify({"error": str(e), "retry_after": e.retry_after})
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response, 429
+
+def _plan_with_solver(vacation_info: VacationInfo, context: Dict, interest_weights: Dict[str, int],
+                      planner_mode: str) -> Tuple[TravelPlan, Dict]:
+    """Seleciona as atividades com o otimizador local; no modo solver o LLM escreve só os motivos"""
+    with stage_span("solve"):
+        selection = activity_planner.select(
+            dates=_trip_dates(vacation_info),
+            budget=vacation_info.budget,
+            weather_data=context["weather"],
+            activities_data=context["activities"],
+            interest_weights=interest_weights
+        )
+    
+    reasons, usage = None, {"planner": planner_mode}
+    if planner_mode == "solver":
+        try:
+            with stage_span("reasons"):
+                reasons, reasons_usage = ai_service.write_recommendation_reasons(
+                    vacation_info, selection, context["weather"], interest_weights
+                )
+            usage.update(reasons_usage)
+        except Exception as e:
+            # Sem os motivos do modelo o plano continua válido, com motivos gerados localmente
+            print(f"Erro ao gerar motivos das recomendações: {e}")
+    
+    travel_plan = activity_planner.build_plan(
+        vacation_info, selection, context["weather"], interest_weights, reasons
+    )
+    usage["uncovered_interests"] = selection["uncovered_interests"]
+    if selection["unfunded_dates"]:
+        usage["unfunded_dates"] = selection["unfunded_dates"]
+        usage["budget_shortfall"] = selection["budget_shortfall"]
+    return travel_plan, usage
+
+def _run_itinerary_pipeline(vacation_info: VacationInfo, prompt_mode: Optional[str] = None,
+                            output_mode: Optional[str] = None, planner_mode: Optional[str] = None) -> Dict:
+    """Executa a coleta de contexto, a geração pelo LLM e a validação de um itinerário"""
+    # Agregar interesses dos viajantes (únicos, ordenados e com peso)
+    interest_weights = aggregate_interests(vacation_info.travelers)
+    
+    # Coletar clima, atividades e imagens em paralelo
+    with stage_span("gather"):
+        context = context_gatherer.gather(
+            city=vacation_info.destination,
+            dates=_trip_dates(vacation_info),
+            interests=list(interest_weights),
+            interest_weights=interest_weights
+        )
+    
+    return _generate_from_context(vacation_info, context, prompt_mode, output_mode, planner_mode)
+
+def _generate_from_context(vacation_info: VacationInfo, context: Dict, prompt_mode: Optional[str] = None,
+                           output_mode: Optional[str] = None, planner_mode: Optional[str] = None) -> Dict:
+    """Gera o plano a partir do contexto já coletado, valida e salva no histórico"""
+    planner_mode = planner_mode or DEFAULT_PLANNER_MODE
+    interest_weights = aggregate_interests(vacation_info.travelers)
+    
+    if planner_mode in ("solver", "offline"):
+        travel_plan, usage = _plan_with_solver(vacation_info, context, interest_weights, planner_mode)
+    else:
+        # Gerar itinerário(LLM)
+        with stage_span("generate"):
+            travel_plan, usage = ai_service.generate_itinerary_with_usage(
+                vacation_info=vacation_info,
+                weather_data=context["weather"],
+                activities_data=context["activities"],
+                interest_weights=interest_weights,
+                prompt_mode=prompt_mode,
+                output_mode=output_mode
+            )
+    
+    planning_errors = None
+    if usage.get("unfunded_dates"):
+        planning_errors = [
+            f"Orçamento insuficiente para uma atividade por dia (faltam {usage['budget_shortfall']}); "
+            f"dias sem atividade: {', '.join(usage['unfunded_dates'])}"
+        ]
+    result = _finalize_travel_plan(vacation_info, travel_plan, context, planning_errors)
+    result["usage"] = usage
+    return result
+
+def _generate_with_plan_cache(vacation_info: VacationInfo, prompt_mode: Optional[str] = None,
+                              output_mode: Optional[str] = None, bypass_cache: bool = False,
+                              planner_mode: Optional[str] = None) -> Tuple[Dict, str]:
+    """Executa o pipeline consultando antes o cache de planos.
+
+    Retorna o resultado e o estado do cache (HIT, MISS ou BYPASS). Apenas
+    planos aprovados pela validação são armazenados; um acerto cria uma nova
+    viagem no histórico a partir do plano armazenado.
+    """
+    if bypass_cache:
+        return _run_itinerary_pipeline(vacation_info, prompt_mode, output_mode, planner_mode), "BYPASS"
+    
+    cache_key = _plan_cache_key(vacation_info, prompt_mode, output_mode, planner_mode)
+    result = _plan_from_cache(vacation_info, cache_key)
+    if result is not None:
+        return result, "HIT"
+    
+    result = _run_itinerary_pipeline(vacation_info, prompt_mode, output_mode, planner_mode)
+    _store_in_plan_cache(cache_key, result)
+    return result, "MISS"
+
+def _plan_cache_key(vacation_info: VacationInfo, prompt_mode: Optional[str], output_mode: Optional[str],
+                    planner_mode: Optional[str]) -> str:
+    return vacation_fingerprint(vacation_info, {
+        "prompt_mode": prompt_mode,
+        "output_mode": output_mode,
+        "planner": planner_mode or DEFAULT_PLANNER_MODE
+    })
+
+def _plan_from_cache(vacation_info: VacationInfo, cache_key: str) -> Optional[Dict]:
+    """Em caso de acerto, cria uma nova viagem no histórico a partir do plano armazenado"""
+    with stage_span("plan_cache"):
+        cached = plan_cache.get(cache_key)
+    if cached is None:
+        return None
+    travel_plan = TravelPlan.model_validate(cached["travel_plan"])
+    context = {"gallery": cached["destination_images"], "weather": cached["weather_forecast"]}
+    result = _finalize_travel_plan(vacation_info, travel_plan, context)
+    result["usage"] = None
+    return result
+
+def _store_in_plan_cache(cache_key: str, result: Dict):
+    """Armazena o plano gerado se ele foi aprovado pela validação"""
+    if "trip_id" in result:
+        plan_cache.set(cache_key, {
+            "travel_plan": TravelPlan.model_validate(result["travel_plan"]).model_dump(mode="json"),
+            "destination_images": result["destination_images"],
+            "weather_forecast": result["weather_forecast"]
+        })
+
+def _wants_cache_bypass(args, headers, data: Dict) -> bool:
+    return (
+        args.get("cache") == "bypass"
+        or "no-cache" in headers.get("Cache-Control", "")
+        or bool(data.get("bypass_cache"))
+    )
+
+def _bypass_plan_cache(data: Dict) -> bool:
+    """Indica se a requisição pediu para ignorar o cache de planos"""
+    return _wants_cache_bypass(request.args, request.headers, data)
 
 @app.route("/api/generate-itinerary", methods=["POST"])
 def generate_itinerary():
@@ -47,77 +418,263 @@ def generate_itinerary():
         if validation_errors:
             return jsonify({"error": "Dados inválidos", "details": validation_errors}), 400
         
-        # Obter dados de clima
-        weather_data = weather_service.get_weather_range(
-            start_date=vacation_info.date_of_arrival.strftime("%Y-%m-%d"),
-            end_date=vacation_info.date_of_departure.strftime("%Y-%m-%d"),
-            city=vacation_info.destination
-        )
-        
-        # Obter atividades disponíveis
-        all_interests = []
-        for traveler in vacation_info.travelers:
-            all_interests.extend([interest.value for interest in traveler.interests])
+        prompt_mode = request.args.get("prompt_mode")
+        output_mode = request.args.get("output_mode")
+        planner_mode = request.args.get("planner")
+        invalid_mode = _invalid_mode_response(prompt_mode, output_mode, planner_mode)
+        if invalid_mode:
+            return invalid_mode
         
-        activities_data = []
-        import pandas as pd
-        date_range = pd.date_range(
-            start=vacation_info.date_of_arrival,
-            end=vacation_info.date_of_departure,
-            freq='D'
+        result, cache_status = _generate_with_plan_cache(
+            vacation_info, prompt_mode, output_mode, bypass_cache=_bypass_plan_cache(data),
+            planner_mode=planner_mode
         )
+        response = jsonify(result)
+        response.headers["X-Cache"] = cache_status
+        return response
         
-        for date in date_range:
-            date_str = date.strftime('%Y-%m-%d')
-            daily_activities = activities_service.get_activities_by_interests(
-                interests=all_interests,
-                date=date_str
-            )
-            activities_data.extend(daily_activities)
-        
-        # Gerar itinerário(LLM)
-        travel_plan = ai_service.generate_itinerary(
-            vacation_info=vacation_info,
-            weather_data=weather_data,
-            activities_data=activities_data
+    except RateLimitExceeded as e:
+        return _rate_limited_response(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def _run_itinerary_job(payload: Dict) -> Dict:
+    """Handler dos jobs de geração de itinerário"""
+    vacation_info = VacationInfo.model_validate(payload["vacation_info"])
+    # Jobs não têm ninguém esperando a resposta: cedem a vez às chamadas interativas
+    with llm_priority("bulk"):
+        result, _ = _generate_with_plan_cache(
+            vacation_info, payload.get("prompt_mode"), payload.get("output_mode"),
+            bypass_cache=payload.get("bypass_cache", False),
+            planner_mode=payload.get("planner")
         )
-        
-        # Validar plano gerado
-        plan_validation_errors = TripValidator.validate_travel_plan(vacation_info, travel_plan)
-        if plan_validation_errors:
-            return jsonify({
-                "warning": "Plano gerado com problemas",
-                "validation_errors": plan_validation_errors,
-                "travel_plan": travel_plan.model_dump()
-            }), 200
-        
-        # Salvar no histórico
-        trip_id = str(uuid.uuid4())
-        trip_history[trip_id] = TripHistory(
-            id=trip_id,
-            vacation_info=vacation_info,
-            travel_plan=travel_plan,
-            created_at=datetime.now()
+    # Serializa como a resposta síncrona para que o resultado do job tenha o mesmo formato
+    return json.loads(app.json.dumps(result))
+
+job_queue.register("generate_itinerary", _run_itinerary_job)
+# Seguro com vários workers no mesmo JOB_STORE_PATH: cada job órfão é assumido por um único processo
+if os.getenv("JOB_RESUME_ON_STARTUP", "true").lower() == "true":
+    job_queue.start_recovery()
+
+@app.route("/api/jobs/generate-itinerary", methods=["POST"])
+def submit_itinerary_job():
+    """Enfileira a geração de um itinerário e retorna o ID do job imediatamente.
+
+    O resultado é consultado em /api/jobs/<job_id> ou enviado via POST para o
+    callback_url opcional informado no corpo da requisição.
+    """
+    try:
+        data = request.get_json()
+        vacation_info = VacationInfo.model_validate(data)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+    
+    validation_errors = TripValidator.validate_vacation_info(vacation_info)
+    if validation_errors:
+        return jsonify({"error": "Dados inválidos", "details": validation_errors}), 400
+    
+    prompt_mode = request.args.get("prompt_mode")
+    output_mode = request.args.get("output_mode")
+    planner_mode = request.args.get("planner")
+    invalid_mode = _invalid_mode_response(prompt_mode, output_mode, planner_mode)
+    if invalid_mode:
+        return invalid_mode
+    
+    try:
+        job_id = job_queue.submit(
+            "generate_itinerary",
+            {
+                "vacation_info": vacation_info.model_dump(mode="json"),
+                "prompt_mode": prompt_mode,
+                "output_mode": output_mode,
+                "planner": planner_mode,
+                "bypass_cache": _bypass_plan_cache(data)
+            },
+            callback_url=data.get("callback_url")
         )
-        
-        # Obter imagens do destino
-        destination_images = image_service.get_destination_gallery(vacation_info.destination)
-        
-        return jsonify({
-            "trip_id": trip_id,
-            "travel_plan": travel_plan.model_dump(),
-            "destination_images": destination_images,
-            "weather_forecast": weather_data
-        })
-        
+    except InvalidCallbackURL as e:
+        return jsonify({"error": str(e)}), 400
+    except QueueFullError as e:
+        response = jsonify({"error": str(e)})
+        response.headers["Retry-After"] = str(e.retry_after)
+        return response, 503
+    
+    status_url = f"/api/jobs/{job_id}"
+    return jsonify({"job_id": job_id, "status": "queued", "status_url": status_url}), 202, {"Location": status_url}
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def get_job(job_id: str):
+    """Retorna o estado de um job e, quando concluído, seu resultado"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job não encontrado"}), 404
+    return jsonify(job)
+
+@app.route("/api/jobs/metrics", methods=["GET"])
+def get_job_metrics():
+    """Profundidade da fila, jobs em execução e tempos de espera"""
+    return jsonify(job_queue.stats())
+
+def _sse_event(event: str, data) -> str:
+    """Formata um evento Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@app.route("/api/generate-itinerary/stream", methods=["POST"])
+def generate_itinerary_stream():
+    """Gera um novo itinerário enviando o progresso via Server-Sent Events.
+
+    Eventos: progress (fontes de dados concluídas), token (texto do modelo),
+    day (cada ItineraryDay completo), plan (resultado final validado) e error.
+    """
+    try:
+        data = request.get_json()
+        vacation_info = VacationInfo.model_validate(data)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return jsonify({"error": str(e)}), 400
+    
+    validation_errors = TripValidator.validate_vacation_info(vacation_info)
+    if validation_errors:
+        return jsonify({"error": "Dados inválidos", "details": validation_errors}), 400
+    
+    def generate():
+        try:
+            interest_weights = aggregate_interests(vacation_info.travelers)
+            context = None
+            for event, payload in context_gatherer.gather_iter(
+                city=vacation_info.destination,
+                dates=_trip_dates(vacation_info),
+                interests=list(interest_weights),
+                interest_weights=interest_weights
+            ):
+                if event == "context":
+                    context = payload
+                else:
+                    yield _sse_event("progress", payload)
+            
+            yield _sse_event("progress", {"source": "itinerary", "status": "started"})
+            
+            for event, payload in ai_service.stream_itinerary(
+                vacation_info=vacation_info,
+                weather_data=context["weather"],
+                activities_data=context["activities"],
+                interest_weights=interest_weights
+            ):
+                if event == "token":
+                    yield _sse_event("token", {"text": payload})
+                elif event == "day":
+                    yield _sse_event("day", payload.model_dump(mode="json"))
+                elif event == "plan":
+                    result = _finalize_travel_plan(vacation_info, payload, context)
+                    yield _sse_event("plan", result)
+        
+        except RateLimitExceeded as e:
+            yield _sse_event("error", {"error": str(e), "retry_after": e.retry_after})
+        except Exception as e:
+            yield _sse_event("error", {"error": str(e)})
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route("/api/generate-itinerary/batch", methods=["POST"])
+def generate_itinerary_batch():
+    """Gera vários itinerários de uma vez, respondendo em NDJSON.
+
+    Viagens para o mesmo destino com períodos sobrepostos compartilham a
+    coleta de clima, atividades e imagens. A primeira linha descreve os
+    grupos, depois vem uma linha por viagem (na ordem em que terminam, com
+    "index" da posição no pedido e "status" ok ou error) e por fim o resumo.
+    """
+    data = request.get_json(silent=True)
+    items = data.get("trips") if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "Envie uma lista de viagens em \"trips\""}), 400
+    if len(items) > BATCH_MAX_TRIPS:
+        return jsonify({"error": f"Máximo de {BATCH_MAX_TRIPS} viagens por lote"}), 413
+    
+    prompt_mode = request.args.get("prompt_mode")
+    output_mode = request.args.get("output_mode")
+    planner_mode = request.args.get("planner")
+    invalid_mode = _invalid_mode_response(prompt_mode, output_mode, planner_mode)
+    if invalid_mode:
+        return invalid_mode
+    
+    # Viagens inválidas viram erros individuais sem impedir as demais
+    trips, invalid = [], []
+    for index, item in enumerate(items):
+        try:
+            vacation_info = VacationInfo.model_validate(item)
+        except Exception as e:
+            invalid.append({"index": index, "status": "error", "error": str(e)})
+            continue
+        validation_errors = TripValidator.validate_vacation_info(vacation_info)
+        if validation_errors:
+            invalid.append({"index": index, "status": "error", "error": "Dados inválidos", "details": validation_errors})
+        else:
+            trips.append((index, vacation_info))
+    
+    def gather_bulk(**kwargs) -> Dict:
+        with llm_priority("bulk"):
+            return context_gatherer.gather(**kwargs)
+    
+    def generate_bulk(vacation_info: VacationInfo, context: Dict) -> Dict:
+        with llm_priority("bulk"):
+            return _generate_from_context(vacation_info, context, prompt_mode, output_mode, planner_mode)
+    
+    runner = BatchItineraryRunner(gather_fn=gather_bulk, generate_fn=generate_bulk)
+    
+    def generate():
+        started = time.monotonic()
+        succeeded = 0
+        yield app.json.dumps({"type": "groups", "groups": runner.describe_groups(trips)}) + "\n"
+        for result in invalid:
+            yield app.json.dumps({"type": "result", **result}) + "\n"
+        for result in runner.run(trips):
+            succeeded += result["status"] == "ok"
+            yield app.json.dumps({"type": "result", **result}) + "\n"
+        yield app.json.dumps({
+            "type": "summary",
+            "total": len(items),
+            "succeeded": succeeded,
+            "failed": len(items) - succeeded,
+            "elapsed_seconds": round(time.monotonic() - started, 3)
+        }) + "\n"
+    
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+TRIP_CONFLICT_ERROR = "A viagem foi modificada por outra requisição; carregue-a novamente e repita a modificação"
+
+def _modification_entry(modification_request: str, details: Dict) -> Dict:
+    """Registro da modificação no histórico da viagem"""
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "request": modification_request,
+        "type": "user_modification",
+        "mode": details["mode"],
+        "changed_dates": details["changed_dates"],
+        "served_by": details["served_by"]
+    }
+
+def _modification_result(trip_id: str, modified_plan: TravelPlan, modification_request: str, details: Dict) -> Dict:
+    """Corpo da resposta de uma modificação aplicada"""
+    return {
+        "trip_id": trip_id,
+        "travel_plan": modified_plan.model_dump(),
+        "modification_applied": modification_request,
+        "modification_mode": details["mode"],
+        "changed_dates": details["changed_dates"],
+        "served_by": details["served_by"]
+    }
 
 @app.route("/api/modify-itinerary/<trip_id>", methods=["POST"])
 def modify_itinerary(trip_id: str):
     """Modifica um itinerário existente"""
     try:
-        if trip_id not in trip_history:
+        with stage_span("load"):
+            current_trip = trip_store.get(trip_id)
+        if current_trip is None:
             return jsonify({"error": "Viagem não encontrada"}), 404
         
         data = request.get_json()
@@ -126,55 +683,56 @@ def modify_itinerary(trip_id: str):
         if not modification_request:
             return jsonify({"error": "Solicitação de modificação é obrigatória"}), 400
         
-        current_trip = trip_history[trip_id]
-        
-        # Modificar itinerário usando IA
-        modified_plan = ai_service.modify_itinerary(
-            current_plan=current_trip.travel_plan,
-            modification_request=modification_request
-        )
+        # Modificar itinerário usando IA (interativo: passa à frente das gerações em lote)
+        with stage_span("modify"), llm_priority("interactive"):
+            modified_plan, details = ai_service.modify_itinerary_with_details(
+                current_plan=current_trip.travel_plan,
+                modification_request=modification_request,
+                vacation_info=current_trip.vacation_info
+            )
         
         # Atualizar histórico
-        current_trip.travel_plan = modified_plan
-        current_trip.modifications.append({
-            "timestamp": datetime.now().isoformat(),
-            "request": modification_request,
-            "type": "user_modification"
-        })
+        with stage_span("save"):
+            trip_store.append_modification(
+                trip_id, modified_plan, _modification_entry(modification_request, details),
+                expected_count=len(current_trip.modifications)
+            )
+            _pin_plan_activities(modified_plan)
         
-        return jsonify({
-            "trip_id": trip_id,
-            "travel_plan": modified_plan.model_dump(),
-            "modification_applied": modification_request
-        })
+        return jsonify(_modification_result(trip_id, modified_plan, modification_request, details))
         
+    except RateLimitExceeded as e:
+        return _rate_limited_response(e)
+    except TripConflictError:
+        return jsonify({"error": TRIP_CONFLICT_ERROR}), 409
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route("/api/trip-history", methods=["GET"])
 def get_trip_history():
-    """Retorna o histórico de viagens"""
-    history_list = []
-    for trip in trip_history.values():
-        history_list.append({
-            "id": trip.id,
-            "destination": trip.vacation_info.destination,
-            "travelers": [t.name for t in trip.vacation_info.travelers],
-            "dates": f"{trip.vacation_info.date_of_arrival} to {trip.vacation_info.date_of_departure}",
-            "total_cost": trip.travel_plan.total_cost,
-            "created_at": trip.created_at.isoformat(),
-            "modifications_count": len(trip.modifications)
-        })
+    """Retorna o histórico de viagens (paginado, filtrável por destino e data de criação)"""
+    try:
+        limit = min(max(int(request.args.get("limit", 50)), 1), 200)
+        offset = max(int(request.args.get("offset", 0)), 0)
+    except ValueError:
+        return jsonify({"error": "Parâmetros de paginação inválidos"}), 400
+    
+    history_list, total = trip_store.list_summaries(
+        limit=limit,
+        offset=offset,
+        destination=request.args.get("destination"),
+        since=request.args.get("since")
+    )
     
-    return jsonify({"trips": history_list})
+    return jsonify({"trips": history_list, "total": total, "limit": limit, "offset": offset})
 
 @app.route("/api/trip/<trip_id>", methods=["GET"])
 def get_trip_details(trip_id: str):
     """Retorna detalhes de uma viagem específica"""
-    if trip_id not in trip_history:
+    trip = trip_store.get(trip_id)
+    if trip is None:
         return jsonify({"error": "Viagem não encontrada"}), 404
     
-    trip = trip_history[trip_id]
     return jsonify({
         "trip": trip.model_dump(),
         "destination_images": image_service.get_destination_gallery(trip.vacation_info.destination)
@@ -197,7 +755,7 @@ def get_activities():
     interests = request.args.getlist("interests")
     
     if interests:
-        activities = activities_service.get_activities_by_interests(interests, date)
+        activities = activities_service.get_activities_by_interests(interests, date, city)
     elif date:
         activities = activities_service.get_activities_by_date(date, city)
     else:
@@ -205,5 +763,7 @@ def get_activities():
     
     return jsonify({"activities": activities})
 
+STARTUP_SECONDS = round(time.perf_counter() - _init_started, 3)
+
 if __name__ == "__main__":
     app.run(debug=True, host="0.0.0.0", port=5000)
@@ -0,0 +1,312 @@
+"""Aplicação ASGI do backend.
+
+As rotas que passam a maior parte do tempo esperando os LLMs rodam
+nativamente no event loop, com os clientes assíncronos da OpenAI, do Gemini e
+do httpx: POST /api/generate-itinerary, POST /api/generate-itinerary/stream
+(SSE) e POST /api/modify-itinerary/<trip_id>. Cada requisição aguardando os
+upstreams ocupa apenas uma corrotina, não uma thread. As demais rotas
+continuam sendo atendidas pelo app Flask, em um pool de threads
+(ASGI_WSGI_THREADS).
+
+Uso em produção: python serve.py (ou uvicorn asgi:application).
+"""
+import asyncio
+import json
+import os
+import re
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+from a2wsgi import WSGIMiddleware
+from werkzeug.datastructures import Headers
+
+from app import (
+    DEFAULT_PLANNER_MODE, SERVER_TIMING_ENABLED, TRIP_CONFLICT_ERROR, _finalize_travel_plan, _generate_from_context,
+    _invalid_mode_error, _modification_entry, _modification_result, _pin_plan_activities, _plan_cache_key,
+    _plan_from_cache, _sse_event, _store_in_plan_cache, _trip_dates, _wants_cache_bypass, ai_service, app, context_gatherer, trip_store
+)
+from models.schemas import VacationInfo
+from storage.trip_store import TripConflictError
+from utils.http_client import close_async_http_clients
+from utils.interests import aggregate_interests
+from utils.metrics import HTTP_DURATION, request_timings, server_timing_header, stage_span, start_request_timings
+from utils.rate_limiter import RateLimitExceeded, llm_priority
+from utils.validators import TripValidator
+
+wsgi_application = WSGIMiddleware(app, workers=int(os.getenv("ASGI_WSGI_THREADS", "32")))
+
+async def _read_body(receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+async def _send_json(send, status: int, payload: Dict, headers: Optional[List[Tuple[str, str]]] = None):
+    body = app.json.dumps(payload).encode("utf-8")
+    response_headers = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode()),
+        # Mesmo comportamento do Flask-CORS nas rotas do Flask
+        (b"access-control-allow-origin", b"*")
+    ]
+    response_headers += [(name.lower().encode(), value.encode()) for name, value in headers or []]
+    await send({"type": "http.response.start", "status": status, "headers": response_headers})
+    await send({"type": "http.response.body", "body": body})
+
+async def _send_stream(send, receive, status: int, chunks: AsyncIterator[str],
+                       headers: Optional[List[Tuple[str, str]]] = None):
+    """Envia os trechos à medida que são produzidos; se o cliente desconectar, a geração é cancelada"""
+    response_headers = [(b"access-control-allow-origin", b"*")]
+    response_headers += [(name.lower().encode(), value.encode()) for name, value in headers or []]
+    await send({"type": "http.response.start", "status": status, "headers": response_headers})
+
+    async def pump():
+        async for chunk in chunks:
+            await send({"type": "http.response.body", "body": chunk.encode("utf-8"), "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def disconnected():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    pump_task = asyncio.ensure_future(pump())
+    disconnect_task = asyncio.ensure_future(disconnected())
+    try:
+        await asyncio.wait([pump_task, disconnect_task], return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in (pump_task, disconnect_task):
+            task.cancel()
+        await asyncio.gather(pump_task, disconnect_task, return_exceptions=True)
+        await chunks.aclose()
+    if not pump_task.cancelled() and pump_task.exception() is not None:
+        raise pump_task.exception()
+
+def _rate_limited(e: RateLimitExceeded) -> Tuple[int, Dict, List[Tuple[str, str]]]:
+    """Mesmo 429 com Retry-After das rotas Flask"""
+    return 429, {"error": str(e), "retry_after": e.retry_after}, [("Retry-After", str(e.retry_after))]
+
+async def _arun_itinerary_pipeline(vacation_info: VacationInfo, prompt_mode: Optional[str],
+                                   output_mode: Optional[str], planner_mode: Optional[str]) -> Dict:
+    """Versão assíncrona do pipeline de app.py: coleta e geração pelo LLM no event loop"""
+    planner_mode = planner_mode or DEFAULT_PLANNER_MODE
+    interest_weights = aggregate_interests(vacation_info.travelers)
+
+    with stage_span("gather"):
+        context = await context_gatherer.agather(
+            city=vacation_info.destination,
+            dates=_trip_dates(vacation_info),
+            interests=list(interest_weights),
+            interest_weights=interest_weights
+        )
+
+    if planner_mode in ("solver", "offline"):
+        # O otimizador é CPU local e faz no máximo uma chamada curta ao modelo
+        return await asyncio.to_thread(
+            _generate_from_context, vacation_info, context, prompt_mode, output_mode, planner_mode
+        )
+
+    with stage_span("generate"):
+        travel_plan, usage = await ai_service.agenerate_itinerary_with_usage(
+            vacation_info=vacation_info,
+            weather_data=context["weather"],
+            activities_data=context["activities"],
+            interest_weights=interest_weights,
+            prompt_mode=prompt_mode,
+            output_mode=output_mode
+        )
+
+    # Validação e gravação no SQLite ficam fora do event loop
+    result = await asyncio.to_thread(_finalize_travel_plan, vacation_info, travel_plan, context)
+    result["usage"] = usage
+    return result
+
+async def generate_itinerary(scope, receive) -> Tuple[int, Dict, List[Tuple[str, str]]]:
+    """POST /api/generate-itinerary com o mesmo contrato da rota Flask"""
+    args = {name: values[-1] for name, values in parse_qs(scope.get("query_string", b"").decode()).items()}
+    headers = Headers([(name.decode("latin-1"), value.decode("latin-1")) for name, value in scope["headers"]])
+    extra_headers = []
+
+    try:
+        data = json.loads(await _read_body(receive))
+        vacation_info = VacationInfo.model_validate(data)
+
+        validation_errors = TripValidator.validate_vacation_info(vacation_info)
+        prompt_mode = args.get("prompt_mode")
+        output_mode = args.get("output_mode")
+        planner_mode = args.get("planner")
+        invalid_mode = _invalid_mode_error(prompt_mode, output_mode, planner_mode)
+
+        if validation_errors:
+            status, payload = 400, {"error": "Dados inválidos", "details": validation_errors}
+        elif invalid_mode:
+            status, payload = 400, invalid_mode
+        elif _wants_cache_bypass(args, headers, data):
+            payload = await _arun_itinerary_pipeline(vacation_info, prompt_mode, output_mode, planner_mode)
+            status = 200
+            extra_headers.append(("X-Cache", "BYPASS"))
+        else:
+            cache_key = _plan_cache_key(vacation_info, prompt_mode, output_mode, planner_mode)
+            payload = await asyncio.to_thread(_plan_from_cache, vacation_info, cache_key)
+            cache_status = "HIT"
+            if payload is None:
+                payload = await _arun_itinerary_pipeline(vacation_info, prompt_mode, output_mode, planner_mode)
+                await asyncio.to_thread(_store_in_plan_cache, cache_key, payload)
+                cache_status = "MISS"
+            status = 200
+            extra_headers.append(("X-Cache", cache_status))
+
+    except RateLimitExceeded as e:
+        status, payload, rate_headers = _rate_limited(e)
+        extra_headers += rate_headers
+    except Exception as e:
+        status, payload = 500, {"error": str(e)}
+
+    return status, payload, extra_headers
+
+async def generate_itinerary_stream(scope, receive):
+    """POST /api/generate-itinerary/stream com os mesmos eventos SSE da rota Flask"""
+    try:
+        data = json.loads(await _read_body(receive))
+        vacation_info = VacationInfo.model_validate(data)
+    except Exception as e:
+        return 400, {"error": str(e)}, []
+
+    validation_errors = TripValidator.validate_vacation_info(vacation_info)
+    if validation_errors:
+        return 400, {"error": "Dados inválidos", "details": validation_errors}, []
+
+    async def events():
+        try:
+            interest_weights = aggregate_interests(vacation_info.travelers)
+            context = None
+            async for event, payload in context_gatherer.agather_iter(
+                city=vacation_info.destination,
+                dates=_trip_dates(vacation_info),
+                interests=list(interest_weights),
+                interest_weights=interest_weights
+            ):
+                if event == "context":
+                    context = payload
+                else:
+                    yield _sse_event("progress", payload)
+
+            yield _sse_event("progress", {"source": "itinerary", "status": "started"})
+
+            async for event, payload in ai_service.astream_itinerary(
+                vacation_info=vacation_info,
+                weather_data=context["weather"],
+                activities_data=context["activities"],
+                interest_weights=interest_weights
+            ):
+                if event == "token":
+                    yield _sse_event("token", {"text": payload})
+                elif event == "day":
+                    yield _sse_event("day", payload.model_dump(mode="json"))
+                elif event == "plan":
+                    result = await asyncio.to_thread(_finalize_travel_plan, vacation_info, payload, context)
+                    yield _sse_event("plan", result)
+
+        except RateLimitExceeded as e:
+            yield _sse_event("error", {"error": str(e), "retry_after": e.retry_after})
+        except Exception as e:
+            yield _sse_event("error", {"error": str(e)})
+
+    return 200, events(), [
+        ("Content-Type", "text/event-stream; charset=utf-8"),
+        ("Cache-Control", "no-cache"),
+        ("X-Accel-Buffering", "no")
+    ]
+
+async def modify_itinerary(scope, receive, trip_id: str):
+    """POST /api/modify-itinerary/<trip_id> com o mesmo contrato da rota Flask"""
+    try:
+        with stage_span("load"):
+            current_trip = await asyncio.to_thread(trip_store.get, trip_id)
+        if current_trip is None:
+            return 404, {"error": "Viagem não encontrada"}, []
+
+        data = json.loads(await _read_body(receive))
+        modification_request = data.get("modification_request", "")
+        if not modification_request:
+            return 400, {"error": "Solicitação de modificação é obrigatória"}, []
+
+        with stage_span("modify"), llm_priority("interactive"):
+            modified_plan, details = await ai_service.amodify_itinerary_with_details(
+                current_plan=current_trip.travel_plan,
+                modification_request=modification_request,
+                vacation_info=current_trip.vacation_info
+            )
+
+        with stage_span("save"):
+            await asyncio.to_thread(
+                trip_store.append_modification, trip_id, modified_plan,
+                _modification_entry(modification_request, details),
+                expected_count=len(current_trip.modifications)
+            )
+            await asyncio.to_thread(_pin_plan_activities, modified_plan)
+
+        return 200, _modification_result(trip_id, modified_plan, modification_request, details), []
+
+    except RateLimitExceeded as e:
+        return _rate_limited(e)
+    except TripConflictError:
+        return 409, {"error": TRIP_CONFLICT_ERROR}, []
+    except Exception as e:
+        return 500, {"error": str(e)}, []
+
+def _compile_rule(rule: str):
+    """Converte uma regra no formato do Flask ("/api/trip/<trip_id>") em expressão regular"""
+    return re.compile(re.sub(r"<(\w+)>", r"(?P<\1>[^/]+)", rule))
+
+# Rotas atendidas nativamente no event loop (método, regra no formato do Flask, handler); as demais vão para o Flask
+ASYNC_ROUTES = [
+    ("POST", "/api/generate-itinerary", generate_itinerary),
+    ("POST", "/api/generate-itinerary/stream", generate_itinerary_stream),
+    ("POST", "/api/modify-itinerary/<trip_id>", modify_itinerary)
+]
+_compiled_routes = [(method, rule, _compile_rule(rule), handler) for method, rule, handler in ASYNC_ROUTES]
+
+def _match_route(scope):
+    """Handler, regra e parâmetros da rota assíncrona da requisição (None se for do Flask)"""
+    if scope["type"] != "http":
+        return None
+    for method, rule, pattern, handler in _compiled_routes:
+        match = pattern.fullmatch(scope.get("path", ""))
+        if match and scope.get("method") == method:
+            return handler, rule, match.groupdict()
+    return None
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await close_async_http_clients()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def application(scope, receive, send):
+    """Ponto de entrada ASGI"""
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+
+    route = _match_route(scope)
+    if route is None:
+        return await wsgi_application(scope, receive, send)
+
+    handler, rule, params = route
+    started = time.perf_counter()
+    start_request_timings()
+    status, payload, headers = await handler(scope, receive, **params)
+    elapsed = time.perf_counter() - started
+    HTTP_DURATION.observe(elapsed, endpoint=rule, method=scope["method"], status=status)
+    if SERVER_TIMING_ENABLED:
+        headers.append(("Server-Timing", server_timing_header(request_timings() + [("total", elapsed)])))
+    if isinstance(payload, dict):
+        await _send_json(send, status, payload, headers)
+    else:
+        # Como no Flask, a duração registrada vai até o início do streaming
+        await _send_stream(send, receive, status, payload, headers)
@@ -0,0 +1,226 @@
+"""Benchmark de latência ponta a ponta do backend.
+
+Exercita /api/generate-itinerary, /api/modify-itinerary e /api/trip-history
+com concorrência configurável e reporta p50/p95/p99, vazão e chamadas aos
+upstreams por requisição. Por padrão roda o app em processo com os backends
+falsos (FAKE_BACKENDS=true) e armazenamento temporário, sem acesso à rede.
+
+Exemplos:
+    python benchmarks/run_benchmark.py --scenario all --requests 50 --concurrency 8
+    python benchmarks/run_benchmark.py --scenario generate --trip-days 7 --latency-ms 200
+    python benchmarks/run_benchmark.py --url http://localhost:5000 --scenario history
+"""
+import argparse
+import datetime
+import json
+import os
+import queue
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+INTEREST_SETS = [["art", "music"], ["hiking", "photography"], ["cooking", "reading"], ["sports", "technology"]]
+
+class InProcessClient:
+    """Cliente que chama o app Flask diretamente, com backends falsos e dados temporários"""
+
+    def __init__(self, args):
+        self._tmpdir = tempfile.TemporaryDirectory(prefix="agentsville-bench-")
+        os.environ.update({
+            "FAKE_BACKENDS": "true",
+            "FAKE_LATENCY_MS": str(args.latency_ms),
+            "FAKE_JITTER_MS": str(args.jitter_ms),
+            "FAKE_ERROR_RATE": str(args.error_rate),
+            "FAKE_SEED": str(args.seed),
+            "FAKE_MALFORMED_RATE": str(args.malformed_rate),
+            "TRIP_STORE_PATH": os.path.join(self._tmpdir.name, "trips.db"),
+            "JOB_STORE_PATH": os.path.join(self._tmpdir.name, "jobs.db"),
+            "CACHE_SQLITE_PATH": os.path.join(self._tmpdir.name, "cache.db"),
+            "ACTIVITY_STORE_PATH": os.path.join(self._tmpdir.name, "activities.db"),
+            "JOB_RESUME_ON_STARTUP": "false"
+        })
+        sys.path.insert(0, BACKEND_DIR)
+        import app as backend_app
+
+        self.app = backend_app.app
+
+    def request(self, method: str, path: str, body: Optional[Dict] = None) -> Tuple[int, Dict]:
+        response = self.app.test_client().open(path, method=method, json=body)
+        return response.status_code, response.get_json(silent=True) or {}
+
+class RemoteClient:
+    """Cliente HTTP para um servidor já em execução"""
+
+    def __init__(self, base_url: str):
+        import requests
+
+        self.base_url = base_url.rstrip("/")
+        self._local = threading.local()
+        self._requests = requests
+
+    def request(self, method: str, path: str, body: Optional[Dict] = None) -> Tuple[int, Dict]:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = self._requests.Session()
+        response = session.request(method, self.base_url + path, json=body, timeout=300)
+        try:
+            return response.status_code, response.json()
+        except ValueError:
+            return response.status_code, {}
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Percentil pelo método nearest-rank"""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(pct / 100 * len(sorted_values) + 0.4999)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def upstream_calls(client) -> Optional[Dict[str, int]]:
+    status, body = client.request("GET", "/health")
+    fake = body.get("fake_backends") if status == 200 else None
+    return fake["calls"] if fake else None
+
+def vacation_payload(index: int, args) -> Dict:
+    arrival = datetime.date.today() + datetime.timedelta(days=1)
+    interests = INTEREST_SETS[index % len(INTEREST_SETS)]
+    return {
+        "travelers": [
+            {"name": "Ana", "age": 30, "interests": interests},
+            {"name": "Bruno", "age": 32, "interests": interests[:1]}
+        ],
+        "destination": "Lisboa" if args.warm else f"Cidade {args.seed}-{index}",
+        "date_of_arrival": arrival.isoformat(),
+        "date_of_departure": (arrival + datetime.timedelta(days=args.trip_days - 1)).isoformat(),
+        "budget": 100000
+    }
+
+def run_scenario(name: str, client, args, make_call: Callable[[int], Tuple[int, Dict]]) -> Dict:
+    """Executa args.requests chamadas com args.concurrency threads e agrega as métricas"""
+    calls_before = upstream_calls(client)
+
+    def timed(index: int) -> Tuple[float, bool]:
+        started = time.perf_counter()
+        try:
+            status, body = make_call(index)
+            ok = status < 400 and "warning" not in body
+        except Exception as e:
+            print(f"Erro na requisição {index} de {name}: {e}")
+            ok = False
+        return time.perf_counter() - started, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(timed, range(args.requests)))
+    wall_seconds = time.perf_counter() - started
+
+    latencies = sorted(latency * 1000 for latency, _ in results)
+    report = {
+        "scenario": name,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "errors": sum(1 for _, ok in results if not ok),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 1),
+            "p95": round(percentile(latencies, 95), 1),
+            "p99": round(percentile(latencies, 99), 1),
+            "mean": round(sum(latencies) / len(latencies), 1),
+            "max": round(latencies[-1], 1)
+        },
+        "throughput_rps": round(args.requests / wall_seconds, 2),
+        "wall_seconds": round(wall_seconds, 3)
+    }
+
+    calls_after = upstream_calls(client)
+    if calls_before is not None and calls_after is not None:
+        report["upstream_calls_per_request"] = {
+            upstream: round((calls_after.get(upstream, 0) - calls_before.get(upstream, 0)) / args.requests, 2)
+            for upstream in sorted(calls_after)
+        }
+    return report
+
+def generate_scenario(client, args) -> Dict:
+    query = f"?prompt_mode={args.prompt_mode}&output_mode={args.output_mode}" if args.prompt_mode else ""
+    return run_scenario(
+        "generate", client, args,
+        lambda index: client.request("POST", f"/api/generate-itinerary{query}", vacation_payload(index, args))
+    )
+
+def modify_scenario(client, args) -> Dict:
+    # Viagens de base criadas fora da medição
+    trip_ids: "queue.Queue[str]" = queue.Queue()
+    for index in range(args.concurrency):
+        status, body = client.request("POST", "/api/generate-itinerary", vacation_payload(10_000 + index, args))
+        if status == 200 and body.get("trip_id"):
+            trip_ids.put(body["trip_id"])
+    if trip_ids.empty():
+        raise RuntimeError("Não foi possível criar viagens para o cenário modify")
+
+    def modify(index: int) -> Tuple[int, Dict]:
+        # Cada requisição usa uma viagem só sua: modificações simultâneas da mesma
+        # viagem seriam recusadas com 409 e contadas como erro
+        trip_id = trip_ids.get()
+        try:
+            return client.request(
+                "POST", f"/api/modify-itinerary/{trip_id}",
+                {"modification_request": "Troque a primeira atividade por algo mais tranquilo"}
+            )
+        finally:
+            trip_ids.put(trip_id)
+
+    return run_scenario("modify", client, args, modify)
+
+def history_scenario(client, args) -> Dict:
+    return run_scenario(
+        "history", client, args,
+        lambda index: client.request("GET", "/api/trip-history?limit=50")
+    )
+
+SCENARIOS = {"generate": generate_scenario, "modify": modify_scenario, "history": history_scenario}
+
+def print_report(report: Dict):
+    latency = report["latency_ms"]
+    print(
+        f"{report['scenario']:<9} n={report['requests']:<5} c={report['concurrency']:<3} "
+        f"erros={report['errors']:<4} p50={latency['p50']}ms p95={latency['p95']}ms "
+        f"p99={latency['p99']}ms vazão={report['throughput_rps']} req/s"
+    )
+    if "upstream_calls_per_request" in report:
+        calls = ", ".join(f"{name}={count}" for name, count in report["upstream_calls_per_request"].items())
+        print(f"{'':<9} chamadas por requisição: {calls}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de latência do AgentsVille Trip Planner")
+    parser.add_argument("--scenario", choices=["all"] + list(SCENARIOS), default="all")
+    parser.add_argument("--requests", type=int, default=20, help="requisições medidas por cenário")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--trip-days", type=int, default=3)
+    parser.add_argument("--warm", action="store_true", help="repete o mesmo destino (caches quentes)")
+    parser.add_argument("--prompt-mode", choices=["full", "compact"])
+    parser.add_argument("--output-mode", choices=["analysis", "no_analysis", "json"], default="analysis")
+    parser.add_argument("--latency-ms", type=float, default=50, help="latência média dos upstreams falsos")
+    parser.add_argument("--jitter-ms", type=float, default=10)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fração de chamadas falsas que falham")
+    parser.add_argument("--malformed-rate", type=float, default=0.0,
+                        help="fração de planos do LLM falso que chegam truncados")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--url", help="servidor em execução; sem isso o app roda em processo com backends falsos")
+    parser.add_argument("--json", action="store_true", help="imprime o relatório em JSON")
+    args = parser.parse_args()
+
+    client = RemoteClient(args.url) if args.url else InProcessClient(args)
+    names = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+    reports = [SCENARIOS[name](client, args) for name in names]
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        for report in reports:
+            print_report(report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Relatório de inicialização do backend.
+
+Importa o app em processos novos e mede o tempo de boot, o pico de memória
+(RSS) por worker e os módulos que mais pesam no import (python -X importtime).
+Não faz chamadas de rede: os clientes dos SDKs são criados só no primeiro uso.
+
+Exemplos:
+    python benchmarks/startup_report.py
+    python benchmarks/startup_report.py --runs 5 --top 15 --json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Executado no processo filho: importa o app e devolve as medições em JSON
+PROBE = """
+import json, time
+started = time.perf_counter()
+import app
+from utils.metrics import max_rss_bytes
+print(json.dumps({
+    "import_seconds": time.perf_counter() - started,
+    "app_init_seconds": app.STARTUP_SECONDS,
+    "max_rss_bytes": max_rss_bytes(),
+    "openai_loaded": "openai" in __import__("sys").modules,
+    "genai_loaded": "google.genai" in __import__("sys").modules
+}))
+"""
+
+def probe_env(tmpdir: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": BACKEND_DIR,
+        "TRIP_STORE_PATH": os.path.join(tmpdir, "trips.db"),
+        "JOB_STORE_PATH": os.path.join(tmpdir, "jobs.db"),
+        "CACHE_SQLITE_PATH": os.path.join(tmpdir, "cache.db"),
+        "ACTIVITY_STORE_PATH": os.path.join(tmpdir, "activities.db"),
+        "JOB_RESUME_ON_STARTUP": "false"
+    })
+    return env
+
+def run_probe(env: Dict[str, str]) -> Dict:
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def top_imports(env: Dict[str, str], top: int) -> List[Dict]:
+    """Pacotes de primeiro nível com maior tempo cumulativo de import"""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    ).stderr
+
+    totals: Dict[str, int] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        # Submódulos (com ponto no nome) já estão contados no pacote de primeiro nível
+        name = name.strip()
+        if "." in name:
+            continue
+        totals[name] = max(totals.get(name, 0), int(cumulative_us))
+
+    ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:top]
+    return [{"module": name, "cumulative_ms": round(us / 1000, 1)} for name, us in ranked]
+
+def main():
+    parser = argparse.ArgumentParser(description="Tempo de boot, memória e imports do backend")
+    parser.add_argument("--runs", type=int, default=3, help="processos novos medidos")
+    parser.add_argument("--top", type=int, default=10, help="módulos mais lentos listados")
+    parser.add_argument("--json", action="store_true", help="imprime o relatório em JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="agentsville-startup-") as tmpdir:
+        env = probe_env(tmpdir)
+        runs = [run_probe(env) for _ in range(args.runs)]
+        imports = top_imports(env, args.top)
+
+    import_times = sorted(run["import_seconds"] for run in runs)
+    report = {
+        "runs": args.runs,
+        "import_seconds": {"min": round(import_times[0], 3), "median": round(import_times[len(import_times) // 2], 3)},
+        "app_init_seconds": round(min(run["app_init_seconds"] for run in runs), 3),
+        "max_rss_mb": round(max(run["max_rss_bytes"] or 0 for run in runs) / 1024 / 1024, 1),
+        "sdk_loaded_at_startup": {"openai": runs[0]["openai_loaded"], "google.genai": runs[0]["genai_loaded"]},
+        "slowest_imports": imports
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"import do app: min={report['import_seconds']['min']}s mediana={report['import_seconds']['median']}s "
+          f"(inicialização do módulo: {report['app_init_seconds']}s, {args.runs} execuções)")
+    print(f"pico de RSS por worker: {report['max_rss_mb']} MB")
+    print(f"SDKs carregados no boot: {report['sdk_loaded_at_startup']}")
+    print("imports mais lentos (cumulativo):")
+    for entry in report["slowest_imports"]:
+        print(f"  {entry['module']:<24} {entry['cumulative_ms']} ms")
+
+if __name__ == "__main__":
+    main()
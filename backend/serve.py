@@ -0,0 +1,20 @@
+"""Servidor de produção: executa a aplicação ASGI (asgi.py) com o uvicorn.
+
+Variáveis: HOST, PORT, WEB_CONCURRENCY (processos), LOG_LEVEL e
+ASGI_WSGI_THREADS (threads para as rotas atendidas pelo Flask). Com vários
+processos, JOB_RESUME_ON_STARTUP pode ficar habilitado em todos: cada job
+órfão é reivindicado atomicamente por um único processo.
+"""
+import os
+import uvicorn
+
+if __name__ == "__main__":
+    uvicorn.run(
+        "asgi:application",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "5000")),
+        workers=int(os.getenv("WEB_CONCURRENCY", "1")),
+        log_level=os.getenv("LOG_LEVEL", "info"),
+        proxy_headers=True,
+        lifespan="on"
+    )
@@ -1,59 +1,277 @@
+import asyncio
 import datetime
+import hashlib
 import os
 from typing import List, Dict, Optional
-import google.genai as genai
 import json
-from models.schemas import Activity, Interest
+from models.schemas import Activity
+from services.model_router import GeminiBackend, ModelRouter
+from storage.activity_store import ActivityStore, normalize_city, normalize_interests
+from utils.interests import format_weighted_interests
+from utils.prompts import INTEREST_VOCABULARY, PromptTemplate
+from utils.singleflight import get_async_singleflight, get_singleflight
+from utils.rate_limiter import RateLimitExceeded
+
+_ACTIVITY_EXAMPLE = """{
+    "activity_id": "event-YYYY-MM-DD-1",
+    "name": "Nome da Atividade",
+    "start_time": "YYYY-MM-DD HH:MM",
+    "end_time": "YYYY-MM-DD HH:MM",
+    "location": "Local específico na cidade",
+    "description": "Descrição detalhada da atividade",
+    "price": 25,
+    "related_interests": ["interesse1", "interesse2"]
+}"""
+
+# Instruções, vocabulário e formato pré-compilados; a mensagem do usuário traz cidade, datas e interesses
+ACTIVITIES_DAY_PROMPT = PromptTemplate("activities_day", f"""
+Você gera atividades turísticas reais e variadas para viajantes.
+IMPORTANTE: Use apenas estes interesses válidos: {', '.join(INTEREST_VOCABULARY)}
+
+Retorne APENAS um JSON válido no formato (datas no lugar de YYYY-MM-DD):
+[
+{_ACTIVITY_EXAMPLE}
+]
+""", """
+Gere {count} atividades turísticas para {city} na data {date}.
+Interesses (entre parênteses, quantos viajantes compartilham cada um; priorize os mais compartilhados): {interests}
+""")
+
+ACTIVITIES_BATCH_PROMPT = PromptTemplate("activities_batch", f"""
+Você gera atividades turísticas reais e variadas para viajantes.
+IMPORTANTE: Use apenas estes interesses válidos: {', '.join(INTEREST_VOCABULARY)}
+
+Retorne APENAS um JSON válido: um objeto cujas chaves são as datas (YYYY-MM-DD)
+e os valores são listas de atividades daquela data, no formato:
+{{
+"YYYY-MM-DD": [
+{_ACTIVITY_EXAMPLE}
+]
+}}
+""", """
+Gere {count} atividades turísticas para {city} em CADA uma das datas: {dates}.
+Interesses (entre parênteses, quantos viajantes compartilham cada um; priorize os mais compartilhados): {interests}
+""")
 
 class ActivitiesService:
-    def __init__(self, api_key: str = None):
-        self.client = genai.Client(api_key=api_key or os.getenv("GEMINI_API_KEY"))
-
-    def _generate_activities_with_gemini(self, date: str, city: str = None, interests: List[str] = None, count: int = 3) -> List[Dict]:
-        """Gera atividades usando Gemini"""
-        city = city
-        interests_str = ", ".join(interests) if interests else "variados"
-        
-        valid_interests = ["art", "cooking", "comedy", "dancing", "fitness", "gardening", "hiking", "movies", "music", "photography", "reading", "sports", "technology", "theatre", "tennis", "writing"]
-
-        prompt = f"""
-        Gere {count} atividades turísticas para {city} na data {date}.
-        Interesses: {interests_str}
-
-        IMPORTANTE: Use apenas estes interesses válidos: {', '.join(valid_interests)}
-
-        Retorne APENAS um JSON válido no formato:
-        [
-            {{
-                "activity_id": "event-{date}-1",
-                "name": "Nome da Atividade",
-                "start_time": "{date} HH:MM",
-                "end_time": "{date} HH:MM",
-                "location": "Local específico em {city}",
-                "description": "Descrição detalhada da atividade",
-                "price": 25,
-                "related_interests": ["interesse1", "interesse2"]
-            }}
-        ]
+    VALID_INTERESTS = INTEREST_VOCABULARY
+    REQUIRED_FIELDS = ["name", "start_time", "end_time", "location", "description", "price"]
+
+    def __init__(self, api_key: str = None, batch_days: Optional[int] = None, store: Optional[ActivityStore] = None,
+                 client=None, router: Optional[ModelRouter] = None):
+        self.api_key = api_key or os.getenv("GEMINI_API_KEY")
+        # O SDK do Gemini só é importado e instanciado no primeiro uso (client permite injetar outro);
+        # router permite compartilhar o roteador de modelos com os demais serviços
+        self.router = router or ModelRouter.from_env({"gemini": GeminiBackend(self.api_key, client=client)})
+        # Quantidade máxima de dias pedidos ao Gemini em uma única chamada
+        self.batch_days = batch_days or int(os.getenv("ACTIVITIES_BATCH_DAYS", "7"))
+        self.store = store if store is not None else ActivityStore.from_env()
+        self._singleflight = get_singleflight("gemini_activities")
+        self._async_singleflight = get_async_singleflight("gemini_activities")
+
+    def _generate_content(self, messages: List[Dict]):
+        """Chamada ao LLM da tarefa activities pelo roteador de modelos"""
+        return self.router.complete("activities", messages=messages)
+
+    async def _agenerate_content(self, messages: List[Dict]):
+        """Versão assíncrona de _generate_content, para o modo ASGI"""
+        return await self.router.acomplete("activities", messages=messages)
+
+    def _generate_activities_with_gemini(self, date: str, city: str = None, interests: List[str] = None, count: int = 3,
+                                         interest_weights: Optional[Dict[str, int]] = None) -> List[Dict]:
+        """Gera atividades usando Gemini.
+
+        Gerações simultâneas para o mesmo catálogo compartilham uma única chamada.
         """
-        
+        key = ("day", normalize_city(city), date, normalize_interests(interests), count)
+        return self._singleflight.do(
+            key, self._call_gemini_for_day, date, city, interests, count, interest_weights
+        )
+
+    def _call_gemini_for_day(self, date: str, city: str = None, interests: List[str] = None, count: int = 3,
+                             interest_weights: Optional[Dict[str, int]] = None) -> List[Dict]:
+        messages = ACTIVITIES_DAY_PROMPT.messages(
+            count=count, city=city, date=date, interests=format_weighted_interests(interests, interest_weights)
+        )
+
         try:
-            response = self.client.models.generate_content(
-                model='gemini-2.0-flash-lite',
-                contents=prompt
-            )
+            response = self._generate_content(messages)
             content = response.text.strip()
             
             if "```json" in content:
                 content = content.split("```json")[1].split("```")[0].strip()
             
             activities = json.loads(content)
-            return activities if isinstance(activities, list) else [activities]
+            activities = activities if isinstance(activities, list) else [activities]
+            activities = self._normalize_activities(date, activities, self._catalog_tag(city, interests))
+            if not activities:
+                return self._get_default_activities(date, city)
+
+            self._save_catalog(city, date, interests, activities)
+            return activities
             
+        except RateLimitExceeded:
+            raise
         except Exception as e:
             print(f"Erro ao gerar atividades: {e}")
             return self._get_default_activities(date, city)
 
+    def _generate_activities_batch_with_gemini(self, dates: List[str], city: str = None, interests: List[str] = None, count: int = 3,
+                                               interest_weights: Optional[Dict[str, int]] = None) -> Dict[str, List[Dict]]:
+        """Gera atividades para vários dias em uma única chamada ao Gemini.
+
+        Lotes idênticos solicitados simultaneamente compartilham uma única chamada.
+        """
+        key = ("batch", normalize_city(city), tuple(dates), normalize_interests(interests), count)
+        return self._singleflight.do(
+            key, self._call_gemini_for_batch, dates, city, interests, count, interest_weights
+        )
+
+    def _call_gemini_for_batch(self, dates: List[str], city: str = None, interests: List[str] = None, count: int = 3,
+                               interest_weights: Optional[Dict[str, int]] = None) -> Dict[str, List[Dict]]:
+        messages = self._batch_messages(dates, city, interests, count, interest_weights)
+        try:
+            text = self._generate_content(messages).text
+        except RateLimitExceeded:
+            raise
+        except Exception as e:
+            print(f"Erro ao gerar atividades em lote: {e}")
+            text = None
+        return self._parse_batch_response(text, dates, city, interests)
+
+    async def _agenerate_activities_batch_with_gemini(self, dates: List[str], city: str = None,
+                                                      interests: List[str] = None, count: int = 3,
+                                                      interest_weights: Optional[Dict[str, int]] = None) -> Dict[str, List[Dict]]:
+        """Versão assíncrona de _generate_activities_batch_with_gemini"""
+        key = ("batch", normalize_city(city), tuple(dates), normalize_interests(interests), count)
+        return await self._async_singleflight.do(
+            key, self._acall_gemini_for_batch, dates, city, interests, count, interest_weights
+        )
+
+    async def _acall_gemini_for_batch(self, dates: List[str], city: str = None, interests: List[str] = None,
+                                      count: int = 3, interest_weights: Optional[Dict[str, int]] = None) -> Dict[str, List[Dict]]:
+        messages = self._batch_messages(dates, city, interests, count, interest_weights)
+        try:
+            text = (await self._agenerate_content(messages)).text
+        except RateLimitExceeded:
+            raise
+        except Exception as e:
+            print(f"Erro ao gerar atividades em lote: {e}")
+            text = None
+        # A resposta é gravada no catálogo (SQLite) fora do event loop
+        return await asyncio.to_thread(self._parse_batch_response, text, dates, city, interests)
+
+    def _batch_messages(self, dates: List[str], city: Optional[str], interests: Optional[List[str]], count: int,
+                        interest_weights: Optional[Dict[str, int]]) -> List[Dict]:
+        return ACTIVITIES_BATCH_PROMPT.messages(
+            count=count, city=city, dates=", ".join(dates), interests=format_weighted_interests(interests, interest_weights)
+        )
+
+    def _parse_batch_response(self, text: Optional[str], dates: List[str], city: Optional[str],
+                              interests: Optional[List[str]]) -> Dict[str, List[Dict]]:
+        """Extrai as atividades por data da resposta do lote, com atividades padrão nos dias sem resposta válida"""
+        activities_by_date = {}
+        if text is not None:
+            try:
+                content = text.strip()
+                if "```json" in content:
+                    content = content.split("```json")[1].split("```")[0].strip()
+
+                activities_by_date = json.loads(content)
+                if not isinstance(activities_by_date, dict):
+                    raise ValueError("Resposta não é um objeto indexado por data")
+
+            except Exception as e:
+                print(f"Erro ao gerar atividades em lote: {e}")
+                activities_by_date = {}
+
+        catalog_tag = self._catalog_tag(city, interests)
+        result = {}
+        for date in dates:
+            day_activities = activities_by_date.get(date)
+            if not isinstance(day_activities, list):
+                day_activities = []
+
+            day_activities = self._normalize_activities(date, day_activities, catalog_tag)
+            if day_activities:
+                self._save_catalog(city, date, interests, day_activities)
+                result[date] = day_activities
+            else:
+                result[date] = self._get_default_activities(date, city)
+
+        return result
+
+    @staticmethod
+    def _catalog_tag(city: Optional[str], interests: Optional[List[str]]) -> str:
+        """Identificador curto do catálogo, usado para tornar os activity_ids únicos entre cidades e interesses"""
+        catalog_key = f"{normalize_city(city)}|{normalize_interests(interests)}"
+        return hashlib.sha1(catalog_key.encode("utf-8")).hexdigest()[:8]
+
+    @staticmethod
+    def _content_tag(activity: Dict) -> str:
+        """Hash curto do conteúdo da atividade: uma nova geração nunca reaproveita o id de outra atividade"""
+        content = {field: activity.get(field) for field in sorted(activity) if field != "activity_id"}
+        return hashlib.sha1(json.dumps(content, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:8]
+
+    def pin_activities(self, activity_ids: List[str]):
+        """Preserva no catálogo as atividades referenciadas por viagens salvas"""
+        if not self.store or not activity_ids:
+            return
+        try:
+            self.store.pin_activities(activity_ids)
+        except Exception as e:
+            print(f"Erro ao fixar atividades no catálogo: {e}")
+
+    def _save_catalog(self, city: Optional[str], date: str, interests: Optional[List[str]], activities: List[Dict]):
+        if not self.store:
+            return
+        try:
+            self.store.save_catalog(city, date, interests, activities)
+        except Exception as e:
+            print(f"Erro ao salvar catálogo de atividades: {e}")
+
+    def _get_stored_catalog(self, city: Optional[str], date: str, interests: Optional[List[str]]) -> Optional[List[Dict]]:
+        if not self.store:
+            return None
+        try:
+            return self.store.get_catalog(city, date, interests)
+        except Exception as e:
+            print(f"Erro ao consultar catálogo de atividades: {e}")
+            return None
+
+    def _get_stored_catalogs(self, city: Optional[str], dates: List[str],
+                             interests: Optional[List[str]]) -> Dict[str, List[Dict]]:
+        """Catálogos já armazenados das datas informadas (datas sem catálogo ficam de fora)"""
+        stored_by_date = {}
+        for date in dates:
+            stored = self._get_stored_catalog(city, date, interests)
+            if stored is not None:
+                stored_by_date[date] = stored
+        return stored_by_date
+
+    def _normalize_activities(self, date: str, activities: List, catalog_tag: str) -> List[Dict]:
+        """Descarta atividades incompletas e reatribui activity_ids únicos e válidos para a data"""
+        normalized = []
+        for activity in activities:
+            if not isinstance(activity, dict):
+                continue
+            if any(field not in activity for field in self.REQUIRED_FIELDS):
+                continue
+            if not str(activity["start_time"]).startswith(date):
+                continue
+
+            activity = dict(activity)
+            activity["related_interests"] = [
+                interest for interest in activity.get("related_interests", [])
+                if interest in self.VALID_INTERESTS
+            ]
+            activity["activity_id"] = (
+                f"event-{date}-{catalog_tag}-{len(normalized) + 1}-{self._content_tag(activity)}"
+            )
+            normalized.append(activity)
+
+        return normalized
+
     def _get_default_activities(self, date: str, city: str = None) -> List[Dict]:
         """Retorna atividades padrão quando não é possível gerar"""
         city = city or "Local"
@@ -75,27 +293,88 @@ class ActivitiesService:
         except ValueError:
             raise ValueError(f"Formato de data inválido: {date}")
 
-        return self._generate_activities_with_gemini(date, city)
+        return self._get_day_activities(date, city)
 
     def get_activity_by_id(self, activity_id: str) -> Optional[Dict]:
         """Retorna uma atividade específica pelo ID"""
-        if "event-" in activity_id:
-            date_part = activity_id.split("-")[1:4]
-            if len(date_part) == 3:
-                date = "-".join(date_part)
-                activities = self._generate_activities_with_gemini(date, count=1)
-                if activities:
-                    activities[0]["activity_id"] = activity_id
-                    return activities[0]
-        return None
-
-    def get_activities_by_interests(self, interests: List[str], date: str = None) -> List[Dict]:
+        if not self.store:
+            return None
+        return self.store.get_activity(activity_id)
+
+    def get_activities_by_interests(self, interests: List[str], date: str = None, city: str = None,
+                                    interest_weights: Optional[Dict[str, int]] = None) -> List[Dict]:
         """Retorna atividades que correspondem aos interesses especificados"""
+        interests = self._canonical_interests(interests)
         if date:
-            return self._generate_activities_with_gemini(date, interests=interests)
+            return self._get_day_activities(date, city, interests, interest_weights)
         else:
             tomorrow = (datetime.datetime.now() + datetime.timedelta(days=1)).strftime("%Y-%m-%d")
-            return self._generate_activities_with_gemini(tomorrow, interests=interests)
+            return self._get_day_activities(tomorrow, city, interests, interest_weights)
+
+    def _get_day_activities(self, date: str, city: str = None, interests: List[str] = None,
+                            interest_weights: Optional[Dict[str, int]] = None) -> List[Dict]:
+        """Consulta o catálogo persistente antes de gerar as atividades do dia"""
+        stored = self._get_stored_catalog(city, date, interests)
+        if stored is not None:
+            return stored
+        return self._generate_activities_with_gemini(date, city=city, interests=interests, interest_weights=interest_weights)
+
+    @staticmethod
+    def _canonical_interests(interests: Optional[List[str]]) -> List[str]:
+        """Remove repetições e ordena os interesses"""
+        return sorted({interest.strip().lower() for interest in interests or []})
+
+    def get_activities_for_range(self, city: str, dates: List[str], interests: List[str] = None,
+                                 interest_weights: Optional[Dict[str, int]] = None) -> Dict[str, List[Dict]]:
+        """Retorna atividades para várias datas, agrupando até batch_days dias por chamada.
+
+        Datas já presentes no catálogo persistente não são enviadas ao Gemini.
+        Os pesos dos interesses orientam o prompt mas não fazem parte da chave
+        do catálogo.
+        """
+        interests = self._canonical_interests(interests)
+        for date in dates:
+            try:
+                datetime.datetime.strptime(date, "%Y-%m-%d")
+            except ValueError:
+                raise ValueError(f"Formato de data inválido: {date}")
+
+        activities_by_date = self._get_stored_catalogs(city, dates, interests)
+        missing_dates = [date for date in dates if date not in activities_by_date]
+
+        for chunk in self.chunk_dates(missing_dates):
+            activities_by_date.update(
+                self._generate_activities_batch_with_gemini(chunk, city=city, interests=interests,
+                                                            interest_weights=interest_weights)
+            )
+
+        return {date: activities_by_date[date] for date in dates}
+
+    async def aget_activities_for_range(self, city: str, dates: List[str], interests: List[str] = None,
+                                        interest_weights: Optional[Dict[str, int]] = None) -> Dict[str, List[Dict]]:
+        """Versão assíncrona de get_activities_for_range, para o modo ASGI"""
+        interests = self._canonical_interests(interests)
+        for date in dates:
+            try:
+                datetime.datetime.strptime(date, "%Y-%m-%d")
+            except ValueError:
+                raise ValueError(f"Formato de data inválido: {date}")
+
+        # As consultas ao catálogo (SQLite) rodam em uma thread, fora do event loop
+        activities_by_date = await asyncio.to_thread(self._get_stored_catalogs, city, dates, interests)
+        missing_dates = [date for date in dates if date not in activities_by_date]
+
+        for chunk in self.chunk_dates(missing_dates):
+            activities_by_date.update(
+                await self._agenerate_activities_batch_with_gemini(chunk, city=city, interests=interests,
+                                                                   interest_weights=interest_weights)
+            )
+
+        return {date: activities_by_date[date] for date in dates}
+
+    def chunk_dates(self, dates: List[str]) -> List[List[str]]:
+        """Divide as datas em grupos de até batch_days dias"""
+        return [dates[i:i + self.batch_days] for i in range(0, len(dates), self.batch_days)]
 
     def filter_activities_by_weather(self, activities: List[Dict], weather_condition: str) -> List[Dict]:
         """Filtra atividades baseado nas condições climáticas"""
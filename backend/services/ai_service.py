@@ -1,98 +1,843 @@
+import asyncio
+import datetime
 import json
-from openai import OpenAI
-from typing import Optional
-from models.schemas import VacationInfo, TravelPlan
+import os
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+from pydantic import ValidationError
+from models.schemas import VacationInfo, TravelPlan, ItineraryDay, Activity, ActivityRecommendation, Weather
+from services.model_router import ModelRouter, OpenAIBackend
+from utils.dates import date_range
+from utils.interests import aggregate_interests
+from utils.json_repair import JSONRepairError, loads_tolerant
+from utils.metrics import LLM_REPAIRS, record_llm_usage
+from utils.json_stream import ItineraryDayStreamParser
+from utils.plan_patch import PlanPatchError, apply_plan_patch
+from utils.prompts import PromptTemplate
+from utils.rate_limiter import RateLimitExceeded
+from utils.validators import TripValidator
+
+PROMPT_MODES = ("full", "compact")
+OUTPUT_MODES = ("analysis", "no_analysis", "json")
+
+# Formato de saída do modo compacto: apenas IDs das atividades e motivos
+COMPACT_PLAN_FORMAT = '{"d": [{"date": "YYYY-MM-DD", "a": [{"id": "<id da atividade>", "r": ["motivo curto"]}]}]}'
+
+def _itinerary_output_format(output_schema: str, output_mode: str) -> str:
+    if output_mode == "analysis":
+        return f"""Responda usando duas seções (ANÁLISE E SAÍDA FINAL) no seguinte formato:
+
+ANÁLISE:
+- Análise passo a passo das preferências dos viajantes
+- Considerações sobre o clima para cada dia
+- Seleção de atividades baseada nos interesses
+- Cálculo e verificação do orçamento
+
+SAÍDA FINAL:
+
+```json
+{output_schema}
+```"""
+    if output_mode == "no_analysis":
+        return f"""Responda APENAS com o JSON final, sem análise, em um bloco:
+
+```json
+{output_schema}
+```"""
+    return f"""Responda APENAS com um objeto JSON no formato:
+{output_schema}"""
+
+def _itinerary_prompt(prompt_mode: str, output_mode: str) -> PromptTemplate:
+    output_schema = COMPACT_PLAN_FORMAT if prompt_mode == "compact" else json.dumps(TravelPlan.model_json_schema())
+    prefix = f"""Você é um Agente Especialista em Planejamento de Itinerários.
+
+## Tarefa
+Crie um itinerário de viagem personalizado considerando:
+1. Interesses dos viajantes (priorize os compartilhados por mais viajantes)
+2. Condições climáticas (evite atividades ao ar livre durante chuva)
+3. Orçamento disponível (não exceda o limite)
+4. Pelo menos uma atividade por dia
+5. Compatibilidade entre atividades e clima
+
+## Formato de Saída
+{_itinerary_output_format(output_schema, output_mode)}"""
+    return PromptTemplate(f"itinerary_{prompt_mode}_{output_mode}", prefix, "## Contexto\n{context}")
+
+# Prompts pré-compilados no import: schemas e instruções não são refeitos a cada chamada
+ITINERARY_PROMPTS = {
+    (prompt_mode, output_mode): _itinerary_prompt(prompt_mode, output_mode)
+    for prompt_mode in PROMPT_MODES for output_mode in OUTPUT_MODES
+}
+
+REASONS_PROMPT = PromptTemplate("recommendation_reasons", """
+    Você é um Agente Especialista em Planejamento de Itinerários.
+    As atividades enviadas já foram escolhidas e cabem no orçamento. Não troque
+    nenhuma: escreva de 1 a 3 motivos curtos para cada uma, considerando os
+    interesses do grupo e o clima do dia.
+
+    Responda APENAS com um objeto JSON: {"reasons": {"<id da atividade>": ["motivo curto"]}}
+    """, """
+    Destino: {destination}
+    Interesses (interesse:nº de viajantes): {interests}
+    Atividades (id|data|clima|interesses|nome):
+    {rows}
+    """)
+
+MODIFICATION_PATCH_PROMPT = PromptTemplate("modification_patch", f"""
+    Você é um especialista em modificação de itinerários de viagem.
+    Não reescreva o itinerário: descreva apenas as alterações necessárias
+    como operações sobre dias e atividades existentes.
+
+    Operações permitidas:
+    - add_activity: {{"op": "add_activity", "date": "YYYY-MM-DD", "activity": <Activity>, "reasons": ["..."]}}
+    - remove_activity: {{"op": "remove_activity", "date": "YYYY-MM-DD", "activity_id": "..."}}
+    - replace_activity: {{"op": "replace_activity", "date": "YYYY-MM-DD", "activity_id": "...", "activity": <Activity>, "reasons": ["..."]}}
+    - update_reasons: {{"op": "update_reasons", "date": "YYYY-MM-DD", "activity_id": "...", "reasons": ["..."]}}
+
+    <Activity> segue o schema: {json.dumps(Activity.model_json_schema())}
+
+    Responda APENAS com um objeto JSON: {{"operations": [...]}}
+    """, """
+    Itinerário atual: {plan}
+
+    Modificação solicitada: {request}
+    """)
+
+MODIFICATION_FULL_PROMPT = PromptTemplate("modification_full", """
+    Você é um especialista em modificação de itinerários de viagem.
+    Modifique o itinerário existente baseado na solicitação do usuário.
+    Mantenha a estrutura JSON original e faça apenas as alterações necessárias.
+    """, MODIFICATION_PATCH_PROMPT.suffix)
+
+REPAIR_DAYS_PROMPT = PromptTemplate("repair_days", f"""
+    Você corrige itinerários de viagem cuja resposta anterior veio inválida ou incompleta.
+    Gere SOMENTE os dias solicitados, cada um no schema de ItineraryDay:
+    {json.dumps(ItineraryDay.model_json_schema())}
+
+    Responda APENAS com um objeto JSON: {{"itinerary_days": [...]}}
+    """, """
+    Dias a gerar: {dates}
+
+    Erros da resposta anterior:
+    {errors}
+
+    Contexto: {context}
+    """)
 
 class AIService:
-    def __init__(self, api_key: str, base_url: Optional[str] = None):
-        self.client = OpenAI(
-            api_key=api_key,
-            base_url=base_url
-        )
-        self.model = "gpt-3.5-turbo"
-
-    def generate_itinerary(self, vacation_info: VacationInfo, weather_data: list, activities_data: list) -> TravelPlan:
-        system_prompt = f"""
-        Você é um Agente Especialista em Planejamento de Itinerários.
-
-        ## Tarefa
-        Crie um itinerário de viagem personalizado considerando:
-        1. Interesses dos viajantes
-        2. Condições climáticas (evite atividades ao ar livre durante chuva)
-        3. Orçamento disponível (não exceda o limite)
-        4. Pelo menos uma atividade por dia
-        5. Compatibilidade entre atividades e clima
-
-        ## Formato de Saída
-        Responda usando duas seções (ANÁLISE E SAÍDA FINAL) no seguinte formato:
-
-        ANÁLISE:
-        - Análise passo a passo das preferências dos viajantes
-        - Considerações sobre o clima para cada dia
-        - Seleção de atividades baseada nos interesses
-        - Cálculo e verificação do orçamento
-
-        SAÍDA FINAL:
-
-        ```json
-        {TravelPlan.model_json_schema()}
-        ```
-
-        ## Contexto
-        Dados do clima: {json.dumps(weather_data, indent=2)}
-        Atividades disponíveis: {json.dumps(activities_data, indent=2)}
+    def __init__(self, api_key: str, base_url: Optional[str] = None,
+                 prompt_mode: Optional[str] = None, output_mode: Optional[str] = None,
+                 modification_mode: Optional[str] = None, client=None,
+                 repair_attempts: Optional[int] = None, async_client=None, router: Optional[ModelRouter] = None):
+        self.api_key = api_key
+        self.base_url = base_url
+        # client permite injetar um cliente compatível (ex.: backends falsos dos benchmarks);
+        # sem ele, o SDK da OpenAI só é importado e instanciado no primeiro uso.
+        # router permite compartilhar o roteador de modelos com os demais serviços
+        self.router = router or ModelRouter.from_env(
+            {"openai": OpenAIBackend(api_key, base_url, client=client, async_client=async_client)}
+        )
+        self.prompt_mode = prompt_mode or os.getenv("ITINERARY_PROMPT_MODE", "full")
+        self.output_mode = output_mode or os.getenv("ITINERARY_OUTPUT_MODE", "analysis")
+        # "patch" aplica operações ao plano atual; "full" regenera o plano inteiro
+        self.modification_mode = modification_mode or os.getenv("MODIFICATION_MODE", "patch")
+        # Chamadas corretivas permitidas quando a resposta do modelo não é um plano válido
+        self.repair_attempts = (
+            repair_attempts if repair_attempts is not None else int(os.getenv("LLM_REPAIR_MAX_ATTEMPTS", "2"))
+        )
+
+    def _chat(self, task: str, **kwargs):
+        """Chamada ao LLM pelo roteador de modelos (itinerary ou modification)"""
+        return self.router.complete(task, **kwargs)
+
+    async def _achat(self, task: str, **kwargs):
+        """Versão assíncrona de _chat"""
+        return await self.router.acomplete(task, **kwargs)
+
+    def _build_itinerary_messages(self, vacation_info: VacationInfo, weather_data: list, activities_data: list,
+                                  interest_weights: Optional[Dict[str, int]] = None,
+                                  prompt_mode: str = "full", output_mode: str = "analysis") -> List[Dict]:
+        """Monta as mensagens do chat para geração do itinerário.
+
+        prompt_mode "compact" envia o contexto em tabelas sem indentação e pede
+        ao modelo apenas os IDs das atividades escolhidas. output_mode controla
+        se a resposta traz a seção de ANÁLISE ("analysis"), só o bloco JSON
+        ("no_analysis") ou usa o modo JSON nativo da API ("json").
         """
+        interest_weights = interest_weights or aggregate_interests(vacation_info.travelers)
+
+        if prompt_mode == "compact":
+            context = self._compact_context(interest_weights, weather_data, activities_data)
+            user_content = vacation_info.model_dump_json()
+        else:
+            context = f"""Interesses do grupo (interesse: nº de viajantes): {json.dumps(interest_weights)}
+Dados do clima: {json.dumps(weather_data, indent=2)}
+Atividades disponíveis: {json.dumps(activities_data, indent=2)}"""
+            user_content = vacation_info.model_dump_json(indent=2)
+
+        # Instruções e schema vêm do prefixo pré-compilado; só o contexto é montado por requisição
+        return [
+            {"role": "system", "content": ITINERARY_PROMPTS[(prompt_mode, output_mode)].render(context=context)},
+            {"role": "user", "content": user_content}
+        ]
+
+    @staticmethod
+    def _compact_context(interest_weights: Dict[str, int], weather_data: list, activities_data: list) -> str:
+        """Codifica interesses, clima e atividades em tabelas compactas"""
+        def cell(value) -> str:
+            return str(value).replace("|", "/").replace("\n", " ")
+
+        weather_rows = "\n".join(
+            f"{w['date']}|{cell(w.get('condition', ''))}|{w.get('temperature_min', w.get('temperature'))}|{w.get('temperature_max', w.get('temperature'))}"
+            for w in weather_data
+        )
+        activity_rows = "\n".join(
+            "|".join([
+                cell(a["activity_id"]),
+                str(a["start_time"])[:10],
+                f"{str(a['start_time'])[11:16]}-{str(a['end_time'])[11:16]}",
+                str(a.get("price", 0)),
+                ",".join(a.get("related_interests", [])),
+                cell(a.get("name", "")),
+                cell(a.get("location", ""))
+            ])
+            for a in activities_data
+        )
+        interests = ",".join(f"{interest}:{weight}" for interest, weight in interest_weights.items())
+
+        return (
+            f"Interesses (interesse:nº de viajantes): {interests}\n"
+            f"Clima (data|condição|mín °C|máx °C):\n{weather_rows}\n"
+            f"Atividades (id|data|início-fim|preço|interesses|nome|local):\n{activity_rows}"
+        )
+
+    def generate_itinerary(self, vacation_info: VacationInfo, weather_data: list, activities_data: list,
+                           interest_weights: Optional[Dict[str, int]] = None,
+                           prompt_mode: Optional[str] = None, output_mode: Optional[str] = None) -> TravelPlan:
+        travel_plan, _ = self.generate_itinerary_with_usage(
+            vacation_info, weather_data, activities_data, interest_weights, prompt_mode, output_mode
+        )
+        return travel_plan
+
+    def generate_itinerary_with_usage(self, vacation_info: VacationInfo, weather_data: list, activities_data: list,
+                                      interest_weights: Optional[Dict[str, int]] = None,
+                                      prompt_mode: Optional[str] = None,
+                                      output_mode: Optional[str] = None) -> Tuple[TravelPlan, Dict]:
+        """Gera o itinerário e retorna também o consumo de tokens da chamada"""
+        prompt_mode, output_mode, request = self._generation_request(
+            vacation_info, weather_data, activities_data, interest_weights, prompt_mode, output_mode
+        )
 
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": vacation_info.model_dump_json(indent=2)}
-                ],
-                temperature=0.7
+            response = self._chat("itinerary", **request)
+            return self._plan_from_generation_response(
+                response, request["messages"], vacation_info, weather_data, activities_data,
+                interest_weights, prompt_mode, output_mode
             )
 
-            content = response.choices[0].message.content
-            
-            # Extrair JSON da resposta
-            json_text = content.strip()
-            if "```json" in json_text:
-                json_text = json_text.split("```json")[1].split("```")[0].strip()
+        except RateLimitExceeded:
+            raise
+        except Exception as e:
+            raise Exception(f"Erro ao gerar itinerário: {str(e)}")
+
+    async def agenerate_itinerary_with_usage(self, vacation_info: VacationInfo, weather_data: list,
+                                             activities_data: list,
+                                             interest_weights: Optional[Dict[str, int]] = None,
+                                             prompt_mode: Optional[str] = None,
+                                             output_mode: Optional[str] = None) -> Tuple[TravelPlan, Dict]:
+        """Versão assíncrona de generate_itinerary_with_usage, para o modo ASGI"""
+        prompt_mode, output_mode, request = self._generation_request(
+            vacation_info, weather_data, activities_data, interest_weights, prompt_mode, output_mode
+        )
 
-            travel_plan = TravelPlan.model_validate_json(json_text)
-            return travel_plan
+        try:
+            response = await self._achat("itinerary", **request)
+            # O reparo de respostas inválidas pode fazer chamadas corretivas síncronas: roda fora do event loop
+            return await asyncio.to_thread(
+                self._plan_from_generation_response, response, request["messages"], vacation_info,
+                weather_data, activities_data, interest_weights, prompt_mode, output_mode
+            )
 
+        except RateLimitExceeded:
+            raise
         except Exception as e:
             raise Exception(f"Erro ao gerar itinerário: {str(e)}")
 
-    def modify_itinerary(self, current_plan: TravelPlan, modification_request: str) -> TravelPlan:
-        """Modifica um itinerário existente baseado em uma solicitação"""
-        system_prompt = """
-        Você é um especialista em modificação de itinerários de viagem.
-        Modifique o itinerário existente baseado na solicitação do usuário.
-        Mantenha a estrutura JSON original e faça apenas as alterações necessárias.
+    def _generation_request(self, vacation_info: VacationInfo, weather_data: list, activities_data: list,
+                            interest_weights: Optional[Dict[str, int]], prompt_mode: Optional[str],
+                            output_mode: Optional[str]) -> Tuple[str, str, Dict]:
+        """Valida os modos e monta os argumentos da chamada de geração"""
+        prompt_mode = prompt_mode or self.prompt_mode
+        output_mode = output_mode or self.output_mode
+        if prompt_mode not in PROMPT_MODES:
+            raise ValueError(f"prompt_mode inválido: {prompt_mode}")
+        if output_mode not in OUTPUT_MODES:
+            raise ValueError(f"output_mode inválido: {output_mode}")
+
+        messages = self._build_itinerary_messages(
+            vacation_info, weather_data, activities_data, interest_weights, prompt_mode, output_mode
+        )
+        request = {"messages": messages, "temperature": 0.7}
+        if output_mode == "json":
+            request["response_format"] = {"type": "json_object"}
+        return prompt_mode, output_mode, request
+
+    def _plan_from_generation_response(self, response, messages: List[Dict], vacation_info: VacationInfo,
+                                       weather_data: list, activities_data: list,
+                                       interest_weights: Optional[Dict[str, int]],
+                                       prompt_mode: str, output_mode: str) -> Tuple[TravelPlan, Dict]:
+        """Extrai o plano da resposta (reparando se preciso) e monta o resumo de uso"""
+        content = response.choices[0].message.content
+        usage = self._usage_dict(response)
+
+        repair_context = self._generation_repair_context(weather_data, activities_data, interest_weights)
+        if prompt_mode == "compact":
+            travel_plan, repair = self._parse_compact_plan_with_repair(
+                content, vacation_info, weather_data, activities_data, repair_context
+            )
+        else:
+            travel_plan, repair = self._parse_plan_with_repair(
+                content, self._plan_header(vacation_info), self._trip_dates(vacation_info), repair_context,
+                operation="generate"
+            )
+        self._add_usage(usage, repair.pop("usage", None))
+
+        usage.update({
+            "prompt_mode": prompt_mode,
+            "output_mode": output_mode,
+            "prompt_chars": sum(len(message["content"]) for message in messages),
+            "cacheable_prefix_tokens": ITINERARY_PROMPTS[(prompt_mode, output_mode)].prefix_tokens,
+            "repair": repair
+        })
+        return travel_plan, usage
+
+    def write_recommendation_reasons(self, vacation_info: VacationInfo, selection: Dict, weather_data: list,
+                                     interest_weights: Optional[Dict[str, int]] = None) -> Tuple[Dict[str, List[str]], Dict]:
+        """Pede ao modelo apenas os motivos das atividades já escolhidas pelo otimizador local"""
+        interest_weights = interest_weights or aggregate_interests(vacation_info.travelers)
+        conditions = {w.get("date"): w.get("condition", "") for w in weather_data}
+        rows = "\n".join(
+            f"{a['activity_id']}|{date}|{conditions.get(date, '')}|{','.join(a.get('related_interests', []))}|{a.get('name', '')}"
+            for date, activities in selection["days"].items() for a in activities
+        )
+        interests = ",".join(f"{interest}:{weight}" for interest, weight in interest_weights.items())
+
+        response = self._chat(
+            "itinerary",
+            messages=REASONS_PROMPT.messages(interests=interests, rows=rows, destination=vacation_info.destination),
+            temperature=0.5,
+            response_format={"type": "json_object"}
+        )
+
+        data, _ = loads_tolerant(response.choices[0].message.content)
+        chosen_ids = {a["activity_id"] for activities in selection["days"].values() for a in activities}
+        raw_reasons = data.get("reasons", {}) if isinstance(data, dict) else {}
+        reasons = {
+            activity_id: [str(reason) for reason in value][:3]
+            for activity_id, value in raw_reasons.items()
+            if activity_id in chosen_ids and isinstance(value, list) and value
+        }
+        return reasons, self._usage_dict(response)
+
+    @staticmethod
+    def _usage_dict(response) -> Dict:
+        """Extrai a contagem de tokens e o modelo que atendeu a chamada"""
+        usage = getattr(response, "usage", None)
+        return {
+            "prompt_tokens": getattr(usage, "prompt_tokens", None),
+            "completion_tokens": getattr(usage, "completion_tokens", None),
+            "total_tokens": getattr(usage, "total_tokens", None),
+            # Tokens do prompt atendidos pelo cache de prompt do provedor
+            "cached_tokens": getattr(usage, "cached_tokens", None),
+            "served_by": response.served_by()
+        }
+
+    def _parse_compact_plan_with_repair(self, content: str, vacation_info: VacationInfo, weather_data: list,
+                                        activities_data: list,
+                                        repair_context: Callable[[List[str]], str]) -> Tuple[TravelPlan, Dict]:
+        """Reconstrói o plano da resposta compacta, com o mesmo reparo do formato completo.
+
+        Os dias válidos da resposta compacta são aproveitados; dias ausentes,
+        sem data, fora do período ou sem atividades conhecidas são pedidos de
+        novo ao modelo pelas chamadas corretivas de _parse_plan_with_repair.
+        """
+        dates = self._trip_dates(vacation_info)
+        try:
+            compact_plan, repaired = loads_tolerant(content)
+            days, errors = self._hydrate_compact_days(compact_plan, dates, weather_data, activities_data)
+        except JSONRepairError as e:
+            days, errors, repaired = {}, [str(e)], False
+
+        if not errors:
+            outcome = "repaired_locally" if repaired else "parsed"
+            LLM_REPAIRS.inc(operation="generate", outcome=outcome)
+            itinerary_days = [days[date] for date in dates]
+            travel_plan = TravelPlan(
+                **self._plan_header(vacation_info),
+                total_cost=sum(rec.activity.price for day in itinerary_days for rec in day.activity_recommendations),
+                itinerary_days=itinerary_days
+            )
+            return travel_plan, {"outcome": outcome, "attempts": 0}
+
+        return self._repair_missing_days(
+            days, errors, self._plan_header(vacation_info), dates, repair_context, operation="generate"
+        )
+
+    @staticmethod
+    def _hydrate_compact_days(compact_plan, dates: List[str], weather_data: list,
+                              activities_data: list) -> Tuple[Dict[str, ItineraryDay], List[str]]:
+        """Reconstrói os ItineraryDay da resposta compacta (IDs e motivos) e lista os problemas encontrados"""
+        weather_by_date = {w["date"]: w for w in weather_data}
+        activities_by_id = {a["activity_id"]: a for a in activities_data}
+
+        compact_days = compact_plan.get("d") if isinstance(compact_plan, dict) else None
+        if not isinstance(compact_days, list):
+            return {}, ['campo "d" ausente ou não é uma lista']
+
+        # Agrupa as escolhas por data, recusando dias sem data ou fora do período
+        errors = []
+        choices_by_date: Dict[str, List[Dict]] = {}
+        for index, compact_day in enumerate(compact_days):
+            date = compact_day.get("date") if isinstance(compact_day, dict) else None
+            if date is None:
+                errors.append(f"d.{index}: campo date ausente")
+            elif date not in dates:
+                errors.append(f"d.{index}: data {date} fora do período da viagem")
+            elif not isinstance(compact_day.get("a"), list):
+                errors.append(f"dia {date}: campo a ausente ou não é uma lista")
+            else:
+                choices_by_date.setdefault(date, []).extend(
+                    choice for choice in compact_day["a"] if isinstance(choice, dict)
+                )
+
+        days: Dict[str, ItineraryDay] = {}
+        for date in dates:
+            if date not in choices_by_date:
+                errors.append(f"dia {date} ausente na resposta")
+                continue
+
+            # IDs que não existem no contexto são descartados
+            unknown = [choice.get("id") for choice in choices_by_date[date] if choice.get("id") not in activities_by_id]
+            if unknown:
+                errors.append(f"dia {date}: atividades inexistentes {unknown}")
+            recommendations = [
+                ActivityRecommendation(
+                    activity=Activity.model_validate(activities_by_id[choice["id"]]),
+                    reasons_for_recommendation=AIService._compact_reasons(choice.get("r"))
+                )
+                for choice in choices_by_date[date]
+                if choice.get("id") in activities_by_id
+            ]
+            if not recommendations:
+                errors.append(f"dia {date} sem nenhuma atividade válida")
+                continue
+
+            weather = weather_by_date.get(date) or {
+                "temperature": 25, "temperature_unit": "celsius", "condition": "unknown"
+            }
+            days[date] = ItineraryDay(
+                date=date,
+                weather=Weather.model_validate(weather),
+                activity_recommendations=recommendations
+            )
+
+        return days, errors
+
+    @staticmethod
+    def _compact_reasons(reasons) -> List[str]:
+        """Motivos da resposta compacta: aceita um texto único ou uma lista"""
+        if isinstance(reasons, str):
+            return [reasons]
+        return [str(reason) for reason in reasons] if isinstance(reasons, list) else []
+
+    def stream_itinerary(self, vacation_info: VacationInfo, weather_data: list, activities_data: list,
+                         interest_weights: Optional[Dict[str, int]] = None) -> Iterator[Tuple[str, object]]:
+        """Gera o itinerário em streaming.
+
+        Produz eventos ("token", texto) para cada trecho recebido do modelo,
+        ("day", ItineraryDay) assim que cada dia do JSON final estiver completo
+        e, por fim, ("plan", TravelPlan) com o plano validado.
         """
+        messages, options = self._stream_request(vacation_info, weather_data, activities_data, interest_weights)
+        parser = ItineraryDayStreamParser()
+        content = ""
 
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"Itinerário atual: {current_plan.model_dump_json()}\n\nModificação solicitada: {modification_request}"}
-                ],
-                temperature=0.7
+            stream, provider, model = self.router.stream("itinerary", messages=messages, **options)
+
+            for chunk in stream:
+                for event, payload in self._stream_chunk_events(chunk, parser, provider, model):
+                    if event == "token":
+                        content += payload
+                    yield event, payload
+
+            travel_plan, _ = self._parse_plan_with_repair(
+                content, self._plan_header(vacation_info), self._trip_dates(vacation_info),
+                self._generation_repair_context(weather_data, activities_data, interest_weights),
+                operation="stream"
             )
+            yield "plan", travel_plan
 
-            content = response.choices[0].message.content
-            
-            # Extrair JSON da resposta
-            json_text = content.strip()
-            if "```json" in json_text:
-                json_text = json_text.split("```json")[1].split("```")[0].strip()
+        except RateLimitExceeded:
+            raise
+        except Exception as e:
+            raise Exception(f"Erro ao gerar itinerário: {str(e)}")
 
-            modified_plan = TravelPlan.model_validate_json(json_text)
-            return modified_plan
+    async def astream_itinerary(self, vacation_info: VacationInfo, weather_data: list, activities_data: list,
+                                interest_weights: Optional[Dict[str, int]] = None) -> AsyncIterator[Tuple[str, object]]:
+        """Versão assíncrona de stream_itinerary, para o modo ASGI"""
+        messages, options = self._stream_request(vacation_info, weather_data, activities_data, interest_weights)
+        parser = ItineraryDayStreamParser()
+        content = ""
 
+        try:
+            stream, provider, model = await self.router.astream("itinerary", messages=messages, **options)
+
+            async for chunk in stream:
+                for event, payload in self._stream_chunk_events(chunk, parser, provider, model):
+                    if event == "token":
+                        content += payload
+                    yield event, payload
+
+            # O reparo pode fazer chamadas corretivas síncronas: roda fora do event loop
+            travel_plan, _ = await asyncio.to_thread(
+                self._parse_plan_with_repair,
+                content, self._plan_header(vacation_info), self._trip_dates(vacation_info),
+                self._generation_repair_context(weather_data, activities_data, interest_weights),
+                "stream"
+            )
+            yield "plan", travel_plan
+
+        except RateLimitExceeded:
+            raise
+        except Exception as e:
+            raise Exception(f"Erro ao gerar itinerário: {str(e)}")
+
+    def _stream_request(self, vacation_info: VacationInfo, weather_data: list, activities_data: list,
+                        interest_weights: Optional[Dict[str, int]]) -> Tuple[List[Dict], Dict]:
+        """Mensagens e opções da geração em streaming"""
+        # O streaming de dias depende do formato completo do TravelPlan
+        messages = self._build_itinerary_messages(
+            vacation_info, weather_data, activities_data, interest_weights, "full", self.output_mode
+        )
+        options = {"temperature": 0.7}
+        if self.output_mode == "json":
+            options["response_format"] = {"type": "json_object"}
+        return messages, options
+
+    @staticmethod
+    def _stream_chunk_events(chunk, parser: ItineraryDayStreamParser, provider: str,
+                             model: str) -> List[Tuple[str, object]]:
+        """Eventos de um chunk do streaming: o texto recebido e os dias que ele completou"""
+        # O último chunk traz apenas o consumo de tokens
+        usage = getattr(chunk, "usage", None)
+        if usage:
+            record_llm_usage(provider, model, usage.prompt_tokens, usage.completion_tokens)
+        if not chunk.choices:
+            return []
+        delta = chunk.choices[0].delta.content
+        if not delta:
+            return []
+
+        events: List[Tuple[str, object]] = [("token", delta)]
+        for raw_day in parser.feed(delta):
+            try:
+                events.append(("day", ItineraryDay.model_validate(raw_day)))
+            except ValidationError:
+                # Dias inválidos são reportados na validação do plano completo
+                pass
+        return events
+
+    def modify_itinerary(self, current_plan: TravelPlan, modification_request: str,
+                         vacation_info: Optional[VacationInfo] = None, mode: Optional[str] = None) -> TravelPlan:
+        """Modifica um itinerário existente baseado em uma solicitação"""
+        modified_plan, _ = self.modify_itinerary_with_details(current_plan, modification_request, vacation_info, mode)
+        return modified_plan
+
+    def modify_itinerary_with_details(self, current_plan: TravelPlan, modification_request: str,
+                                      vacation_info: Optional[VacationInfo] = None,
+                                      mode: Optional[str] = None) -> Tuple[TravelPlan, Dict]:
+        """Modifica o itinerário e informa como a modificação foi aplicada.
+
+        No modo "patch" o modelo retorna apenas operações sobre dias e
+        atividades, que são aplicadas ao plano atual; somente os dias
+        alterados são revalidados. Se o patch não puder ser aplicado ou
+        gerar dias inválidos, o plano completo é regenerado.
+        """
+        if (mode or self.modification_mode) == "patch":
+            try:
+                response = self._chat("modification", **self._patch_request(current_plan, modification_request))
+                return self._patched_plan(response, current_plan, vacation_info)
+            except RateLimitExceeded:
+                raise
+            except Exception as e:
+                print(f"Patch de modificação não aplicado, regenerando o plano: {e}")
+
+        try:
+            response = self._chat("modification", **self._full_modification_request(current_plan, modification_request))
+            modified_plan = self._plan_from_full_modification(
+                response, current_plan, modification_request, vacation_info
+            )
+        except RateLimitExceeded:
+            raise
         except Exception as e:
             raise Exception(f"Erro ao modificar itinerário: {str(e)}")
+        return modified_plan, {"mode": "full", "changed_dates": None, "served_by": response.served_by()}
+
+    async def amodify_itinerary_with_details(self, current_plan: TravelPlan, modification_request: str,
+                                             vacation_info: Optional[VacationInfo] = None,
+                                             mode: Optional[str] = None) -> Tuple[TravelPlan, Dict]:
+        """Versão assíncrona de modify_itinerary_with_details, para o modo ASGI"""
+        if (mode or self.modification_mode) == "patch":
+            try:
+                response = await self._achat("modification", **self._patch_request(current_plan, modification_request))
+                return self._patched_plan(response, current_plan, vacation_info)
+            except RateLimitExceeded:
+                raise
+            except Exception as e:
+                print(f"Patch de modificação não aplicado, regenerando o plano: {e}")
+
+        try:
+            response = await self._achat(
+                "modification", **self._full_modification_request(current_plan, modification_request)
+            )
+            # O reparo pode fazer chamadas corretivas síncronas: roda fora do event loop
+            modified_plan = await asyncio.to_thread(
+                self._plan_from_full_modification, response, current_plan, modification_request, vacation_info
+            )
+        except RateLimitExceeded:
+            raise
+        except Exception as e:
+            raise Exception(f"Erro ao modificar itinerário: {str(e)}")
+        return modified_plan, {"mode": "full", "changed_dates": None, "served_by": response.served_by()}
+
+    @staticmethod
+    def _patch_request(current_plan: TravelPlan, modification_request: str) -> Dict:
+        """Argumentos da chamada que pede ao modelo operações de modificação"""
+        return {
+            "messages": MODIFICATION_PATCH_PROMPT.messages(
+                plan=current_plan.model_dump_json(), request=modification_request
+            ),
+            "temperature": 0.2,
+            "response_format": {"type": "json_object"}
+        }
+
+    @staticmethod
+    def _patched_plan(response, current_plan: TravelPlan,
+                      vacation_info: Optional[VacationInfo]) -> Tuple[TravelPlan, Dict]:
+        """Aplica ao plano atual o patch da resposta e revalida somente os dias alterados"""
+        content = response.choices[0].message.content
+
+        try:
+            patch, _ = loads_tolerant(content)
+        except JSONRepairError as e:
+            raise PlanPatchError(f"Patch não é um JSON válido: {e}")
+
+        modified_plan, changed_dates = apply_plan_patch(
+            current_plan, patch.get("operations") if isinstance(patch, dict) else None
+        )
+        errors = TripValidator.validate_itinerary_days(
+            modified_plan, changed_dates, vacation_info, previous_cost=current_plan.total_cost
+        )
+        if errors:
+            raise PlanPatchError("; ".join(errors))
+        return modified_plan, {
+            "mode": "patch",
+            "changed_dates": [date.isoformat() for date in sorted(changed_dates)],
+            "served_by": response.served_by()
+        }
+
+    @staticmethod
+    def _full_modification_request(current_plan: TravelPlan, modification_request: str) -> Dict:
+        """Argumentos da chamada que regenera o plano completo com a modificação solicitada"""
+        return {
+            "messages": MODIFICATION_FULL_PROMPT.messages(
+                plan=current_plan.model_dump_json(), request=modification_request
+            ),
+            "temperature": 0.7
+        }
+
+    def _plan_from_full_modification(self, response, current_plan: TravelPlan, modification_request: str,
+                                     vacation_info: Optional[VacationInfo] = None) -> TravelPlan:
+        """Extrai o plano regenerado da resposta, reparando-o se preciso, e o valida como o patch.
+
+        O plano precisa manter a cidade e exatamente os dias do plano atual;
+        os dias que mudaram passam pelas mesmas regras do modo patch e o custo
+        total é recalculado a partir das atividades.
+        """
+        modified_plan, _ = self._parse_plan_with_repair(
+            response.choices[0].message.content,
+            {"city": current_plan.city, "start_date": current_plan.start_date, "end_date": current_plan.end_date},
+            [day.date.isoformat() for day in current_plan.itinerary_days],
+            self._modification_repair_context(current_plan, modification_request),
+            operation="modify"
+        )
+        modified_plan = modified_plan.model_copy(update={
+            "total_cost": sum(
+                rec.activity.price for day in modified_plan.itinerary_days for rec in day.activity_recommendations
+            )
+        })
+
+        current_days = {day.date: day for day in current_plan.itinerary_days}
+        changed_dates = {day.date for day in modified_plan.itinerary_days if current_days.get(day.date) != day}
+        errors = TripValidator.validate_plan_dates(modified_plan, current_days)
+        if modified_plan.city != current_plan.city:
+            errors.append(f"Cidade do plano alterada de {current_plan.city} para {modified_plan.city}")
+        errors += TripValidator.validate_itinerary_days(
+            modified_plan, changed_dates & set(current_days), vacation_info, previous_cost=current_plan.total_cost
+        )
+        if errors:
+            raise ValueError(f"Plano regenerado inválido: {'; '.join(errors)}")
+        return modified_plan
+
+    @staticmethod
+    def _plan_header(vacation_info: VacationInfo) -> Dict:
+        return {
+            "city": vacation_info.destination,
+            "start_date": vacation_info.date_of_arrival,
+            "end_date": vacation_info.date_of_departure
+        }
+
+    @staticmethod
+    def _trip_dates(vacation_info: VacationInfo) -> List[str]:
+        return date_range(vacation_info.date_of_arrival, vacation_info.date_of_departure)
+
+    @staticmethod
+    def _add_usage(usage: Dict, extra: Optional[Dict]):
+        """Soma ao consumo da chamada principal os tokens das chamadas corretivas"""
+        if not extra:
+            return
+        for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+            if extra.get(key) is not None:
+                usage[key] = (usage.get(key) or 0) + extra[key]
+
+    @staticmethod
+    def _generation_repair_context(weather_data: list, activities_data: list,
+                                   interest_weights: Optional[Dict[str, int]]) -> Callable[[List[str]], str]:
+        """Contexto reenviado na correção: apenas clima e atividades dos dias que faltam"""
+        def context(missing_dates: List[str]) -> str:
+            return json.dumps({
+                "interesses": interest_weights or {},
+                "clima": [w for w in weather_data if w.get("date") in missing_dates],
+                "atividades": [a for a in activities_data if str(a.get("start_time", ""))[:10] in missing_dates]
+            }, default=str)
+        return context
+
+    @staticmethod
+    def _modification_repair_context(current_plan: TravelPlan, modification_request: str) -> Callable[[List[str]], str]:
+        """Contexto reenviado na correção: a modificação pedida e os dias atuais que faltam"""
+        def context(missing_dates: List[str]) -> str:
+            days = [
+                day.model_dump(mode="json") for day in current_plan.itinerary_days
+                if day.date.isoformat() in missing_dates
+            ]
+            return json.dumps({"modificacao_solicitada": modification_request, "dias_atuais": days})
+        return context
+
+    @staticmethod
+    def _salvage_days(content: str) -> Tuple[Dict[str, ItineraryDay], List[str]]:
+        """Aproveita os ItineraryDay válidos de uma resposta inválida ou truncada"""
+        parser = ItineraryDayStreamParser()
+        days: Dict[str, ItineraryDay] = {}
+        errors = []
+        for raw_day in parser.feed(content):
+            try:
+                day = ItineraryDay.model_validate(raw_day)
+            except ValidationError as e:
+                label = raw_day.get("date", "?") if isinstance(raw_day, dict) else "?"
+                errors.extend(
+                    f"dia {label}, campo {'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+                    for error in e.errors()[:5]
+                )
+                continue
+            days.setdefault(day.date.isoformat(), day)
+        return days, errors
+
+    def _parse_plan_with_repair(self, content: str, header: Dict, dates: List[str],
+                                repair_context: Callable[[List[str]], str], operation: str) -> Tuple[TravelPlan, Dict]:
+        """Converte a resposta em TravelPlan, reparando-a quando possível.
+
+        Tenta primeiro o JSON como veio e depois com reparos locais (vírgulas
+        sobrando, truncamento). Se ainda assim o plano for inválido, os dias
+        válidos são aproveitados e somente os dias que faltam são pedidos de
+        novo ao modelo, junto com os erros encontrados, em até
+        self.repair_attempts chamadas curtas.
+        """
+        errors = []
+        try:
+            data, repaired = loads_tolerant(content)
+            travel_plan = TravelPlan.model_validate(data)
+            errors = TripValidator.validate_plan_dates(
+                travel_plan, [datetime.date.fromisoformat(date) for date in dates]
+            )
+            if not errors:
+                outcome = "repaired_locally" if repaired else "parsed"
+                LLM_REPAIRS.inc(operation=operation, outcome=outcome)
+                return travel_plan, {"outcome": outcome, "attempts": 0}
+        except JSONRepairError as e:
+            errors.append(str(e))
+        except ValidationError as e:
+            errors.extend(
+                f"campo {'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()[:10]
+            )
+
+        days, day_errors = self._salvage_days(content)
+        errors.extend(day_errors)
+        return self._repair_missing_days(days, errors, header, dates, repair_context, operation)
+
+    def _repair_missing_days(self, days: Dict[str, ItineraryDay], errors: List[str], header: Dict, dates: List[str],
+                             repair_context: Callable[[List[str]], str], operation: str) -> Tuple[TravelPlan, Dict]:
+        """Completa os dias válidos já obtidos pedindo ao modelo somente os que faltam.
+
+        Dias fora de dates são descartados; o plano final tem exatamente um dia
+        por data, na ordem.
+        """
+        salvaged = sum(1 for date in dates if date in days)
+        missing = [date for date in dates if date not in days]
+        attempts = 0
+        usage: Dict = {}
+        task = "modification" if operation == "modify" else "itinerary"
+
+        while missing and attempts < self.repair_attempts:
+            attempts += 1
+            try:
+                repaired_days, errors, call_usage = self._request_missing_days(
+                    missing, errors, repair_context(missing), task
+                )
+                self._add_usage(usage, call_usage)
+            except RateLimitExceeded:
+                raise
+            except Exception as e:
+                errors = [str(e)]
+                continue
+            for date in missing:
+                if date in repaired_days:
+                    days[date] = repaired_days[date]
+            missing = [date for date in dates if date not in days]
+
+        if missing:
+            LLM_REPAIRS.inc(operation=operation, outcome="failed")
+            raise ValueError(f"Resposta do modelo inválida para os dias {missing}: {'; '.join(errors[:5])}")
+
+        itinerary_days = [days[date] for date in dates]
+        outcome = "reprompted" if attempts else "salvaged"
+        LLM_REPAIRS.inc(operation=operation, outcome=outcome)
+        travel_plan = TravelPlan(
+            **header,
+            total_cost=sum(rec.activity.price for day in itinerary_days for rec in day.activity_recommendations),
+            itinerary_days=itinerary_days
+        )
+        return travel_plan, {"outcome": outcome, "attempts": attempts, "salvaged_days": salvaged, "usage": usage}
+
+    def _request_missing_days(self, missing_dates: List[str], errors: List[str], context: str,
+                              task: str = "itinerary") -> Tuple[Dict[str, ItineraryDay], List[str], Dict]:
+        """Chamada corretiva: pede somente os dias que faltam, informando os erros anteriores"""
+        error_lines = "\n".join(f"- {error}" for error in errors[:10]) or "- resposta incompleta"
+
+        response = self._chat(
+            task,
+            messages=REPAIR_DAYS_PROMPT.messages(dates=", ".join(missing_dates), errors=error_lines, context=context),
+            temperature=0.2,
+            response_format={"type": "json_object"}
+        )
+        days, day_errors = self._salvage_days(response.choices[0].message.content)
+        return days, day_errors, self._usage_dict(response)
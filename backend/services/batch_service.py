@@ -0,0 +1,132 @@
+import datetime
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from models.schemas import VacationInfo
+from storage.activity_store import normalize_city
+from utils.dates import date_range
+from utils.interests import aggregate_interests
+from utils.rate_limiter import RateLimitExceeded
+
+def group_trips(trips: List[Tuple[int, VacationInfo]], max_group_days: int = 14) -> List[Dict]:
+    """Agrupa viagens pelo mesmo destino com períodos sobrepostos ou contíguos.
+
+    Cada grupo cobre a união dos períodos dos membros (até max_group_days
+    dias) e a soma dos interesses de todos os viajantes, para que o contexto
+    seja coletado uma única vez.
+    """
+    by_destination: Dict[str, List[Tuple[int, VacationInfo]]] = {}
+    for index, vacation_info in trips:
+        by_destination.setdefault(normalize_city(vacation_info.destination), []).append((index, vacation_info))
+
+    groups = []
+    for members in by_destination.values():
+        members.sort(key=lambda member: (member[1].date_of_arrival, member[0]))
+        current = None
+        for index, vacation_info in members:
+            if current is not None:
+                start = min(current["start"], vacation_info.date_of_arrival)
+                end = max(current["end"], vacation_info.date_of_departure)
+                touches = vacation_info.date_of_arrival <= current["end"] + datetime.timedelta(days=1)
+                if touches and (end - start).days + 1 <= max_group_days:
+                    current["start"], current["end"] = start, end
+                    current["members"].append((index, vacation_info))
+                    continue
+            current = {
+                "destination": vacation_info.destination,
+                "start": vacation_info.date_of_arrival,
+                "end": vacation_info.date_of_departure,
+                "members": [(index, vacation_info)]
+            }
+            groups.append(current)
+
+    for group in groups:
+        travelers = [traveler for _, vacation_info in group["members"] for traveler in vacation_info.travelers]
+        group["interest_weights"] = aggregate_interests(travelers)
+        group["dates"] = date_range(group["start"], group["end"])
+    return groups
+
+def slice_context(context: Dict, dates: List[str]) -> Dict:
+    """Recorta o contexto de um grupo para as datas de uma viagem"""
+    wanted = set(dates)
+    return {
+        "weather": [w for w in context["weather"] if w.get("date") in wanted],
+        "activities": [a for a in context["activities"] if str(a.get("start_time", ""))[:10] in wanted],
+        "gallery": context["gallery"]
+    }
+
+class BatchItineraryRunner:
+    """Gera vários itinerários compartilhando a coleta de contexto por grupo de viagens.
+
+    gather_fn(city, dates, interests, interest_weights) coleta o contexto de um
+    grupo; generate_fn(vacation_info, context) gera e valida o plano de uma
+    viagem. As coletas e as chamadas ao LLM rodam em pools limitados e os
+    resultados são produzidos na ordem em que terminam.
+    """
+
+    def __init__(self, gather_fn: Callable[..., Dict], generate_fn: Callable[[VacationInfo, Dict], Dict],
+                 llm_concurrency: Optional[int] = None, gather_concurrency: Optional[int] = None,
+                 max_group_days: Optional[int] = None):
+        self.gather_fn = gather_fn
+        self.generate_fn = generate_fn
+        self.llm_concurrency = llm_concurrency or int(os.getenv("BATCH_LLM_CONCURRENCY", "4"))
+        self.gather_concurrency = gather_concurrency or int(os.getenv("BATCH_GATHER_CONCURRENCY", "2"))
+        self.max_group_days = max_group_days or int(os.getenv("BATCH_MAX_GROUP_DAYS", "14"))
+
+    def run(self, trips: List[Tuple[int, VacationInfo]]) -> Iterator[Dict]:
+        """Produz {"index", "status": "ok", ...resultado} ou {"index", "status": "error", "error"} por viagem"""
+        groups = group_trips(trips, self.max_group_days)
+        results: "queue.Queue[Dict]" = queue.Queue()
+        gather_pool = ThreadPoolExecutor(max_workers=self.gather_concurrency, thread_name_prefix="batch-gather")
+        llm_pool = ThreadPoolExecutor(max_workers=self.llm_concurrency, thread_name_prefix="batch-llm")
+
+        def generate_trip(index: int, group_id: int, vacation_info: VacationInfo, context: Dict):
+            try:
+                trip_context = slice_context(context, date_range(vacation_info.date_of_arrival, vacation_info.date_of_departure))
+                result = self.generate_fn(vacation_info, trip_context)
+                results.put({"index": index, "group": group_id, "status": "ok", **result})
+            except RateLimitExceeded as e:
+                results.put({"index": index, "group": group_id, "status": "error", "error": str(e),
+                             "retry_after": e.retry_after})
+            except Exception as e:
+                results.put({"index": index, "group": group_id, "status": "error", "error": str(e)})
+
+        def gather_group(group_id: int, group: Dict):
+            try:
+                context = self.gather_fn(
+                    city=group["destination"],
+                    dates=group["dates"],
+                    interests=list(group["interest_weights"]),
+                    interest_weights=group["interest_weights"]
+                )
+            except Exception as e:
+                retry_after = {"retry_after": e.retry_after} if isinstance(e, RateLimitExceeded) else {}
+                for index, _ in group["members"]:
+                    results.put({"index": index, "group": group_id, "status": "error",
+                                 "error": f"Erro ao coletar contexto: {e}", **retry_after})
+                return
+            for index, vacation_info in group["members"]:
+                llm_pool.submit(generate_trip, index, group_id, vacation_info, context)
+
+        try:
+            for group_id, group in enumerate(groups):
+                gather_pool.submit(gather_group, group_id, group)
+            for _ in range(len(trips)):
+                yield results.get()
+        finally:
+            # Se o cliente desconectar, o trabalho ainda não iniciado é descartado
+            gather_pool.shutdown(wait=False, cancel_futures=True)
+            llm_pool.shutdown(wait=False, cancel_futures=True)
+
+    def describe_groups(self, trips: List[Tuple[int, VacationInfo]]) -> List[Dict]:
+        return [
+            {
+                "group": group_id,
+                "destination": group["destination"],
+                "start_date": group["start"].isoformat(),
+                "end_date": group["end"].isoformat(),
+                "trips": [index for index, _ in group["members"]]
+            }
+            for group_id, group in enumerate(group_trips(trips, self.max_group_days))
+        ]
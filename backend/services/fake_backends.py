@@ -0,0 +1,442 @@
+"""Backends falsos, determinísticos e offline para OpenAI, Gemini, OpenWeather e Unsplash.
+
+Usados pelo modo FAKE_BACKENDS=true do app e pela suíte de benchmarks. Cada
+backend simula latência e taxa de erro configuráveis e conta as chamadas
+recebidas, permitindo medir o pipeline sem acesso à rede.
+"""
+import asyncio
+import datetime
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+import requests
+from utils.prompts import INTEREST_VOCABULARY
+
+class FakeUpstreamError(Exception):
+    """Erro simulado de um upstream falso"""
+    pass
+
+class FakeBehavior:
+    """Latência, taxa de erro e contadores compartilhados pelos backends falsos"""
+
+    def __init__(self, latency_ms: float = 50, jitter_ms: float = 10, error_rate: float = 0.0, seed: int = 42,
+                 malformed_rate: float = 0.0, upstream_latency_ms: Optional[Dict[str, float]] = None):
+        self.latency_ms = latency_ms
+        # Latência própria de alguns upstreams (ex.: {"openai": 3000} para exercitar o failover de modelos)
+        self.upstream_latency_ms = upstream_latency_ms or {}
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        # Fração das respostas de plano do LLM que chegam truncadas (exercita o reparo de JSON)
+        self.malformed_rate = malformed_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+
+    def _draw(self, upstream: str):
+        """Registra a chamada e sorteia a latência e se ela vai falhar"""
+        with self._lock:
+            self.calls[upstream] = self.calls.get(upstream, 0) + 1
+            latency = self.upstream_latency_ms.get(upstream, self.latency_ms)
+            delay = max(0.0, self._random.gauss(latency, self.jitter_ms)) / 1000
+            fail = self._random.random() < self.error_rate
+            if fail:
+                self.errors[upstream] = self.errors.get(upstream, 0) + 1
+        return delay, fail
+
+    def simulate(self, upstream: str, error_factory=FakeUpstreamError, timeout: Optional[float] = None):
+        """Registra a chamada, aguarda a latência simulada e eventualmente falha (ou estoura o timeout)"""
+        delay, fail = self._draw(upstream)
+        if timeout and delay > timeout:
+            time.sleep(timeout)
+            raise error_factory(f"Timeout simulado em {upstream}")
+        time.sleep(delay)
+        if fail:
+            raise error_factory(f"Erro simulado em {upstream}")
+
+    async def asimulate(self, upstream: str, error_factory=FakeUpstreamError, timeout: Optional[float] = None):
+        """Versão de simulate que aguarda sem bloquear o event loop"""
+        delay, fail = self._draw(upstream)
+        if timeout and delay > timeout:
+            await asyncio.sleep(timeout)
+            raise error_factory(f"Timeout simulado em {upstream}")
+        await asyncio.sleep(delay)
+        if fail:
+            raise error_factory(f"Erro simulado em {upstream}")
+
+    def malformed(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.malformed_rate
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {"calls": dict(self.calls), "errors": dict(self.errors)}
+
+def _seeded_random(*parts) -> random.Random:
+    """Gerador determinístico a partir do conteúdo da requisição"""
+    digest = hashlib.sha256("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return random.Random(int(digest[:16], 16))
+
+def _usage(prompt: str, completion: str) -> SimpleNamespace:
+    prompt_tokens = len(prompt) // 4
+    completion_tokens = len(completion) // 4
+    return SimpleNamespace(
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        total_tokens=prompt_tokens + completion_tokens
+    )
+
+class FakeOpenAIClient:
+    """Imita client.chat.completions.create do SDK da OpenAI.
+
+    Reconhece os formatos de prompt do AIService (plano completo, plano
+    compacto e patch de modificação) e do ActivitiesService (quando o
+    roteador de modelos usa a OpenAI para atividades) e responde com JSON
+    válido para cada um.
+    """
+
+    def __init__(self, behavior: FakeBehavior):
+        self.behavior = behavior
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model: str, messages: List[Dict], stream: bool = False, timeout: Optional[float] = None,
+                **kwargs):
+        self.behavior.simulate("openai", timeout=timeout)
+        return self._respond(model, messages, stream, **kwargs)
+
+    def _respond(self, model: str, messages: List[Dict], stream: bool = False, **kwargs):
+        system_prompt = messages[0]["content"]
+        user_content = messages[-1]["content"]
+
+        if re.search(r"Gere \d+ atividades", user_content):
+            content = FakeGeminiClient._respond(user_content).text
+        elif '"operations"' in system_prompt:
+            content = self._patch_response(user_content)
+        elif '{"reasons": {' in system_prompt:
+            ids = re.findall(r"^\s*([^|\s]+)\|\d{4}-\d{2}-\d{2}\|", user_content, re.M)
+            content = json.dumps({"reasons": {activity_id: ["Escolhida pelo otimizador local"] for activity_id in ids}})
+        elif '{"d": [' in system_prompt:
+            content = json.dumps(self._compact_plan(system_prompt, user_content))
+        elif user_content.startswith("Dias a gerar:"):
+            content = json.dumps(self._repair_days(user_content))
+        elif user_content.startswith("Itinerário atual:"):
+            content = "```json\n" + user_content.split("Itinerário atual: ", 1)[1].split("\n\nModificação solicitada:")[0] + "\n```"
+        elif kwargs.get("response_format"):
+            content = json.dumps(self._full_plan(system_prompt, user_content))
+        else:
+            content = "ANÁLISE:\n- Plano gerado offline.\n\nSAÍDA FINAL:\n\n```json\n" + json.dumps(self._full_plan(system_prompt, user_content)) + "\n```"
+
+        if "itinerary_days" in content and not user_content.startswith("Dias a gerar:") and self.behavior.malformed():
+            content = content[:int(len(content) * 0.6)]
+
+        if stream:
+            return self._stream(content, _usage(system_prompt + user_content, content))
+
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=_usage(system_prompt + user_content, content),
+            model=model
+        )
+
+    @staticmethod
+    def _stream(content: str, usage: SimpleNamespace, chunk_size: int = 16) -> Iterator[SimpleNamespace]:
+        for start in range(0, len(content), chunk_size):
+            yield SimpleNamespace(
+                choices=[SimpleNamespace(delta=SimpleNamespace(content=content[start:start + chunk_size]))],
+                usage=None
+            )
+        yield SimpleNamespace(choices=[], usage=usage)
+
+    @staticmethod
+    def _group_interests(vacation_info: Dict) -> List[str]:
+        return sorted({interest for traveler in vacation_info.get("travelers", []) for interest in traveler.get("interests", [])})
+
+    @staticmethod
+    def _choose_activities(activities: List[Dict], dates: List[str], group_interests: List[str]) -> Dict[str, List[Dict]]:
+        """Escolhe a primeira atividade de cada dia e outras que cubram interesses pendentes"""
+        uncovered = set(group_interests)
+        chosen: Dict[str, List[Dict]] = {date: [] for date in dates}
+        for activity in activities:
+            date = str(activity.get("start_time", ""))[:10]
+            if date not in chosen:
+                continue
+            covers = uncovered & set(activity.get("related_interests", []))
+            if not chosen[date] or covers:
+                chosen[date].append(activity)
+                uncovered -= covers
+        return chosen
+
+    @classmethod
+    def _full_plan(cls, system_prompt: str, user_content: str) -> Dict:
+        vacation_info = json.loads(user_content)
+        activities = []
+        marker = "Atividades disponíveis: "
+        if marker in system_prompt:
+            try:
+                activities, _ = json.JSONDecoder().raw_decode(system_prompt.split(marker, 1)[1])
+            except json.JSONDecodeError:
+                activities = []
+
+        start = datetime.date.fromisoformat(vacation_info["date_of_arrival"])
+        end = datetime.date.fromisoformat(vacation_info["date_of_departure"])
+        dates = [(start + datetime.timedelta(days=offset)).isoformat() for offset in range((end - start).days + 1)]
+        chosen = cls._choose_activities(activities, dates, cls._group_interests(vacation_info))
+
+        days = []
+        total_cost = 0
+        for date in dates:
+            day_activities = chosen[date] or [{
+                "activity_id": f"fake-{date}-1",
+                "name": "Passeio pela cidade",
+                "start_time": f"{date} 10:00",
+                "end_time": f"{date} 12:00",
+                "location": vacation_info["destination"],
+                "description": "Atividade gerada offline",
+                "price": 0,
+                "related_interests": []
+            }]
+            total_cost += sum(a.get("price", 0) for a in day_activities)
+            days.append({
+                "date": date,
+                "weather": {"temperature": 25, "temperature_unit": "celsius", "condition": "clear"},
+                "activity_recommendations": [
+                    {"activity": a, "reasons_for_recommendation": ["Combina com os interesses do grupo"]}
+                    for a in day_activities
+                ]
+            })
+
+        return {
+            "city": vacation_info["destination"],
+            "start_date": vacation_info["date_of_arrival"],
+            "end_date": vacation_info["date_of_departure"],
+            "total_cost": total_cost,
+            "itinerary_days": days
+        }
+
+    @classmethod
+    def _compact_plan(cls, system_prompt: str, user_content: str) -> Dict:
+        activities = []
+        for line in system_prompt.splitlines():
+            cells = line.strip().split("|")
+            if len(cells) == 7 and re.match(r"\d{4}-\d{2}-\d{2}$", cells[1]):
+                activities.append({
+                    "activity_id": cells[0],
+                    "start_time": cells[1],
+                    "related_interests": [interest for interest in cells[4].split(",") if interest]
+                })
+        dates = sorted({activity["start_time"] for activity in activities})
+        chosen = cls._choose_activities(activities, dates, cls._group_interests(json.loads(user_content)))
+        return {"d": [
+            {"date": date, "a": [{"id": a["activity_id"], "r": ["Combina com o grupo"]} for a in chosen[date]]}
+            for date in dates
+        ]}
+
+    @staticmethod
+    def _repair_days(user_content: str) -> Dict:
+        dates = user_content.split("\n", 1)[0].split(":", 1)[1].split(",")
+        context = json.loads(user_content.split("Contexto: ", 1)[1])
+        days = []
+        for date in (date.strip() for date in dates):
+            activities = [a for a in context.get("atividades", []) if str(a.get("start_time", "")).startswith(date)][:1]
+            if not activities:
+                activities = [day["activity_recommendations"][0]["activity"]
+                              for day in context.get("dias_atuais", []) if day["date"] == date][:1]
+            days.append({
+                "date": date,
+                "weather": {"temperature": 25, "temperature_unit": "celsius", "condition": "clear"},
+                "activity_recommendations": [
+                    {"activity": a, "reasons_for_recommendation": ["Reparado"]} for a in activities
+                ]
+            })
+        return {"itinerary_days": days}
+
+    @staticmethod
+    def _patch_response(user_content: str) -> str:
+        plan = json.loads(user_content.split("Itinerário atual: ", 1)[1].split("\n\nModificação solicitada:")[0])
+        first_day = plan["itinerary_days"][0]
+        first_activity = first_day["activity_recommendations"][0]["activity"]
+        return json.dumps({"operations": [{
+            "op": "update_reasons",
+            "date": first_day["date"],
+            "activity_id": first_activity["activity_id"],
+            "reasons": ["Ajustado conforme a solicitação"]
+        }]})
+
+class FakeAsyncOpenAIClient(FakeOpenAIClient):
+    """Imita o AsyncOpenAI: mesmas respostas, com a latência aguardada no event loop"""
+
+    async def _create(self, model: str, messages: List[Dict], stream: bool = False, timeout: Optional[float] = None,
+                      **kwargs):
+        await self.behavior.asimulate("openai", timeout=timeout)
+        response = self._respond(model, messages, stream, **kwargs)
+        return self._astream(response) if stream else response
+
+    @staticmethod
+    async def _astream(chunks: Iterator[SimpleNamespace]) -> AsyncIterator[SimpleNamespace]:
+        for chunk in chunks:
+            await asyncio.sleep(0)
+            yield chunk
+
+class FakeGeminiClient:
+    """Imita client.models.generate_content (e client.aio) do SDK do Gemini.
+
+    Chamadas com system_instruction (itinerários roteados para o Gemini) são
+    respondidas como o FakeOpenAIClient responderia às mesmas mensagens.
+    """
+
+    INTERESTS = INTEREST_VOCABULARY
+
+    def __init__(self, behavior: FakeBehavior):
+        self.behavior = behavior
+        self.models = SimpleNamespace(generate_content=self._generate_content)
+        self.aio = SimpleNamespace(models=SimpleNamespace(generate_content=self._agenerate_content))
+        self._chat_responder = FakeOpenAIClient(behavior)
+
+    def _generate_content(self, model: str, contents: str, config: Optional[Dict] = None, **kwargs):
+        self.behavior.simulate("gemini", timeout=self._timeout(config))
+        return self._respond_with_config(model, contents, config)
+
+    async def _agenerate_content(self, model: str, contents: str, config: Optional[Dict] = None, **kwargs):
+        await self.behavior.asimulate("gemini", timeout=self._timeout(config))
+        return self._respond_with_config(model, contents, config)
+
+    @staticmethod
+    def _timeout(config: Optional[Dict]) -> Optional[float]:
+        timeout_ms = (config or {}).get("http_options", {}).get("timeout")
+        return timeout_ms / 1000 if timeout_ms else None
+
+    def _respond_with_config(self, model: str, contents: str, config: Optional[Dict]):
+        if not (config or {}).get("system_instruction"):
+            return self._respond(contents)
+        options = {"response_format": {"type": "json_object"}} if config.get("response_mime_type") else {}
+        response = self._chat_responder._respond(
+            model, [{"role": "system", "content": config["system_instruction"]}, {"role": "user", "content": contents}],
+            **options
+        )
+        return SimpleNamespace(
+            text=response.choices[0].message.content,
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=response.usage.prompt_tokens, candidates_token_count=response.usage.completion_tokens
+            )
+        )
+
+    @classmethod
+    def _respond(cls, contents: str):
+        count = int(re.search(r"Gere (\d+) atividades", contents).group(1))
+        city_match = re.search(r"atividades turísticas para (.+?) (?:em CADA|na data)", contents)
+        city = city_match.group(1) if city_match else "Local"
+        batch = re.search(r"datas: ([\d\-, ]+)\.", contents)
+        interests_line = re.search(r"Interesses[^:]*: (.*)", contents)
+        interests = [
+            interest for interest in cls.INTERESTS
+            if interests_line and re.search(rf"\b{interest}\b", interests_line.group(1))
+        ] or ["art", "music"]
+
+        if batch:
+            dates = [date.strip() for date in batch.group(1).split(",")]
+            payload = {date: cls._activities(city, date, count, interests) for date in dates}
+        else:
+            date = re.search(r"na data (\d{4}-\d{2}-\d{2})", contents).group(1)
+            payload = cls._activities(city, date, count, interests)
+
+        text = json.dumps(payload)
+        return SimpleNamespace(
+            text=text,
+            usage_metadata=SimpleNamespace(prompt_token_count=len(contents) // 4, candidates_token_count=len(text) // 4)
+        )
+
+    @staticmethod
+    def _activities(city: str, date: str, count: int, interests: List[str]) -> List[Dict]:
+        rng = _seeded_random("gemini", city, date)
+        offset = rng.randrange(len(interests))
+        activities = []
+        for index in range(count):
+            start_hour = 9 + index * 3
+            activities.append({
+                "activity_id": f"event-{date}-{index + 1}",
+                "name": f"Atividade {index + 1} em {city}",
+                "start_time": f"{date} {start_hour:02d}:00",
+                "end_time": f"{date} {start_hour + 2:02d}:00",
+                "location": f"Centro de {city}",
+                "description": "Atividade gerada offline (indoor)",
+                "price": rng.randint(0, 40),
+                "related_interests": [interests[(offset + index) % len(interests)]]
+            })
+        return activities
+
+class FakeResponse:
+    """Resposta HTTP mínima com status_code e json()"""
+
+    def __init__(self, payload: Dict, status_code: int = 200):
+        self._payload = payload
+        self.status_code = status_code
+
+    def json(self) -> Dict:
+        return self._payload
+
+class FakeHTTPClient:
+    """Imita o HTTPClient compartilhado para OpenWeather e Unsplash"""
+
+    def __init__(self, name: str, behavior: FakeBehavior, forecast_days: int = 5):
+        self.name = name
+        self.behavior = behavior
+        self.forecast_days = forecast_days
+
+    def get(self, url: str, **kwargs) -> FakeResponse:
+        return self.request("GET", url, **kwargs)
+
+    def request(self, method: str, url: str, params: Optional[Dict] = None, **kwargs) -> FakeResponse:
+        self.behavior.simulate(self.name, error_factory=requests.ConnectionError)
+        return self._respond(url, params or {})
+
+    def _respond(self, url: str, params: Dict) -> FakeResponse:
+        if url.endswith("/forecast"):
+            return FakeResponse(self._forecast(params.get("q", "")))
+        if url.endswith("/search/photos"):
+            return FakeResponse(self._photos(params.get("query", ""), int(params.get("per_page", 5))))
+        return FakeResponse({}, status_code=404)
+
+    def _forecast(self, city: str) -> Dict:
+        rng = _seeded_random("weather", city.lower())
+        start = datetime.datetime.combine(datetime.date.today(), datetime.time(), tzinfo=datetime.timezone.utc)
+        conditions = [("Clear", "céu limpo"), ("Clouds", "nublado"), ("Rain", "chuva leve")]
+        entries = []
+        for step in range(self.forecast_days * 8):
+            condition, description = rng.choice(conditions)
+            entries.append({
+                "dt": int((start + datetime.timedelta(hours=3 * step)).timestamp()),
+                "main": {"temp": round(rng.uniform(12, 30), 1)},
+                "weather": [{"main": condition, "description": description}]
+            })
+        return {"list": entries, "city": {"timezone": 0}}
+
+    @staticmethod
+    def _photos(query: str, count: int) -> Dict:
+        slug = re.sub(r"\W+", "-", query.lower()).strip("-")
+        return {"results": [
+            {
+                "id": f"fake-{slug}-{index}",
+                "urls": {
+                    "regular": f"https://picsum.photos/seed/{slug}-{index}/800/600",
+                    "thumb": f"https://picsum.photos/seed/{slug}-{index}/200/150"
+                },
+                "description": f"Imagem offline de {query}",
+                "user": {"name": "Fake", "links": {"html": "https://picsum.photos"}}
+            }
+            for index in range(count)
+        ]}
+
+class FakeAsyncHTTPClient(FakeHTTPClient):
+    """Imita o AsyncHTTPClient compartilhado para OpenWeather e Unsplash"""
+
+    async def get(self, url: str, **kwargs) -> FakeResponse:
+        return await self.request("GET", url, **kwargs)
+
+    async def request(self, method: str, url: str, params: Optional[Dict] = None, **kwargs) -> FakeResponse:
+        await self.behavior.asimulate(self.name, error_factory=requests.ConnectionError)
+        return self._respond(url, params or {})
@@ -0,0 +1,211 @@
+import asyncio
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+from utils.metrics import stage_span
+from utils.rate_limiter import RateLimitExceeded
+
+class ContextGatherer:
+    """Coleta clima, atividades e imagens do destino de forma concorrente"""
+
+    def __init__(self, weather_service, activities_service, image_service,
+                 weather_concurrency: Optional[int] = None,
+                 activities_concurrency: Optional[int] = None,
+                 images_concurrency: Optional[int] = None,
+                 deadline_seconds: Optional[float] = None):
+        self.weather_service = weather_service
+        self.activities_service = activities_service
+        self.image_service = image_service
+
+        # Limites de concorrência por fonte externa
+        self.limits = {
+            "weather": weather_concurrency or int(os.getenv("GATHER_WEATHER_CONCURRENCY", "4")),
+            "activities": activities_concurrency or int(os.getenv("GATHER_ACTIVITIES_CONCURRENCY", "4")),
+            "images": images_concurrency or int(os.getenv("GATHER_IMAGES_CONCURRENCY", "2")),
+        }
+        self.deadline_seconds = deadline_seconds or float(os.getenv("GATHER_DEADLINE_SECONDS", "45"))
+
+        # Um executor por fonte, do tamanho do seu limite: o limite é a própria fila do
+        # executor, sem threads paradas esperando vaga, e uma fonte lenta (atividades)
+        # não atrasa as chamadas rápidas das outras (clima, galeria)
+        self._executors = {
+            source: ThreadPoolExecutor(max_workers=limit, thread_name_prefix=f"gatherer-{source}")
+            for source, limit in self.limits.items()
+        }
+        # No modo ASGI a espera não ocupa threads: o limite por fonte só protege os upstreams
+        async_limit = int(os.getenv("ASYNC_GATHER_CONCURRENCY", "64"))
+        self._async_semaphores = {source: asyncio.Semaphore(async_limit) for source in self.limits}
+
+    def _timed(self, source: str, func: Callable, *args, **kwargs):
+        """Executa a chamada registrando a etapa da fonte"""
+        with stage_span(f"gather_{source}"):
+            return func(*args, **kwargs)
+
+    def _submit(self, source: str, func: Callable, *args):
+        """Agenda a chamada no executor da fonte levando o contexto da requisição (etapas cronometradas)"""
+        context = contextvars.copy_context()
+        return self._executors[source].submit(context.run, self._timed, source, func, *args)
+
+    def gather(self, city: str, dates: List[str], interests: List[str],
+               interest_weights: Optional[Dict[str, int]] = None) -> Dict:
+        """Busca o clima do período, as atividades em lotes de dias e a galeria em paralelo.
+
+        Os resultados são retornados na ordem das datas. Fontes que falharem ou
+        não terminarem dentro do prazo total são substituídas pelos fallbacks
+        dos próprios serviços.
+        """
+        for event, payload in self.gather_iter(city, dates, interests, interest_weights):
+            if event == "context":
+                return payload
+
+    def gather_iter(self, city: str, dates: List[str], interests: List[str],
+                    interest_weights: Optional[Dict[str, int]] = None) -> Iterator[Tuple[str, Dict]]:
+        """Versão incremental de gather.
+
+        Produz um evento ("progress", {...}) a cada fonte concluída e termina
+        com ("context", {...}) contendo o mesmo resultado de gather.
+        """
+        started = time.monotonic()
+
+        # A previsão da cidade é baixada uma vez e respondida para todo o período
+        weather_future = self._submit(
+            "weather", self.weather_service.get_weather_range, dates[0], dates[-1], city
+        )
+        # Atividades são geradas em lotes de vários dias, com os lotes em paralelo
+        date_chunks = self.activities_service.chunk_dates(dates)
+        activities_futures = [
+            self._submit("activities", self.activities_service.get_activities_for_range,
+                         city, chunk, interests, interest_weights)
+            for chunk in date_chunks
+        ]
+        gallery_future = self._submit("images", self.image_service.get_destination_gallery, city)
+
+        sources = {weather_future: ("weather", dates), gallery_future: ("images", [])}
+        for chunk, future in zip(date_chunks, activities_futures):
+            sources[future] = ("activities", chunk)
+
+        pending = set(sources)
+        try:
+            for future in as_completed(sources, timeout=self.deadline_seconds):
+                pending.discard(future)
+                source, source_dates = sources[future]
+                yield "progress", {
+                    "source": source,
+                    "dates": source_dates,
+                    "ok": future.exception() is None,
+                    "elapsed_seconds": round(time.monotonic() - started, 3)
+                }
+        except TimeoutError:
+            for future in pending:
+                future.cancel()
+            print(f"Prazo de coleta excedido: {len(pending)} chamadas sem resposta")
+
+        yield "context", self._assemble_context(
+            city, dates, date_chunks, weather_future, activities_futures, gallery_future, started
+        )
+
+    async def agather(self, city: str, dates: List[str], interests: List[str],
+                      interest_weights: Optional[Dict[str, int]] = None) -> Dict:
+        """Versão assíncrona de gather, para o modo ASGI.
+
+        As fontes rodam como tarefas do event loop (com o limite
+        ASYNC_GATHER_CONCURRENCY por fonte), com o mesmo prazo total e os
+        mesmos fallbacks.
+        """
+        async for event, payload in self.agather_iter(city, dates, interests, interest_weights):
+            if event == "context":
+                return payload
+
+    async def agather_iter(self, city: str, dates: List[str], interests: List[str],
+                           interest_weights: Optional[Dict[str, int]] = None) -> AsyncIterator[Tuple[str, Dict]]:
+        """Versão assíncrona de gather_iter, com os mesmos eventos"""
+        started = time.monotonic()
+
+        async def limited(source: str, func: Callable, *args):
+            async with self._async_semaphores[source]:
+                with stage_span(f"gather_{source}"):
+                    return await func(*args)
+
+        weather_task = asyncio.ensure_future(
+            limited("weather", self.weather_service.aget_weather_range, dates[0], dates[-1], city)
+        )
+        date_chunks = self.activities_service.chunk_dates(dates)
+        activities_tasks = [
+            asyncio.ensure_future(limited("activities", self.activities_service.aget_activities_for_range,
+                                          city, chunk, interests, interest_weights))
+            for chunk in date_chunks
+        ]
+        gallery_task = asyncio.ensure_future(limited("images", self.image_service.aget_destination_gallery, city))
+
+        sources = {weather_task: ("weather", dates), gallery_task: ("images", [])}
+        for chunk, task in zip(date_chunks, activities_tasks):
+            sources[task] = ("activities", chunk)
+
+        pending = set(sources)
+        try:
+            while pending:
+                remaining = self.deadline_seconds - (time.monotonic() - started)
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    source, source_dates = sources[task]
+                    yield "progress", {
+                        "source": source,
+                        "dates": source_dates,
+                        "ok": not task.cancelled() and task.exception() is None,
+                        "elapsed_seconds": round(time.monotonic() - started, 3)
+                    }
+        finally:
+            # Prazo excedido ou cliente desconectado no meio da coleta
+            for task in pending:
+                task.cancel()
+        if pending:
+            print(f"Prazo de coleta excedido: {len(pending)} chamadas sem resposta")
+
+        yield "context", self._assemble_context(
+            city, dates, date_chunks, weather_task, activities_tasks, gallery_task, started
+        )
+
+    def _assemble_context(self, city: str, dates: List[str], date_chunks: List[List[str]], weather_future,
+                          activities_futures: list, gallery_future, started: float) -> Dict:
+        """Junta os resultados das fontes (futures ou tarefas asyncio), usando fallbacks onde faltarem"""
+        weather_data = self._result_or(weather_future, lambda: [
+            self.weather_service._get_mock_weather(date, city) for date in dates
+        ])
+
+        activities_data = []
+        for chunk, future in zip(date_chunks, activities_futures):
+            activities_by_date = self._result_or(future, lambda c=chunk: {
+                date: self.activities_service._get_default_activities(date, city) for date in c
+            })
+            for date in chunk:
+                activities_data.extend(activities_by_date[date])
+
+        gallery = self._result_or(gallery_future, lambda: {
+            "destination": city,
+            "images": self.image_service._get_placeholder_images(city, 10),
+            "featured_image": None
+        })
+
+        return {
+            "weather": weather_data,
+            "activities": activities_data,
+            "gallery": gallery,
+            "elapsed_seconds": round(time.monotonic() - started, 3)
+        }
+
+    def _result_or(self, future, fallback: Callable):
+        """Retorna o resultado do future ou o fallback em caso de erro ou prazo excedido"""
+        if not future.done() or future.cancelled():
+            return fallback()
+        try:
+            return future.result()
+        except RateLimitExceeded:
+            # Sem cota no provedor a requisição é recusada, em vez de seguir com dados de fallback
+            raise
+        except Exception as e:
+            print(f"Erro ao coletar contexto: {e}")
+            return fallback()
@@ -1,46 +1,58 @@
-import requests
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional, Dict
 import os
+from utils.cache import build_cache
+from utils.http_client import get_async_http_client, get_http_client
+from utils.metrics import upstream_span
+from utils.singleflight import get_async_singleflight, get_singleflight
 
 class ImageService:
-    def __init__(self, unsplash_access_key: Optional[str] = None):
+    def __init__(self, unsplash_access_key: Optional[str] = None, cache=None, http_client=None,
+                 async_http_client=None):
         self.unsplash_access_key = unsplash_access_key or os.getenv("UNSPLASH_ACCESS_KEY")
         self.base_url = "https://api.unsplash.com"
+        # Metadados de imagens mudam pouco: cache persistente com TTL longo
+        self.cache = cache or build_cache(
+            "images", default_ttl=7 * 86400, default_max_entries=2048, default_backend="sqlite"
+        )
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="images")
+        self.http = http_client or get_http_client("unsplash")
+        self._async_http = async_http_client
+        self._singleflight = get_singleflight("unsplash")
+        self._async_singleflight = get_async_singleflight("unsplash")
+
+    @property
+    def async_http(self):
+        """Cliente assíncrono do modo ASGI, criado no primeiro uso"""
+        if self._async_http is None:
+            self._async_http = get_async_http_client("unsplash")
+        return self._async_http
 
     def search_location_images(self, location: str, count: int = 5) -> List[Dict]:
         """Busca imagens de um local específico"""
         if not self.unsplash_access_key:
             return self._get_placeholder_images(location, count)
 
+        # Buscas simultâneas pela mesma consulta compartilham uma única chamada
+        cache_key = f"{' '.join(location.lower().split())}|{count}"
+        return self._singleflight.do(cache_key, self._search_location_images, location, count, cache_key)
+
+    def _search_location_images(self, location: str, count: int, cache_key: str) -> List[Dict]:
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         try:
-            headers = {"Authorization": f"Client-ID {self.unsplash_access_key}"}
-            params = {
-                "query": f"{location} travel tourism",
-                "per_page": count,
-                "orientation": "landscape"
-            }
-            
-            response = requests.get(
-                f"{self.base_url}/search/photos",
-                headers=headers,
-                params=params,
-                timeout=10
-            )
+            with upstream_span("unsplash"):
+                response = self.http.get(
+                    f"{self.base_url}/search/photos",
+                    **self._search_request(location, count)
+                )
             
             if response.status_code == 200:
-                data = response.json()
-                images = []
-                
-                for photo in data.get("results", []):
-                    images.append({
-                        "id": photo["id"],
-                        "url": photo["urls"]["regular"],
-                        "thumb_url": photo["urls"]["thumb"],
-                        "description": photo.get("description") or photo.get("alt_description", ""),
-                        "photographer": photo["user"]["name"],
-                        "photographer_url": photo["user"]["links"]["html"]
-                    })
-                
+                images = self._parse_photos(response.json())
+                self.cache.set(cache_key, images)
                 return images
             
         except Exception as e:
@@ -48,6 +60,61 @@ class ImageService:
         
         return self._get_placeholder_images(location, count)
 
+    async def asearch_location_images(self, location: str, count: int = 5) -> List[Dict]:
+        """Versão assíncrona de search_location_images, para o modo ASGI"""
+        if not self.unsplash_access_key:
+            return self._get_placeholder_images(location, count)
+
+        cache_key = f"{' '.join(location.lower().split())}|{count}"
+        return await self._async_singleflight.do(cache_key, self._asearch_location_images, location, count, cache_key)
+
+    async def _asearch_location_images(self, location: str, count: int, cache_key: str) -> List[Dict]:
+        cached = await self.cache.aget(cache_key)
+        if cached is not None:
+            return cached
+
+        try:
+            with upstream_span("unsplash"):
+                response = await self.async_http.get(
+                    f"{self.base_url}/search/photos",
+                    **self._search_request(location, count)
+                )
+
+            if response.status_code == 200:
+                images = self._parse_photos(response.json())
+                await self.cache.aset(cache_key, images)
+                return images
+
+        except Exception as e:
+            print(f"Erro ao buscar imagens: {e}")
+
+        return self._get_placeholder_images(location, count)
+
+    def _search_request(self, location: str, count: int) -> Dict:
+        """Cabeçalhos e parâmetros da busca de fotos"""
+        return {
+            "headers": {"Authorization": f"Client-ID {self.unsplash_access_key}"},
+            "params": {
+                "query": f"{location} travel tourism",
+                "per_page": count,
+                "orientation": "landscape"
+            }
+        }
+
+    @staticmethod
+    def _parse_photos(data: Dict) -> List[Dict]:
+        return [
+            {
+                "id": photo["id"],
+                "url": photo["urls"]["regular"],
+                "thumb_url": photo["urls"]["thumb"],
+                "description": photo.get("description") or photo.get("alt_description", ""),
+                "photographer": photo["user"]["name"],
+                "photographer_url": photo["user"]["links"]["html"]
+            }
+            for photo in data.get("results", [])
+        ]
+
     def get_activity_images(self, activity_name: str, location: str, count: int = 3) -> List[Dict]:
         """Busca imagens relacionadas a uma atividade específica"""
         query = f"{activity_name} {location}"
@@ -70,9 +137,36 @@ class ImageService:
         return placeholder_images
 
     def get_destination_gallery(self, destination: str) -> Dict:
-        """Retorna uma galeria completa de imagens do destino"""
+        """Retorna uma galeria completa de imagens do destino.
+
+        Cada consulta distinta é feita uma única vez e as consultas rodam em paralelo.
+        """
+        queries = {destination: 10, f"{destination} landmark": 1}
+        results = dict(zip(
+            queries,
+            self._executor.map(lambda query: self.search_location_images(query, queries[query]), queries)
+        ))
+        featured_images = results[f"{destination} landmark"]
+
+        return {
+            "destination": destination,
+            "images": results[destination],
+            "featured_image": featured_images[0] if featured_images else None
+        }
+
+    async def aget_destination_gallery(self, destination: str) -> Dict:
+        """Versão assíncrona de get_destination_gallery, com as consultas concorrentes no event loop"""
+        images, featured_images = await asyncio.gather(
+            self.asearch_location_images(destination, 10),
+            self.asearch_location_images(f"{destination} landmark", 1)
+        )
+
         return {
             "destination": destination,
-            "images": self.search_location_images(destination, 10),
-            "featured_image": self.search_location_images(f"{destination} landmark", 1)[0] if self.search_location_images(f"{destination} landmark", 1) else None
+            "images": images,
+            "featured_image": featured_images[0] if featured_images else None
         }
+
+    def cache_stats(self) -> Dict:
+        """Retorna os contadores do cache de imagens"""
+        return self.cache.stats()
@@ -0,0 +1,172 @@
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+from storage.job_store import JobStore
+from utils.webhooks import WebhookNotifier, validate_callback_url
+
+class QueueFullError(Exception):
+    """A fila de jobs atingiu o limite de profundidade"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Fila de jobs cheia")
+        self.retry_after = retry_after
+
+class JobQueue:
+    """Executa jobs em um pool limitado de workers, persistindo estado e resultado.
+
+    Cada tipo de job tem um handler que recebe o payload e retorna um dict
+    serializável em JSON. Quando o job termina, o callback_url (se houver)
+    recebe um POST com o estado final, enviado pelo WebhookNotifier.
+
+    Cada processo é dono dos jobs que enfileira e mantém um heartbeat no
+    banco; com a recuperação ligada, os jobs não terminados de donos sem
+    heartbeat recente são assumidos atomicamente por um único processo.
+    """
+
+    def __init__(self, store: JobStore, max_workers: Optional[int] = None, max_queue_depth: Optional[int] = None,
+                 notifier: Optional[WebhookNotifier] = None):
+        self.store = store
+        self.owner = str(uuid.uuid4())
+        self.heartbeat_seconds = float(os.getenv("JOB_HEARTBEAT_SECONDS", "10"))
+        self.notifier = notifier or WebhookNotifier.from_env()
+        self.max_workers = max_workers or int(os.getenv("JOB_WORKERS", "4"))
+        self.max_queue_depth = max_queue_depth or int(os.getenv("JOB_MAX_QUEUE_DEPTH", "100"))
+        self._handlers: Dict[str, Callable[[Dict], Dict]] = {}
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="jobs")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self.rejected = 0
+        self.succeeded = 0
+        self.failed = 0
+        self._wait_times = deque(maxlen=500)
+        self._recovering = False
+
+        self.store.heartbeat(self.owner)
+        threading.Thread(target=self._heartbeat_loop, name="jobs-heartbeat", daemon=True).start()
+
+    def register(self, kind: str, handler: Callable[[Dict], Dict]):
+        self._handlers[kind] = handler
+
+    def submit(self, kind: str, payload: Dict, callback_url: Optional[str] = None) -> str:
+        """Enfileira um job e retorna seu ID.
+
+        Levanta QueueFullError se a fila estiver cheia e InvalidCallbackURL se
+        o callback_url não for permitido.
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"Tipo de job desconhecido: {kind}")
+        if callback_url:
+            validate_callback_url(callback_url)
+
+        with self._lock:
+            if self._queued >= self.max_queue_depth:
+                self.rejected += 1
+                raise QueueFullError(retry_after=self._estimated_retry_after())
+            self._queued += 1
+
+        job_id = str(uuid.uuid4())
+        try:
+            created_at = self.store.create(job_id, kind, payload, callback_url, owner=self.owner)
+        except Exception:
+            with self._lock:
+                self._queued -= 1
+            raise
+
+        self._executor.submit(self._run, job_id, kind, payload, callback_url, created_at)
+        return job_id
+
+    def start_recovery(self):
+        """Assume agora os jobs órfãos e continua verificando a cada heartbeat"""
+        self._recovering = True
+        self.resume_unfinished()
+
+    def resume_unfinished(self):
+        """Reenfileira os jobs não terminados cujo processo dono parou (reinício ou queda)"""
+        alive_since = time.time() - 3 * self.heartbeat_seconds
+        for job in self.store.claim_orphaned(self.owner, alive_since):
+            if job["kind"] not in self._handlers:
+                continue
+            with self._lock:
+                self._queued += 1
+            self._executor.submit(
+                self._run, job["id"], job["kind"], job["payload"], job["callback_url"], job["created_at"]
+            )
+
+    def _heartbeat_loop(self):
+        while True:
+            time.sleep(self.heartbeat_seconds)
+            try:
+                self.store.heartbeat(self.owner)
+                if self._recovering:
+                    self.resume_unfinished()
+            except Exception as e:
+                print(f"Erro no heartbeat da fila de jobs: {e}")
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        job = self.store.get(job_id)
+        if job:
+            job.pop("payload", None)
+        return job
+
+    def _run(self, job_id: str, kind: str, payload: Dict, callback_url: Optional[str], created_at: float):
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            self._wait_times.append(time.time() - created_at)
+
+        self.store.mark_running(job_id)
+        try:
+            result = self._handlers[kind](payload)
+            self.store.mark_succeeded(job_id, result)
+            with self._lock:
+                self.succeeded += 1
+        except Exception as e:
+            print(f"Erro ao executar job {job_id}: {e}")
+            self.store.mark_failed(job_id, str(e))
+            with self._lock:
+                self.failed += 1
+        finally:
+            with self._lock:
+                self._running -= 1
+
+        if callback_url:
+            self._notify(job_id, callback_url)
+
+    def _notify(self, job_id: str, callback_url: str):
+        """Agenda o envio do estado final do job para o callback_url, fora do pool de jobs"""
+        try:
+            self.notifier.send(callback_url, self.get(job_id), label=f"do job {job_id}")
+        except Exception as e:
+            print(f"Erro ao notificar callback do job {job_id}: {e}")
+
+    def _estimated_retry_after(self) -> int:
+        """Estimativa em segundos, baseada no tempo médio de espera recente"""
+        if not self._wait_times:
+            return 5
+        return max(1, int(sum(self._wait_times) / len(self._wait_times)))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            wait_times = sorted(self._wait_times)
+            stats = {
+                "workers": self.max_workers,
+                "max_queue_depth": self.max_queue_depth,
+                "queue_depth": self._queued,
+                "running": self._running,
+                "succeeded": self.succeeded,
+                "failed": self.failed,
+                "rejected": self.rejected
+            }
+        stats["callbacks"] = self.notifier.stats()
+        stats["wait_seconds"] = {
+            "count": len(wait_times),
+            "avg": round(sum(wait_times) / len(wait_times), 3) if wait_times else None,
+            "p95": round(wait_times[int(0.95 * (len(wait_times) - 1))], 3) if wait_times else None,
+            "max": round(wait_times[-1], 3) if wait_times else None
+        }
+        return stats
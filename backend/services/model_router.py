@@ -0,0 +1,556 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Tuple
+from utils.metrics import LLM_ROUTED, record_llm_usage, upstream_span
+from utils.rate_limiter import RateLimitExceeded, estimate_tokens, get_rate_limiter
+
+# Tarefas roteadas e a rota padrão de cada uma (primeiro o modelo preferido, depois os alternativos)
+DEFAULT_ROUTES = {
+    "itinerary": "openai:gpt-3.5-turbo,gemini:gemini-2.0-flash",
+    "modification": "openai:gpt-3.5-turbo,gemini:gemini-2.0-flash",
+    "activities": "gemini:gemini-2.0-flash-lite,openai:gpt-3.5-turbo"
+}
+# Prazo total de cada tarefa, somando as tentativas em modelos alternativos
+DEFAULT_DEADLINES = {"itinerary": 60, "modification": 30, "activities": 30}
+# Tempo reservado para o próximo candidato quando ainda não há p95 dele
+DEFAULT_FALLBACK_RESERVES = {"itinerary": 15, "modification": 10, "activities": 10}
+# Tempo mínimo de cada tentativa (gerações normais de itinerário levam de 20 a 40s)
+DEFAULT_MIN_ATTEMPTS = {"itinerary": 40, "modification": 15, "activities": 15}
+# Retry-After usado quando o 429 do provedor não informa quanto esperar
+UPSTREAM_RETRY_AFTER_SECONDS = float(os.getenv("LLM_UPSTREAM_RETRY_AFTER_SECONDS", "30"))
+
+def _upstream_retry_after(error: Exception) -> float:
+    """Espera pedida pelo provedor nos cabeçalhos retry-after-ms ou retry-after da resposta de erro"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1)):
+        try:
+            return float(headers.get(name)) * scale
+        except (TypeError, ValueError):
+            continue
+    return UPSTREAM_RETRY_AFTER_SECONDS
+
+@contextmanager
+def _upstream_call(provider: str, model: str):
+    """Mede a chamada ao provedor e converte sua recusa por cota (HTTP 429) em RateLimitExceeded.
+
+    Os SDKs não são importados aqui: o 429 é reconhecido pelo status_code
+    (OpenAI) ou code (Gemini) do erro.
+    """
+    try:
+        with upstream_span(provider):
+            yield
+    except Exception as e:
+        if getattr(e, "status_code", None) != 429 and getattr(e, "code", None) != 429:
+            raise
+        raise RateLimitExceeded(provider, model, _upstream_retry_after(e), upstream=True) from e
+
+class LLMResponse:
+    """Resposta normalizada de qualquer provedor, no formato do chat completions da OpenAI"""
+
+    def __init__(self, content: str, provider: str, model: str, prompt_tokens: Optional[int] = None,
+                 completion_tokens: Optional[int] = None, cached_tokens: Optional[int] = None):
+        self.choices = [SimpleNamespace(message=SimpleNamespace(content=content))]
+        self.usage = SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=(prompt_tokens or 0) + (completion_tokens or 0) if prompt_tokens is not None else None,
+            cached_tokens=cached_tokens
+        )
+        self.provider = provider
+        self.model = model
+        # Tentativas que falharam antes desta resposta (failover)
+        self.failovers: List[Dict] = []
+
+    @property
+    def text(self) -> str:
+        return self.choices[0].message.content
+
+    def served_by(self) -> Dict:
+        return {"provider": self.provider, "model": self.model, "failovers": self.failovers}
+
+class OpenAIBackend:
+    """Chamadas ao chat completions da OpenAI; o SDK só é importado no primeiro uso"""
+
+    provider = "openai"
+
+    def __init__(self, api_key: Optional[str], base_url: Optional[str] = None, client=None, async_client=None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self._client = client
+        self._async_client = async_client
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return bool(self.api_key or self._client or self._async_client)
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from openai import OpenAI
+
+                    # Sem retries no SDK: o timeout de cada tentativa é do roteador, que faz o failover
+                    self._client = OpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0)
+        return self._client
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            with self._lock:
+                if self._async_client is None:
+                    from openai import AsyncOpenAI
+
+                    self._async_client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0)
+        return self._async_client
+
+    def complete(self, model: str, messages: List[Dict], timeout: Optional[float] = None, quota: Optional[Tuple] = None,
+                 **options) -> LLMResponse:
+        limiter, estimated = quota or _acquire_quota(self.provider, model, messages, options)
+        with _upstream_call(self.provider, model):
+            response = self.client.chat.completions.create(model=model, messages=messages, timeout=timeout, **options)
+        return self._normalize(response, model, limiter, estimated)
+
+    async def acomplete(self, model: str, messages: List[Dict], timeout: Optional[float] = None,
+                        quota: Optional[Tuple] = None, **options) -> LLMResponse:
+        limiter, estimated = quota or await _aacquire_quota(self.provider, model, messages, options)
+        with _upstream_call(self.provider, model):
+            response = await self.async_client.chat.completions.create(
+                model=model, messages=messages, timeout=timeout, **options
+            )
+        return self._normalize(response, model, limiter, estimated)
+
+    def stream(self, model: str, messages: List[Dict], timeout: Optional[float] = None, quota: Optional[Tuple] = None,
+               **options):
+        """Chamada em streaming: o consumo chega no último chunk e a estimativa de cota é mantida"""
+        if quota is None:
+            _acquire_quota(self.provider, model, messages, options)
+        with _upstream_call(self.provider, model):
+            return self.client.chat.completions.create(
+                model=model, messages=messages, timeout=timeout, stream=True,
+                stream_options={"include_usage": True}, **options
+            )
+
+    async def astream(self, model: str, messages: List[Dict], timeout: Optional[float] = None,
+                      quota: Optional[Tuple] = None, **options):
+        """Versão assíncrona de stream: retorna um iterador assíncrono de chunks"""
+        if quota is None:
+            await _aacquire_quota(self.provider, model, messages, options)
+        with _upstream_call(self.provider, model):
+            return await self.async_client.chat.completions.create(
+                model=model, messages=messages, timeout=timeout, stream=True,
+                stream_options={"include_usage": True}, **options
+            )
+
+    def _normalize(self, response, model: str, limiter, estimated: int) -> LLMResponse:
+        usage = getattr(response, "usage", None)
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        completion_tokens = getattr(usage, "completion_tokens", None)
+        cached_tokens = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None)
+        record_llm_usage(self.provider, model, prompt_tokens, completion_tokens)
+        if limiter:
+            limiter.settle(estimated, getattr(usage, "total_tokens", None))
+        return LLMResponse(
+            response.choices[0].message.content, self.provider, model, prompt_tokens, completion_tokens, cached_tokens
+        )
+
+class GeminiBackend:
+    """Chamadas ao generate_content do Gemini; o SDK só é importado no primeiro uso.
+
+    As mensagens de sistema viram system_instruction e o modo JSON da OpenAI
+    vira response_mime_type, para que as mesmas mensagens sirvam aos dois
+    provedores.
+    """
+
+    provider = "gemini"
+
+    def __init__(self, api_key: Optional[str], client=None):
+        self.api_key = api_key
+        self._client = client
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return bool(self.api_key or self._client)
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import google.genai as genai
+
+                    self._client = genai.Client(api_key=self.api_key)
+        return self._client
+
+    def complete(self, model: str, messages: List[Dict], timeout: Optional[float] = None, quota: Optional[Tuple] = None,
+                 **options) -> LLMResponse:
+        limiter, estimated = quota or _acquire_quota(self.provider, model, messages, options)
+        contents, config = self._request(messages, timeout, options)
+        with _upstream_call(self.provider, model):
+            response = self.client.models.generate_content(model=model, contents=contents, config=config)
+        return self._normalize(response, model, limiter, estimated)
+
+    async def acomplete(self, model: str, messages: List[Dict], timeout: Optional[float] = None,
+                        quota: Optional[Tuple] = None, **options) -> LLMResponse:
+        limiter, estimated = quota or await _aacquire_quota(self.provider, model, messages, options)
+        contents, config = self._request(messages, timeout, options)
+        with _upstream_call(self.provider, model):
+            response = await self.client.aio.models.generate_content(model=model, contents=contents, config=config)
+        return self._normalize(response, model, limiter, estimated)
+
+    @staticmethod
+    def _request(messages: List[Dict], timeout: Optional[float], options: Dict) -> Tuple[str, Dict]:
+        system = "\n\n".join(m["content"] for m in messages if m["role"] == "system")
+        contents = "\n\n".join(m["content"] for m in messages if m["role"] != "system")
+        config: Dict = {}
+        if system:
+            config["system_instruction"] = system
+        if "temperature" in options:
+            config["temperature"] = options["temperature"]
+        if options.get("response_format", {}).get("type") == "json_object":
+            config["response_mime_type"] = "application/json"
+        if timeout:
+            config["http_options"] = {"timeout": int(timeout * 1000)}
+        return contents, config
+
+    def _normalize(self, response, model: str, limiter, estimated: int) -> LLMResponse:
+        usage = getattr(response, "usage_metadata", None)
+        prompt_tokens = getattr(usage, "prompt_token_count", None)
+        completion_tokens = getattr(usage, "candidates_token_count", None)
+        cached_tokens = getattr(usage, "cached_content_token_count", None)
+        record_llm_usage(self.provider, model, prompt_tokens, completion_tokens)
+        if limiter and usage:
+            limiter.settle(estimated, (prompt_tokens or 0) + (completion_tokens or 0))
+        return LLMResponse(response.text, self.provider, model, prompt_tokens, completion_tokens, cached_tokens)
+
+def _acquire_quota(provider: str, model: str, messages: List[Dict], options: Dict) -> Tuple:
+    """Aguarda a cota local do modelo (se houver limites configurados)"""
+    limiter = get_rate_limiter(provider, model)
+    estimated = estimate_tokens("".join(m["content"] for m in messages), options.get("max_tokens"))
+    if limiter:
+        limiter.acquire(estimated)
+    return limiter, estimated
+
+async def _aacquire_quota(provider: str, model: str, messages: List[Dict], options: Dict) -> Tuple:
+    """Versão de _acquire_quota que aguarda no event loop"""
+    limiter = get_rate_limiter(provider, model)
+    estimated = estimate_tokens("".join(m["content"] for m in messages), options.get("max_tokens"))
+    if limiter:
+        await limiter.aacquire(estimated)
+    return limiter, estimated
+
+def _single_chunk(response: LLMResponse):
+    """Resposta completa no formato de um chunk de streaming (o consumo já foi registrado pelo backend)"""
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=response.text))], usage=None)
+
+async def _async_chunks(chunks: List):
+    for chunk in chunks:
+        yield chunk
+
+def parse_route(spec: str) -> List[Tuple[str, str]]:
+    """Converte "openai:gpt-4o-mini,gemini:gemini-2.0-flash" em [(provedor, modelo), ...]"""
+    candidates = []
+    for item in spec.split(","):
+        provider, _, model = item.strip().partition(":")
+        if provider and model:
+            candidates.append((provider.strip().lower(), model.strip()))
+    return candidates
+
+class ModelRouter:
+    """Escolhe o modelo de cada tarefa e faz failover entre modelos e provedores.
+
+    Cada tarefa tem uma lista ordenada de candidatos (provedor:modelo) e um
+    prazo total. Candidatos com falhas consecutivas recentes ou cujo p95
+    recente não cabe no prazo vão para o fim da fila. Cada tentativa recebe
+    um timeout, calculado depois da espera pela cota do limitador local, que
+    reserva tempo para o próximo candidato; se ela falhar, estourar o tempo
+    ou for recusada pelo limitador local, o próximo candidato é chamado com
+    o tempo restante. A resposta informa qual modelo
+    atendeu e quais tentativas falharam.
+    """
+
+    def __init__(self, backends: Dict, routes: Optional[Dict[str, List[Tuple[str, str]]]] = None,
+                 deadlines: Optional[Dict[str, float]] = None, latency_window: int = 50,
+                 failure_threshold: int = 3, cooldown_seconds: float = 30,
+                 fallback_reserves: Optional[Dict[str, float]] = None, min_attempts: Optional[Dict[str, float]] = None):
+        self.backends = backends
+        self.routes = routes or {task: parse_route(spec) for task, spec in DEFAULT_ROUTES.items()}
+        self.deadlines = deadlines or dict(DEFAULT_DEADLINES)
+        self.fallback_reserves = fallback_reserves or dict(DEFAULT_FALLBACK_RESERVES)
+        self.min_attempts = min_attempts or dict(DEFAULT_MIN_ATTEMPTS)
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._latencies: Dict[Tuple[str, str], deque] = {}
+        self._health: Dict[Tuple[str, str], Dict] = {}
+        self._window = latency_window
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, backends: Dict) -> "ModelRouter":
+        """Rotas de MODEL_ROUTE_<TAREFA>, prazos de MODEL_DEADLINE_<TAREFA>_SECONDS e orçamento das tentativas"""
+        routes = {
+            task: parse_route(os.getenv(f"MODEL_ROUTE_{task.upper()}", spec))
+            for task, spec in DEFAULT_ROUTES.items()
+        }
+        deadlines = {
+            task: float(os.getenv(f"MODEL_DEADLINE_{task.upper()}_SECONDS", str(seconds)))
+            for task, seconds in DEFAULT_DEADLINES.items()
+        }
+        fallback_reserves = {
+            task: float(os.getenv(f"MODEL_FALLBACK_RESERVE_{task.upper()}_SECONDS", str(seconds)))
+            for task, seconds in DEFAULT_FALLBACK_RESERVES.items()
+        }
+        min_attempts = {
+            task: float(os.getenv(f"MODEL_MIN_ATTEMPT_{task.upper()}_SECONDS", str(seconds)))
+            for task, seconds in DEFAULT_MIN_ATTEMPTS.items()
+        }
+        return cls(
+            backends,
+            routes,
+            deadlines,
+            latency_window=int(os.getenv("MODEL_ROUTER_LATENCY_WINDOW", "50")),
+            cooldown_seconds=float(os.getenv("MODEL_ROUTER_COOLDOWN_SECONDS", "30")),
+            fallback_reserves=fallback_reserves,
+            min_attempts=min_attempts
+        )
+
+    def candidates(self, task: str) -> List[Tuple[str, str]]:
+        """Candidatos da tarefa na ordem em que serão tentados"""
+        configured = [
+            candidate for candidate in self.routes.get(task, [])
+            if candidate[0] in self.backends and self.backends[candidate[0]].available
+        ] or self.routes.get(task, [])[:1]
+        deadline = self.deadlines.get(task, 60)
+        now = time.monotonic()
+
+        def demoted(candidate: Tuple[str, str]) -> Tuple[bool, bool]:
+            p95 = self.p95(candidate)
+            return self._unhealthy(candidate, now), p95 is not None and p95 > deadline
+
+        return sorted(configured, key=demoted)
+
+    def complete(self, task: str, messages: List[Dict], **options) -> LLMResponse:
+        """Executa a chamada da tarefa, com failover entre os candidatos dentro do prazo"""
+        started = time.monotonic()
+        candidates = self.candidates(task)
+        failovers: List[Dict] = []
+        errors: List[Exception] = []
+
+        for index, candidate in enumerate(candidates):
+            if self._attempt_timeout(task, candidates, index, started) is None:
+                break
+            provider, model = candidate
+            attempt_started = time.monotonic()
+            try:
+                # A espera na fila do limitador local não desconta do tempo da tentativa nem entra no p95
+                quota = _acquire_quota(provider, model, messages, options)
+                timeout = self._attempt_timeout(task, candidates, index, started)
+                if timeout is None:
+                    break
+                attempt_started = time.monotonic()
+                response = self.backends[provider].complete(model, messages, timeout=timeout, quota=quota, **options)
+            except Exception as e:
+                errors.append(e)
+                failovers.append(self._record_failure(task, candidate, e, time.monotonic() - attempt_started))
+                continue
+            return self._record_success(task, candidate, response, time.monotonic() - attempt_started, failovers)
+
+        raise self._exhausted(task, errors)
+
+    async def acomplete(self, task: str, messages: List[Dict], **options) -> LLMResponse:
+        """Versão assíncrona de complete"""
+        started = time.monotonic()
+        candidates = self.candidates(task)
+        failovers: List[Dict] = []
+        errors: List[Exception] = []
+
+        for index, candidate in enumerate(candidates):
+            if self._attempt_timeout(task, candidates, index, started) is None:
+                break
+            provider, model = candidate
+            attempt_started = time.monotonic()
+            try:
+                quota = await _aacquire_quota(provider, model, messages, options)
+                timeout = self._attempt_timeout(task, candidates, index, started)
+                if timeout is None:
+                    break
+                attempt_started = time.monotonic()
+                response = await self.backends[provider].acomplete(
+                    model, messages, timeout=timeout, quota=quota, **options
+                )
+            except Exception as e:
+                errors.append(e)
+                failovers.append(self._record_failure(task, candidate, e, time.monotonic() - attempt_started))
+                continue
+            return self._record_success(task, candidate, response, time.monotonic() - attempt_started, failovers)
+
+        raise self._exhausted(task, errors)
+
+    def stream(self, task: str, messages: List[Dict], **options) -> Tuple[object, str, str]:
+        """Streaming com failover até o início da resposta (não há failover depois do primeiro token).
+
+        Candidatos sem streaming (ex.: Gemini) respondem com complete() e o
+        texto inteiro chega como um único chunk.
+        """
+        started = time.monotonic()
+        candidates = self.candidates(task)
+        failovers: List[Dict] = []
+        errors: List[Exception] = []
+
+        for index, candidate in enumerate(candidates):
+            if self._attempt_timeout(task, candidates, index, started) is None:
+                break
+            provider, model = candidate
+            backend = self.backends[provider]
+            attempt_started = time.monotonic()
+            try:
+                quota = _acquire_quota(provider, model, messages, options)
+                timeout = self._attempt_timeout(task, candidates, index, started)
+                if timeout is None:
+                    break
+                attempt_started = time.monotonic()
+                if hasattr(backend, "stream"):
+                    stream = backend.stream(model, messages, timeout=timeout, quota=quota, **options)
+                    LLM_ROUTED.inc(task=task, provider=provider, model=model, outcome="stream")
+                    return stream, provider, model
+                response = backend.complete(model, messages, timeout=timeout, quota=quota, **options)
+            except Exception as e:
+                errors.append(e)
+                failovers.append(self._record_failure(task, candidate, e, time.monotonic() - attempt_started))
+                continue
+            self._record_success(task, candidate, response, time.monotonic() - attempt_started, failovers)
+            return iter([_single_chunk(response)]), provider, model
+
+        raise self._exhausted(task, errors)
+
+    async def astream(self, task: str, messages: List[Dict], **options) -> Tuple[object, str, str]:
+        """Versão assíncrona de stream"""
+        started = time.monotonic()
+        candidates = self.candidates(task)
+        failovers: List[Dict] = []
+        errors: List[Exception] = []
+
+        for index, candidate in enumerate(candidates):
+            if self._attempt_timeout(task, candidates, index, started) is None:
+                break
+            provider, model = candidate
+            backend = self.backends[provider]
+            attempt_started = time.monotonic()
+            try:
+                quota = await _aacquire_quota(provider, model, messages, options)
+                timeout = self._attempt_timeout(task, candidates, index, started)
+                if timeout is None:
+                    break
+                attempt_started = time.monotonic()
+                if hasattr(backend, "astream"):
+                    stream = await backend.astream(model, messages, timeout=timeout, quota=quota, **options)
+                    LLM_ROUTED.inc(task=task, provider=provider, model=model, outcome="stream")
+                    return stream, provider, model
+                response = await backend.acomplete(model, messages, timeout=timeout, quota=quota, **options)
+            except Exception as e:
+                errors.append(e)
+                failovers.append(self._record_failure(task, candidate, e, time.monotonic() - attempt_started))
+                continue
+            self._record_success(task, candidate, response, time.monotonic() - attempt_started, failovers)
+            return _async_chunks([_single_chunk(response)]), provider, model
+
+        raise self._exhausted(task, errors)
+
+    def _attempt_timeout(self, task: str, candidates: List[Tuple[str, str]], index: int,
+                         started: float) -> Optional[float]:
+        """Tempo da tentativa: o restante do prazo, reservando o p95 do próximo candidato.
+
+        Sem histórico do próximo candidato, a reserva é a configurada para a
+        tarefa. A tentativa nunca recebe menos que o mínimo da tarefa (limitado
+        ao tempo restante), para não cortar gerações longas saudáveis.
+        """
+        remaining = self.deadlines.get(task, 60) - (time.monotonic() - started)
+        if remaining <= 0:
+            return None
+        if index + 1 >= len(candidates):
+            return remaining
+        reserve = self.p95(candidates[index + 1])
+        if reserve is None:
+            reserve = self.fallback_reserves.get(task, 10)
+        return max(remaining - reserve, min(self.min_attempts.get(task, 15), remaining))
+
+    def _record_success(self, task: str, candidate: Tuple[str, str], response: LLMResponse, elapsed: float,
+                        failovers: List[Dict]) -> LLMResponse:
+        with self._lock:
+            self._latencies.setdefault(candidate, deque(maxlen=self._window)).append(elapsed)
+            self._health[candidate] = {"consecutive_failures": 0, "last_failure_at": None}
+        LLM_ROUTED.inc(task=task, provider=candidate[0], model=candidate[1], outcome="ok")
+        response.failovers = failovers
+        return response
+
+    def _record_failure(self, task: str, candidate: Tuple[str, str], error: Exception, elapsed: float) -> Dict:
+        # Recusas por cota (do limitador local ou 429 do provedor) não indicam que o provedor está ruim
+        if isinstance(error, RateLimitExceeded):
+            outcome = "upstream_rate_limited" if error.upstream else "rate_limited"
+        else:
+            outcome = "error"
+        if outcome == "error":
+            with self._lock:
+                # A latência de uma falha (ex.: timeout) também conta para o p95
+                self._latencies.setdefault(candidate, deque(maxlen=self._window)).append(elapsed)
+                health = self._health.setdefault(candidate, {"consecutive_failures": 0, "last_failure_at": None})
+                health["consecutive_failures"] += 1
+                health["last_failure_at"] = time.monotonic()
+        LLM_ROUTED.inc(task=task, provider=candidate[0], model=candidate[1], outcome=outcome)
+        print(f"Falha no modelo {candidate[0]}:{candidate[1]} ({task}), tentando o próximo: {error}")
+        return {"provider": candidate[0], "model": candidate[1], "error": str(error)[:200]}
+
+    @staticmethod
+    def _exhausted(task: str, errors: List[Exception]) -> Exception:
+        """Erro final quando nenhum candidato atendeu"""
+        if not errors:
+            return TimeoutError(f"Prazo da tarefa {task} esgotado")
+        # Se todos recusaram por cota (localmente ou no provedor), a API responde 429 com o menor Retry-After
+        if all(isinstance(error, RateLimitExceeded) for error in errors):
+            return min(errors, key=lambda error: error.retry_after)
+        return [error for error in errors if not isinstance(error, RateLimitExceeded)][-1]
+
+    def _unhealthy(self, candidate: Tuple[str, str], now: float) -> bool:
+        health = self._health.get(candidate)
+        return bool(
+            health
+            and health["consecutive_failures"] >= self.failure_threshold
+            and now - health["last_failure_at"] < self.cooldown_seconds
+        )
+
+    def p95(self, candidate: Tuple[str, str]) -> Optional[float]:
+        """p95 das latências recentes do candidato (None com menos de 5 amostras)"""
+        with self._lock:
+            samples = sorted(self._latencies.get(candidate, ()))
+        if len(samples) < 5:
+            return None
+        return samples[min(len(samples) - 1, int(0.95 * len(samples)))]
+
+    def stats(self) -> Dict:
+        """Rotas, prazos e latência e saúde recentes de cada candidato"""
+        now = time.monotonic()
+        candidates = {candidate for route in self.routes.values() for candidate in route}
+        return {
+            "routes": {
+                task: [f"{provider}:{model}" for provider, model in self.candidates(task)]
+                for task in self.routes
+            },
+            "deadlines": self.deadlines,
+            "fallback_reserves": self.fallback_reserves,
+            "min_attempts": self.min_attempts,
+            "models": {
+                f"{provider}:{model}": {
+                    "available": provider in self.backends and self.backends[provider].available,
+                    "p95_seconds": round(p95, 3) if (p95 := self.p95((provider, model))) is not None else None,
+                    "consecutive_failures": self._health.get((provider, model), {}).get("consecutive_failures", 0),
+                    "healthy": not self._unhealthy((provider, model), now)
+                }
+                for provider, model in sorted(candidates)
+            }
+        }
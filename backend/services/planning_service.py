@@ -0,0 +1,184 @@
+import datetime
+import os
+from typing import Dict, List, Optional, Tuple
+from models.schemas import Activity, ActivityRecommendation, ItineraryDay, TravelPlan, VacationInfo, Weather
+
+# llm: o modelo escolhe as atividades; solver: o otimizador escolhe e o modelo só
+# escreve os motivos; offline: o otimizador escolhe e os motivos vêm de modelos de texto
+PLANNER_MODES = ("llm", "solver", "offline")
+
+class ActivityPlanner:
+    """Seleciona as atividades de cada dia de forma determinística, antes do LLM.
+
+    Maximiza a cobertura dos interesses do grupo, ponderada pelo número de
+    viajantes que compartilham cada interesse, respeitando o orçamento, pelo
+    menos uma atividade por dia, nenhum conflito de horário no mesmo dia e o
+    clima (atividades ao ar livre são evitadas em dias de chuva).
+    """
+
+    OUTDOOR_INTERESTS = {"hiking", "gardening", "tennis"}
+    OUTDOOR_KEYWORDS = ("ao ar livre", "outdoor", "trilha", "parque", "praia", "caminhada", "jardim", "mirante")
+    INDOOR_KEYWORDS = ("indoor", "coberto", "coberta", "museu", "teatro", "galeria", "hall", "center", "centro cultural")
+
+    def __init__(self, weather_service, max_per_day: Optional[int] = None):
+        self.weather_service = weather_service
+        self.max_per_day = max_per_day or int(os.getenv("PLANNER_MAX_ACTIVITIES_PER_DAY", "3"))
+
+    def select(self, dates: List[str], budget: int, weather_data: list, activities_data: list,
+               interest_weights: Dict[str, int]) -> Dict:
+        """Escolhe as atividades por dia.
+
+        Primeiro fixa uma atividade por dia (começando pelos dias com menos
+        opções), reservando orçamento para a opção mais barata dos dias
+        restantes; depois acrescenta, de forma gulosa, as atividades com maior
+        ganho de cobertura por custo enquanto houver orçamento e horário livre.
+        O custo total nunca passa do orçamento: os dias que não couberem são
+        retornados em unfunded_dates, com o valor que falta em budget_shortfall.
+        """
+        weather_by_date = {w.get("date"): w for w in weather_data}
+        candidates = {date: self._day_candidates(date, activities_data, weather_by_date.get(date)) for date in dates}
+        chosen: Dict[str, List[Dict]] = {date: [] for date in dates}
+        covered = set()
+        remaining = budget
+
+        # Se o orçamento não cobre a opção mais barata de todos os dias, ficam sem
+        # atividade (unfunded_dates) os dias mais caros, sem ultrapassar o orçamento
+        cheapest = {date: min(a["price"] for a in candidates[date]) for date in dates if candidates[date]}
+        funded, reserve = [], 0
+        for date in sorted(cheapest, key=lambda d: (cheapest[d], d)):
+            if reserve + cheapest[date] <= budget:
+                funded.append(date)
+                reserve += cheapest[date]
+        unfunded = sorted(set(cheapest) - set(funded))
+
+        # Uma atividade por dia, começando pelos dias mais restritos e reservando
+        # orçamento para a opção mais barata dos dias seguintes
+        for date in sorted(funded, key=lambda d: (len(candidates[d]), d)):
+            reserve -= cheapest[date]
+            affordable = [a for a in candidates[date] if a["price"] <= remaining - reserve]
+            anchor = max(affordable, key=lambda a: (self._gain(a, covered, interest_weights), -a["price"], a["activity_id"]))
+            chosen[date].append(anchor)
+            covered |= set(anchor.get("related_interests", []))
+            remaining -= anchor["price"]
+
+        # Atividades extras que cubram interesses ainda não atendidos
+        while True:
+            best = None
+            for date in dates:
+                if len(chosen[date]) >= self.max_per_day:
+                    continue
+                for activity in candidates[date]:
+                    if activity["price"] > remaining or activity in chosen[date]:
+                        continue
+                    if any(self._overlaps(activity, other) for other in chosen[date]):
+                        continue
+                    gain = self._gain(activity, covered, interest_weights)
+                    if gain < 1:
+                        continue
+                    key = (gain / (activity["price"] + 1), gain, -activity["price"], activity["activity_id"])
+                    if best is None or key > best[0]:
+                        best = (key, date, activity)
+            if best is None:
+                break
+            _, date, activity = best
+            chosen[date].append(activity)
+            covered |= set(activity.get("related_interests", []))
+            remaining -= activity["price"]
+
+        for date in dates:
+            chosen[date].sort(key=lambda a: a["start_time"])
+
+        return {
+            "days": chosen,
+            "covered_interests": sorted(covered & set(interest_weights)),
+            "uncovered_interests": sorted(set(interest_weights) - covered),
+            "total_cost": budget - remaining,
+            "unfunded_dates": unfunded,
+            "budget_shortfall": max(sum(cheapest.values()) - budget, 0)
+        }
+
+    def _day_candidates(self, date: str, activities_data: list, weather: Optional[Dict]) -> List[Dict]:
+        """Atividades válidas do dia, sem as ao ar livre quando o clima não permite (se houver alternativa)"""
+        day_activities = [
+            a for a in activities_data
+            if str(a.get("start_time", ""))[:10] == date and self._interval(a) is not None
+        ]
+        if weather and not self.weather_service.is_outdoor_friendly(weather.get("condition", "")):
+            indoor = [a for a in day_activities if not self.is_outdoor(a)]
+            return indoor or day_activities
+        return day_activities
+
+    def is_outdoor(self, activity: Dict) -> bool:
+        text = f"{activity.get('name', '')} {activity.get('description', '')} {activity.get('location', '')}".lower()
+        if any(keyword in text for keyword in self.INDOOR_KEYWORDS):
+            return False
+        return (
+            any(keyword in text for keyword in self.OUTDOOR_KEYWORDS)
+            or bool(self.OUTDOOR_INTERESTS & set(activity.get("related_interests", [])))
+        )
+
+    @staticmethod
+    def _gain(activity: Dict, covered: set, interest_weights: Dict[str, int]) -> float:
+        """Peso dos interesses novos cobertos, com desempate pelos interesses já cobertos"""
+        interests = set(activity.get("related_interests", [])) & set(interest_weights)
+        new = sum(interest_weights[i] for i in interests - covered)
+        return new + 0.01 * sum(interest_weights[i] for i in interests)
+
+    @staticmethod
+    def _interval(activity: Dict) -> Optional[Tuple[datetime.datetime, datetime.datetime]]:
+        try:
+            # Aceita "YYYY-MM-DD HH:MM" e o ISO "YYYY-MM-DDTHH:MM"; segundos e fuso são ignorados
+            start = datetime.datetime.fromisoformat(str(activity["start_time"])[:16])
+            end = datetime.datetime.fromisoformat(str(activity["end_time"])[:16])
+        except (KeyError, ValueError):
+            return None
+        return (start, end) if end > start else None
+
+    def _overlaps(self, first: Dict, second: Dict) -> bool:
+        first_start, first_end = self._interval(first)
+        second_start, second_end = self._interval(second)
+        return first_start < second_end and second_start < first_end
+
+    def default_reasons(self, activity: Dict, interest_weights: Dict[str, int], weather: Optional[Dict]) -> List[str]:
+        """Motivos gerados sem LLM, a partir dos interesses e do clima"""
+        matched = [i for i in activity.get("related_interests", []) if i in interest_weights]
+        reasons = []
+        if matched:
+            reasons.append("Atende aos interesses: " + ", ".join(
+                f"{i} ({interest_weights[i]} {'viajante' if interest_weights[i] == 1 else 'viajantes'})" for i in matched
+            ))
+        if weather and not self.weather_service.is_outdoor_friendly(weather.get("condition", "")) and not self.is_outdoor(activity):
+            reasons.append("Atividade adequada para o clima previsto")
+        reasons.append("Cabe no orçamento e não conflita com os demais horários do dia")
+        return reasons
+
+    def build_plan(self, vacation_info: VacationInfo, selection: Dict, weather_data: list,
+                   interest_weights: Dict[str, int], reasons: Optional[Dict[str, List[str]]] = None) -> TravelPlan:
+        """Monta o TravelPlan da seleção; motivos ausentes são preenchidos por default_reasons"""
+        weather_by_date = {w.get("date"): w for w in weather_data}
+        reasons = reasons or {}
+        itinerary_days = []
+        for date, activities in selection["days"].items():
+            weather = weather_by_date.get(date) or {
+                "temperature": 25, "temperature_unit": "celsius", "condition": "unknown"
+            }
+            itinerary_days.append(ItineraryDay(
+                date=date,
+                weather=Weather.model_validate(weather),
+                activity_recommendations=[
+                    ActivityRecommendation(
+                        activity=Activity.model_validate(activity),
+                        reasons_for_recommendation=reasons.get(activity["activity_id"])
+                        or self.default_reasons(activity, interest_weights, weather)
+                    )
+                    for activity in activities
+                ]
+            ))
+
+        return TravelPlan(
+            city=vacation_info.destination,
+            start_date=vacation_info.date_of_arrival,
+            end_date=vacation_info.date_of_departure,
+            total_cost=selection["total_cost"],
+            itinerary_days=itinerary_days
+        )
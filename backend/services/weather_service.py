@@ -1,14 +1,32 @@
+import asyncio
 import datetime
 import os
-import requests
+from collections import Counter
 from typing import Dict, List, Optional
 from models.schemas import Weather
+from utils.cache import build_cache
+from utils.dates import date_range
+from utils.http_client import get_async_http_client, get_http_client
+from utils.metrics import upstream_span
+from utils.singleflight import get_async_singleflight, get_singleflight
 
 class WeatherService:
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, cache=None, http_client=None, async_http_client=None):
         self.api_key = api_key or os.getenv("OPENWEATHER_API_KEY")
         self.base_url = "https://api.openweathermap.org/data/2.5"
-        
+        self.cache = cache or build_cache("weather", default_ttl=1800, default_max_entries=1024)
+        self.http = http_client or get_http_client("openweather")
+        self._async_http = async_http_client
+        self._singleflight = get_singleflight("openweather")
+        self._async_singleflight = get_async_singleflight("openweather")
+
+    @property
+    def async_http(self):
+        """Cliente assíncrono do modo ASGI, criado no primeiro uso"""
+        if self._async_http is None:
+            self._async_http = get_async_http_client("openweather")
+        return self._async_http
+
     def get_weather_forecast(self, date: str, city: str) -> Dict:
         """Retorna a previsão do tempo para uma data e cidade específicas"""
         try:
@@ -18,55 +36,191 @@ class WeatherService:
 
         if not self.api_key:
             return self._get_mock_weather(date, city)
-        
-        try:
-            params = {
-                "q": city,
-                "appid": self.api_key,
-                "units": "metric",
-                "lang": "pt_br"
-            }
-            
-            response = requests.get(
-                f"{self.base_url}/forecast",
-                params=params,
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                target_date = datetime.datetime.strptime(date, "%Y-%m-%d").date()
-                
-                for forecast in data.get("list", []):
-                    forecast_date = datetime.datetime.fromtimestamp(forecast["dt"]).date()
-                    if forecast_date == target_date:
-                        return {
-                            "date": date,
-                            "city": city,
-                            "temperature": round(forecast["main"]["temp"]),
-                            "temperature_unit": "celsius",
-                            "condition": forecast["weather"][0]["main"].lower(),
-                            "description": forecast["weather"][0]["description"]
-                        }
-        except Exception as e:
-            print(f"Erro ao buscar clima: {e}")
-        
+
+        cached = self.cache.get(self._cache_key(city, date))
+        if cached is not None:
+            return cached
+
+        forecast = self._city_forecast(city)
+        if date in forecast:
+            return forecast[date]
+
         return self._get_mock_weather(date, city)
 
     def get_weather_range(self, start_date: str, end_date: str, city: str) -> List[Dict]:
-        """Retorna previsão do tempo para um período"""
-        import pandas as pd
-        
+        """Retorna previsão do tempo para um período.
+
+        A previsão de 5 dias é baixada uma única vez e cada dia do período é
+        respondido a partir do índice por data. Datas fora da janela da
+        previsão não geram novas chamadas enquanto a previsão da cidade
+        estiver no cache.
+        """
+        dates = date_range(start_date, end_date)
+
+        if not self.api_key:
+            return [self._get_mock_weather(date, city) for date in dates]
+
+        cached_days = {date: self.cache.get(self._cache_key(city, date)) for date in dates}
+        forecast: Dict[str, Dict] = {}
+        if any(weather is None for weather in cached_days.values()):
+            forecast = self._city_forecast(city)
+
         weather_data = []
-        date_range = pd.date_range(start=start_date, end=end_date, freq='D')
-        
-        for date in date_range:
-            date_str = date.strftime('%Y-%m-%d')
-            weather = self.get_weather_forecast(date_str, city)
-            weather_data.append(weather)
-        
+        for date in dates:
+            weather = cached_days[date] or forecast.get(date)
+            weather_data.append(weather or self._get_mock_weather(date, city))
+
         return weather_data
 
+    async def aget_weather_range(self, start_date: str, end_date: str, city: str) -> List[Dict]:
+        """Versão assíncrona de get_weather_range, para o modo ASGI"""
+        dates = date_range(start_date, end_date)
+
+        if not self.api_key:
+            return [self._get_mock_weather(date, city) for date in dates]
+
+        cached = await asyncio.gather(*(self.cache.aget(self._cache_key(city, date)) for date in dates))
+        cached_days = dict(zip(dates, cached))
+        forecast: Dict[str, Dict] = {}
+        if any(weather is None for weather in cached_days.values()):
+            forecast = await self.cache.aget(self._forecast_key(city))
+            if forecast is None:
+                forecast = await self._async_singleflight.do(
+                    city.strip().lower(), self._afetch_daily_forecast, city
+                )
+
+        return [cached_days[date] or forecast.get(date) or self._get_mock_weather(date, city) for date in dates]
+
+    def cache_stats(self) -> Dict:
+        """Retorna os contadores do cache de previsões"""
+        return self.cache.stats()
+
+    @staticmethod
+    def _cache_key(city: str, date: str) -> str:
+        return f"{city.strip().lower()}|{date}"
+
+    @staticmethod
+    def _forecast_key(city: str) -> str:
+        """Chave da previsão inteira da cidade (todos os dias da janela de 5 dias)"""
+        return f"{city.strip().lower()}|forecast"
+
+    def _city_forecast(self, city: str) -> Dict[str, Dict]:
+        """Previsão diária da cidade, do cache ou baixada do upstream"""
+        forecast = self.cache.get(self._forecast_key(city))
+        if forecast is None:
+            forecast = self._fetch_daily_forecast(city)
+        return forecast
+
+    def _fetch_daily_forecast(self, city: str) -> Dict[str, Dict]:
+        """Baixa a previsão da cidade, resume cada dia e armazena todos os dias no cache.
+
+        Buscas simultâneas pela mesma cidade compartilham uma única chamada ao upstream.
+        """
+        return self._singleflight.do(city.strip().lower(), self._fetch_daily_forecast_uncoalesced, city)
+
+    def _fetch_daily_forecast_uncoalesced(self, city: str) -> Dict[str, Dict]:
+        return self._store_daily_forecast(city, self._get_forecast_index(city))
+
+    async def _afetch_daily_forecast(self, city: str) -> Dict[str, Dict]:
+        forecast_index = None
+        try:
+            with upstream_span("openweather"):
+                response = await self.async_http.get(f"{self.base_url}/forecast", params=self._forecast_params(city))
+            forecast_index = self._parse_forecast_response(response)
+        except Exception as e:
+            print(f"Erro ao buscar clima: {e}")
+
+        # Com o cache em SQLite as gravações bloqueariam o event loop
+        return await asyncio.to_thread(self._store_daily_forecast, city, forecast_index)
+
+    def _store_daily_forecast(self, city: str, forecast_index: Optional[Dict[str, List[Dict]]]) -> Dict[str, Dict]:
+        """Resume cada dia da previsão e armazena os dias e a previsão da cidade no cache.
+
+        forecast_index None indica falha na busca: nada é armazenado, para que
+        a próxima requisição tente de novo.
+        """
+        if forecast_index is None:
+            return {}
+
+        daily_forecast = {}
+        for date, entries in forecast_index.items():
+            weather = self._aggregate_daily_weather(date, city, entries)
+            self.cache.set(self._cache_key(city, date), weather)
+            daily_forecast[date] = weather
+
+        # Também responde, sem nova chamada, às datas fora da janela da previsão
+        self.cache.set(self._forecast_key(city), daily_forecast)
+        return daily_forecast
+
+    def _get_forecast_index(self, city: str) -> Optional[Dict[str, List[Dict]]]:
+        """Baixa a previsão de 5 dias da cidade e indexa as entradas por data local (None se falhar)"""
+        try:
+            with upstream_span("openweather"):
+                response = self.http.get(
+                    f"{self.base_url}/forecast",
+                    params=self._forecast_params(city)
+                )
+
+            return self._parse_forecast_response(response)
+        except Exception as e:
+            print(f"Erro ao buscar clima: {e}")
+
+        return None
+
+    def _forecast_params(self, city: str) -> Dict:
+        return {
+            "q": city,
+            "appid": self.api_key,
+            "units": "metric",
+            "lang": "pt_br"
+        }
+
+    def _parse_forecast_response(self, response) -> Optional[Dict[str, List[Dict]]]:
+        if response.status_code != 200:
+            return None
+        data = response.json()
+        return self._index_forecast_by_date(
+            data.get("list", []),
+            data.get("city", {}).get("timezone", 0)
+        )
+
+    @staticmethod
+    def _index_forecast_by_date(entries: List[Dict], timezone_offset: int = 0) -> Dict[str, List[Dict]]:
+        """Agrupa as entradas de 3 horas da previsão pela data local da cidade"""
+        index: Dict[str, List[Dict]] = {}
+        offset = datetime.timedelta(seconds=timezone_offset)
+
+        for forecast in entries:
+            local_time = datetime.datetime.fromtimestamp(forecast["dt"], tz=datetime.timezone.utc) + offset
+            index.setdefault(local_time.strftime("%Y-%m-%d"), []).append(forecast)
+
+        return index
+
+    @staticmethod
+    def _aggregate_daily_weather(date: str, city: str, entries: List[Dict]) -> Dict:
+        """Resume as entradas de um dia em mínima, máxima, média e condição dominante"""
+        temperatures = [forecast["main"]["temp"] for forecast in entries]
+        conditions = Counter(forecast["weather"][0]["main"].lower() for forecast in entries)
+        dominant_condition = conditions.most_common(1)[0][0]
+        descriptions = Counter(
+            forecast["weather"][0]["description"]
+            for forecast in entries
+            if forecast["weather"][0]["main"].lower() == dominant_condition
+        )
+        mean_temperature = sum(temperatures) / len(temperatures)
+
+        return {
+            "date": date,
+            "city": city,
+            "temperature": round(mean_temperature),
+            "temperature_min": round(min(temperatures)),
+            "temperature_max": round(max(temperatures)),
+            "temperature_mean": round(mean_temperature, 1),
+            "temperature_unit": "celsius",
+            "condition": dominant_condition,
+            "description": descriptions.most_common(1)[0][0]
+        }
+
     def is_outdoor_friendly(self, condition: str) -> bool:
         """Verifica se as condições climáticas são favoráveis para atividades ao ar livre"""
         unfriendly_conditions = ["thunderstorm", "rain", "drizzle", "snow"]
@@ -78,6 +232,9 @@ class WeatherService:
             "date": date,
             "city": city,
             "temperature": 25,
+            "temperature_min": 25,
+            "temperature_max": 25,
+            "temperature_mean": 25.0,
             "temperature_unit": "celsius",
             "condition": "partly cloudy",
             "description": f"Previsão do tempo para {city} em {date}"
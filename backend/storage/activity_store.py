@@ -0,0 +1,210 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+def normalize_city(city: Optional[str]) -> str:
+    return (city or "").strip().lower()
+
+def normalize_interests(interests: Optional[List[str]]) -> str:
+    """Chave canônica de um conjunto de interesses: ordenado e sem repetições"""
+    return ",".join(sorted({interest.strip().lower() for interest in interests or []}))
+
+class ActivityStore:
+    """Catálogo persistente (SQLite) de atividades geradas.
+
+    Cada catálogo guarda as atividades de uma (cidade, data, conjunto de
+    interesses) e cada atividade pode ser buscada diretamente pelo activity_id.
+    Catálogos mais antigos que max_age_seconds são ignorados e, acima de
+    max_catalogs, os mais antigos são removidos.
+
+    As atividades ficam em uma tabela própria: remover ou regenerar um
+    catálogo só desfaz a associação. Atividades sem catálogo são apagadas,
+    exceto as fixadas com pin_activities (referenciadas por viagens salvas).
+    """
+
+    def __init__(self, path: str, max_age_seconds: float = 86400, max_catalogs: int = 5000):
+        self.path = path
+        self.max_age_seconds = max_age_seconds
+        self.max_catalogs = max_catalogs
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS activity_catalogs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                city TEXT NOT NULL,
+                date TEXT NOT NULL,
+                interests_key TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                UNIQUE (city, date, interests_key)
+            );
+            CREATE INDEX IF NOT EXISTS idx_catalogs_created_at ON activity_catalogs (created_at);
+        """)
+        self._migrate_activities()
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS activities (
+                activity_id TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS catalog_activities (
+                catalog_id INTEGER NOT NULL REFERENCES activity_catalogs (id) ON DELETE CASCADE,
+                position INTEGER NOT NULL,
+                activity_id TEXT NOT NULL,
+                PRIMARY KEY (catalog_id, position)
+            );
+            CREATE INDEX IF NOT EXISTS idx_catalog_activities_activity ON catalog_activities (activity_id);
+            CREATE TABLE IF NOT EXISTS activity_pins (
+                activity_id TEXT PRIMARY KEY
+            );
+        """)
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _migrate_activities(self):
+        """Bancos antigos guardavam as atividades dentro do catálogo, apagadas junto com ele"""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(activities)")}
+        if "catalog_id" not in columns:
+            return
+        self._conn.executescript("""
+            CREATE TABLE catalog_activities (
+                catalog_id INTEGER NOT NULL REFERENCES activity_catalogs (id) ON DELETE CASCADE,
+                position INTEGER NOT NULL,
+                activity_id TEXT NOT NULL,
+                PRIMARY KEY (catalog_id, position)
+            );
+            INSERT INTO catalog_activities (catalog_id, position, activity_id)
+                SELECT catalog_id, position, activity_id FROM activities;
+            CREATE TABLE activities_new (
+                activity_id TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            INSERT INTO activities_new (activity_id, payload, created_at)
+                SELECT a.activity_id, a.payload, c.created_at
+                FROM activities a JOIN activity_catalogs c ON c.id = a.catalog_id;
+            DROP TABLE activities;
+            ALTER TABLE activities_new RENAME TO activities;
+        """)
+
+    @classmethod
+    def from_env(cls) -> Optional["ActivityStore"]:
+        """Cria o catálogo a partir das variáveis ACTIVITY_STORE_*, ou None se desativado"""
+        if os.getenv("ACTIVITY_STORE_ENABLED", "true").lower() in ("false", "0", "no"):
+            return None
+        return cls(
+            path=os.getenv("ACTIVITY_STORE_PATH", "agentsville_activities.db"),
+            max_age_seconds=float(os.getenv("ACTIVITY_STORE_MAX_AGE", "86400")),
+            max_catalogs=int(os.getenv("ACTIVITY_STORE_MAX_CATALOGS", "5000"))
+        )
+
+    def get_catalog(self, city: Optional[str], date: str, interests: Optional[List[str]]) -> Optional[List[Dict]]:
+        """Retorna as atividades ainda válidas do catálogo, ou None"""
+        min_created_at = time.time() - self.max_age_seconds
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT a.payload FROM activity_catalogs c "
+                "JOIN catalog_activities ca ON ca.catalog_id = c.id "
+                "JOIN activities a ON a.activity_id = ca.activity_id "
+                "WHERE c.city = ? AND c.date = ? AND c.interests_key = ? AND c.created_at >= ? "
+                "ORDER BY ca.position",
+                (normalize_city(city), date, normalize_interests(interests), min_created_at)
+            ).fetchall()
+
+            if not rows:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return [json.loads(row[0]) for row in rows]
+
+    def save_catalog(self, city: Optional[str], date: str, interests: Optional[List[str]], activities: List[Dict]):
+        """Substitui o catálogo de (cidade, data, interesses) pelas atividades informadas.
+
+        Os activity_ids identificam o conteúdo (veja ActivitiesService): um id
+        já gravado nunca passa a apontar para outra atividade.
+        """
+        key = (normalize_city(city), date, normalize_interests(interests))
+        now = time.time()
+        with self._lock:
+            replaced = self._conn.execute(
+                "DELETE FROM activity_catalogs WHERE city = ? AND date = ? AND interests_key = ?", key
+            ).rowcount
+            cursor = self._conn.execute(
+                "INSERT INTO activity_catalogs (city, date, interests_key, created_at) VALUES (?, ?, ?, ?)",
+                key + (now,)
+            )
+            catalog_id = cursor.lastrowid
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO activities (activity_id, payload, created_at) VALUES (?, ?, ?)",
+                [(activity["activity_id"], json.dumps(activity, default=str), now) for activity in activities]
+            )
+            self._conn.executemany(
+                "INSERT INTO catalog_activities (catalog_id, position, activity_id) VALUES (?, ?, ?)",
+                [(catalog_id, position, activity["activity_id"]) for position, activity in enumerate(activities)]
+            )
+            self._evict(replaced)
+            self._conn.commit()
+
+    def pin_activities(self, activity_ids: List[str]):
+        """Mantém as atividades (ex.: de uma viagem salva) mesmo depois que seus catálogos forem removidos"""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO activity_pins (activity_id) "
+                "SELECT activity_id FROM activities WHERE activity_id = ?",
+                [(activity_id,) for activity_id in set(activity_ids)]
+            )
+            self._conn.commit()
+
+    def get_activity(self, activity_id: str) -> Optional[Dict]:
+        """Busca uma atividade pela chave primária"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM activities WHERE activity_id = ?", (activity_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _evict(self, replaced: int = 0):
+        """Remove catálogos expirados, os mais antigos acima do limite e as atividades que ficaram sem uso"""
+        evictions = self.evictions
+        cursor = self._conn.execute(
+            "DELETE FROM activity_catalogs WHERE created_at < ?",
+            (time.time() - self.max_age_seconds,)
+        )
+        self.evictions += max(cursor.rowcount, 0)
+        cursor = self._conn.execute(
+            "DELETE FROM activity_catalogs WHERE id IN ("
+            "SELECT id FROM activity_catalogs ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_catalogs,)
+        )
+        self.evictions += max(cursor.rowcount, 0)
+        if replaced <= 0 and self.evictions == evictions:
+            return
+        self._conn.execute(
+            "DELETE FROM activities WHERE activity_id NOT IN (SELECT activity_id FROM catalog_activities) "
+            "AND activity_id NOT IN (SELECT activity_id FROM activity_pins)"
+        )
+
+    def stats(self) -> Dict:
+        with self._lock:
+            catalogs = self._conn.execute("SELECT COUNT(*) FROM activity_catalogs").fetchone()[0]
+            activities = self._conn.execute("SELECT COUNT(*) FROM activities").fetchone()[0]
+            pinned = self._conn.execute("SELECT COUNT(*) FROM activity_pins").fetchone()[0]
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "catalogs": catalogs,
+            "activities": activities,
+            "pinned_activities": pinned,
+            "max_catalogs": self.max_catalogs,
+            "max_age_seconds": self.max_age_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
@@ -0,0 +1,140 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+class JobStore:
+    """Estado e resultado dos jobs assíncronos persistidos em SQLite"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                callback_url TEXT,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                owner TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at);
+            CREATE TABLE IF NOT EXISTS job_owners (
+                owner TEXT PRIMARY KEY,
+                heartbeat_at REAL NOT NULL
+            );
+        """)
+        # Bancos criados antes da coluna owner
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "owner" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+        self._conn.commit()
+
+    @classmethod
+    def from_env(cls) -> "JobStore":
+        return cls(os.getenv("JOB_STORE_PATH", "agentsville_jobs.db"))
+
+    def create(self, job_id: str, kind: str, payload: Dict, callback_url: Optional[str] = None,
+               owner: Optional[str] = None) -> float:
+        created_at = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, status, payload, callback_url, created_at, owner) "
+                "VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), callback_url, created_at, owner)
+            )
+            self._conn.commit()
+        return created_at
+
+    def mark_running(self, job_id: str):
+        self._update(job_id, "status = 'running', started_at = ?", (time.time(),))
+
+    def mark_succeeded(self, job_id: str, result: Dict):
+        self._update(job_id, "status = 'succeeded', result = ?, finished_at = ?", (json.dumps(result), time.time()))
+
+    def mark_failed(self, job_id: str, error: str):
+        self._update(job_id, "status = 'failed', error = ?, finished_at = ?", (error, time.time()))
+
+    def _update(self, job_id: str, assignments: str, params: tuple):
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", params + (job_id,))
+            self._conn.commit()
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, kind, status, payload, callback_url, result, error, created_at, started_at, finished_at "
+                "FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def unfinished(self) -> List[Dict]:
+        """Jobs que não terminaram (por exemplo, interrompidos por um reinício)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, kind, status, payload, callback_url, result, error, created_at, started_at, finished_at "
+                "FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+            ).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def heartbeat(self, owner: str):
+        """Registra que o processo dono ainda está vivo"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO job_owners (owner, heartbeat_at) VALUES (?, ?)", (owner, time.time())
+            )
+            self._conn.commit()
+
+    def claim_orphaned(self, owner: str, alive_since: float) -> List[Dict]:
+        """Assume atomicamente os jobs não terminados cujo dono não dá sinal de vida desde alive_since.
+
+        A leitura e a troca de dono acontecem na mesma transação de escrita,
+        então com vários processos no mesmo banco cada job órfão é assumido
+        por um único processo.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT id, kind, status, payload, callback_url, result, error, created_at, started_at, finished_at "
+                    "FROM jobs WHERE status IN ('queued', 'running') AND (owner IS NULL OR owner NOT IN "
+                    "(SELECT owner FROM job_owners WHERE heartbeat_at >= ?)) ORDER BY created_at",
+                    (alive_since,)
+                ).fetchall()
+                self._conn.executemany("UPDATE jobs SET owner = ? WHERE id = ?", [(owner, row[0]) for row in rows])
+                self._conn.execute("DELETE FROM job_owners WHERE heartbeat_at < ?", (alive_since,))
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        return [self._row_to_job(row) for row in rows]
+
+    def count_by_status(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+    @staticmethod
+    def _row_to_job(row) -> Dict:
+        return {
+            "id": row[0],
+            "kind": row[1],
+            "status": row[2],
+            "payload": json.loads(row[3]),
+            "callback_url": row[4],
+            "result": json.loads(row[5]) if row[5] else None,
+            "error": row[6],
+            "created_at": row[7],
+            "started_at": row[8],
+            "finished_at": row[9]
+        }
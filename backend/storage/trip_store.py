@@ -0,0 +1,208 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from models.schemas import TripHistory, TravelPlan
+from utils.cache import MemoryCache
+
+class TripConflictError(Exception):
+    """A viagem foi modificada por outra requisição (ou outro processo) depois de lida"""
+    pass
+
+class TripStore:
+    """Histórico de viagens persistido em SQLite.
+
+    As colunas de resumo (destino, datas, custo, viajantes) permitem listar o
+    histórico sem desserializar os planos. As modificações ficam em uma tabela
+    separada, somente de inserção. As viagens lidas recentemente são mantidas
+    em um cache LRU em memória, conferido a cada leitura contra o contador de
+    modificações do banco (o arquivo pode ser compartilhado por vários workers).
+    """
+
+    def __init__(self, path: str, hot_cache_size: int = 256):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS trips (
+                id TEXT PRIMARY KEY,
+                destination TEXT NOT NULL,
+                destination_key TEXT NOT NULL,
+                date_of_arrival TEXT NOT NULL,
+                date_of_departure TEXT NOT NULL,
+                travelers TEXT NOT NULL,
+                total_cost INTEGER NOT NULL,
+                created_at TEXT NOT NULL,
+                modifications_count INTEGER NOT NULL DEFAULT 0,
+                vacation_info TEXT NOT NULL,
+                travel_plan TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_trips_created_at ON trips (created_at);
+            CREATE INDEX IF NOT EXISTS idx_trips_destination ON trips (destination_key, created_at);
+            CREATE TABLE IF NOT EXISTS trip_modifications (
+                trip_id TEXT NOT NULL REFERENCES trips (id),
+                seq INTEGER NOT NULL,
+                payload TEXT NOT NULL,
+                PRIMARY KEY (trip_id, seq)
+            );
+        """)
+        self._conn.commit()
+        self._hot_cache = MemoryCache(ttl_seconds=3600, max_entries=hot_cache_size)
+
+    @classmethod
+    def from_env(cls) -> "TripStore":
+        """Cria o histórico a partir de TRIP_STORE_PATH (":memory:" para não persistir)"""
+        return cls(
+            path=os.getenv("TRIP_STORE_PATH", "agentsville_trips.db"),
+            hot_cache_size=int(os.getenv("TRIP_CACHE_MAX_ENTRIES", "256"))
+        )
+
+    def save(self, trip: TripHistory):
+        """Insere uma nova viagem no histórico"""
+        vacation_info = trip.vacation_info
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO trips (id, destination, destination_key, date_of_arrival, date_of_departure, "
+                "travelers, total_cost, created_at, modifications_count, vacation_info, travel_plan) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    trip.id,
+                    vacation_info.destination,
+                    vacation_info.destination.strip().lower(),
+                    vacation_info.date_of_arrival.isoformat(),
+                    vacation_info.date_of_departure.isoformat(),
+                    json.dumps([t.name for t in vacation_info.travelers]),
+                    trip.travel_plan.total_cost,
+                    trip.created_at.isoformat(),
+                    len(trip.modifications),
+                    vacation_info.model_dump_json(),
+                    trip.travel_plan.model_dump_json()
+                )
+            )
+            self._conn.executemany(
+                "INSERT INTO trip_modifications (trip_id, seq, payload) VALUES (?, ?, ?)",
+                [(trip.id, seq, json.dumps(m, default=str)) for seq, m in enumerate(trip.modifications)]
+            )
+            self._conn.commit()
+        self._hot_cache.set(trip.id, trip)
+
+    def get(self, trip_id: str) -> Optional[TripHistory]:
+        """Busca uma viagem pelo ID, consultando primeiro o cache em memória"""
+        cached = self._hot_cache.get(trip_id)
+        if cached is not None:
+            # Leitura barata da versão atual: outro processo pode ter modificado a viagem
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT modifications_count FROM trips WHERE id = ?", (trip_id,)
+                ).fetchone()
+            if row is not None and row[0] == len(cached.modifications):
+                return cached
+            self._hot_cache.delete(trip_id)
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT vacation_info, travel_plan, created_at FROM trips WHERE id = ?", (trip_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            modifications = [
+                json.loads(payload) for (payload,) in self._conn.execute(
+                    "SELECT payload FROM trip_modifications WHERE trip_id = ? ORDER BY seq", (trip_id,)
+                )
+            ]
+
+        trip = TripHistory(
+            id=trip_id,
+            vacation_info=json.loads(row[0]),
+            travel_plan=json.loads(row[1]),
+            created_at=datetime.fromisoformat(row[2]),
+            modifications=modifications
+        )
+        self._hot_cache.set(trip_id, trip)
+        return trip
+
+    def append_modification(self, trip_id: str, travel_plan: TravelPlan, modification: Dict,
+                            expected_count: Optional[int] = None):
+        """Substitui o plano da viagem e acrescenta a modificação ao log.
+
+        Com expected_count (nº de modificações da versão lida), a gravação é um
+        compare-and-set: se outra requisição gravou antes, levanta
+        TripConflictError em vez de sobrescrever a modificação dela.
+        """
+        with self._lock:
+            try:
+                if expected_count is None:
+                    row = self._conn.execute(
+                        "SELECT modifications_count FROM trips WHERE id = ?", (trip_id,)
+                    ).fetchone()
+                    if row is None:
+                        raise KeyError(trip_id)
+                    expected_count = row[0]
+
+                # O UPDATE condicional obtém o lock de escrita do SQLite antes do INSERT
+                updated = self._conn.execute(
+                    "UPDATE trips SET travel_plan = ?, total_cost = ?, modifications_count = ? "
+                    "WHERE id = ? AND modifications_count = ?",
+                    (travel_plan.model_dump_json(), travel_plan.total_cost, expected_count + 1, trip_id, expected_count)
+                ).rowcount
+                if not updated:
+                    exists = self._conn.execute("SELECT 1 FROM trips WHERE id = ?", (trip_id,)).fetchone()
+                    if exists is None:
+                        raise KeyError(trip_id)
+                    raise TripConflictError(trip_id)
+
+                self._conn.execute(
+                    "INSERT INTO trip_modifications (trip_id, seq, payload) VALUES (?, ?, ?)",
+                    (trip_id, expected_count, json.dumps(modification, default=str))
+                )
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+            finally:
+                self._hot_cache.delete(trip_id)
+
+    def list_summaries(self, limit: int = 50, offset: int = 0, destination: Optional[str] = None,
+                       since: Optional[str] = None) -> Tuple[List[Dict], int]:
+        """Lista resumos das viagens (mais recentes primeiro) com paginação e filtros"""
+        conditions = []
+        params: List = []
+        if destination:
+            conditions.append("destination_key = ?")
+            params.append(destination.strip().lower())
+        if since:
+            conditions.append("created_at >= ?")
+            params.append(since)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM trips {where}", params).fetchone()[0]
+            rows = self._conn.execute(
+                "SELECT id, destination, travelers, date_of_arrival, date_of_departure, total_cost, "
+                f"created_at, modifications_count FROM trips {where} "
+                "ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+
+        summaries = [
+            {
+                "id": row[0],
+                "destination": row[1],
+                "travelers": json.loads(row[2]),
+                "dates": f"{row[3]} to {row[4]}",
+                "total_cost": row[5],
+                "created_at": row[6],
+                "modifications_count": row[7]
+            }
+            for row in rows
+        ]
+        return summaries, total
+
+    def stats(self) -> Dict:
+        with self._lock:
+            trips = self._conn.execute("SELECT COUNT(*) FROM trips").fetchone()[0]
+        return {"backend": "sqlite", "path": self.path, "trips": trips, "hot_cache": self._hot_cache.stats()}
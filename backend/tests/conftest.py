@@ -0,0 +1,54 @@
+import datetime
+import pytest
+from models.schemas import TravelPlan, VacationInfo
+
+def build_activity(activity_id: str, date: str = "2030-01-01", start: str = "10:00", end: str = "11:00",
+                  price: int = 10, interests=None, separator: str = "T", **fields) -> dict:
+    activity = {
+        "activity_id": activity_id,
+        "name": f"Atividade {activity_id}",
+        "start_time": f"{date}{separator}{start}",
+        "end_time": f"{date}{separator}{end}",
+        "location": "Centro",
+        "description": "Atividade coberta",
+        "price": price,
+        "related_interests": list(interests or ["art"])
+    }
+    activity.update(fields)
+    return activity
+
+@pytest.fixture
+def make_activity():
+    return build_activity
+
+@pytest.fixture
+def vacation_info() -> VacationInfo:
+    return VacationInfo.model_validate({
+        "travelers": [
+            {"name": "Ana", "age": 30, "interests": ["art", "music"]},
+            {"name": "Bruno", "age": 40, "interests": ["music"]}
+        ],
+        "destination": "Paris",
+        "date_of_arrival": "2030-01-01",
+        "date_of_departure": "2030-01-02",
+        "budget": 100
+    })
+
+@pytest.fixture
+def travel_plan() -> TravelPlan:
+    weather = {"temperature": 20, "temperature_unit": "celsius", "condition": "clear"}
+    return TravelPlan.model_validate({
+        "city": "Paris",
+        "start_date": datetime.date(2030, 1, 1),
+        "end_date": datetime.date(2030, 1, 2),
+        "total_cost": 30,
+        "itinerary_days": [
+            {"date": "2030-01-01", "weather": weather, "activity_recommendations": [
+                {"activity": build_activity("a1", price=10), "reasons_for_recommendation": ["Arte"]}
+            ]},
+            {"date": "2030-01-02", "weather": weather, "activity_recommendations": [
+                {"activity": build_activity("a2", date="2030-01-02", price=20, interests=["music"]),
+                 "reasons_for_recommendation": ["Música"]}
+            ]}
+        ]
+    })
@@ -0,0 +1,46 @@
+import pytest
+from services.activities_service import ActivitiesService
+from storage.activity_store import ActivityStore
+
+@pytest.fixture
+def store(tmp_path):
+    return ActivityStore(str(tmp_path / "activities.db"), max_catalogs=1)
+
+@pytest.fixture
+def service(store):
+    return ActivitiesService(api_key="test", store=store, router=object())
+
+def _generated(service, names, date="2030-01-01"):
+    activities = [
+        {"name": name, "start_time": f"{date} 10:00", "end_time": f"{date} 11:00", "location": "Centro",
+         "description": "Atividade", "price": 10, "related_interests": ["art"]}
+        for name in names
+    ]
+    return service._normalize_activities(date, activities, service._catalog_tag("Paris", ["art"]))
+
+def test_regenerated_catalog_never_reuses_ids(service, store):
+    first = _generated(service, ["Museu", "Teatro"])
+    store.save_catalog("Paris", "2030-01-01", ["art"], first)
+    second = _generated(service, ["Galeria", "Concerto"])
+    store.save_catalog("Paris", "2030-01-01", ["art"], second)
+
+    assert not {a["activity_id"] for a in first} & {a["activity_id"] for a in second}
+    assert [a["name"] for a in store.get_catalog("Paris", "2030-01-01", ["art"])] == ["Galeria", "Concerto"]
+    assert store.get_activity(first[0]["activity_id"]) is None
+
+def test_same_content_keeps_its_id(service):
+    assert [a["activity_id"] for a in _generated(service, ["Museu"])] == \
+        [a["activity_id"] for a in _generated(service, ["Museu"])]
+
+def test_pinned_activities_survive_replacement_and_eviction(service, store):
+    first = _generated(service, ["Museu", "Teatro"])
+    store.save_catalog("Paris", "2030-01-01", ["art"], first)
+    service.pin_activities([first[0]["activity_id"], "nao-existe"])
+
+    store.save_catalog("Paris", "2030-01-01", ["art"], _generated(service, ["Galeria"]))
+    store.save_catalog("Lisboa", "2030-01-01", ["art"], _generated(service, ["Fado"]))
+
+    assert store.get_activity(first[0]["activity_id"])["name"] == "Museu"
+    assert store.get_activity(first[1]["activity_id"]) is None
+    stats = store.stats()
+    assert stats["catalogs"] == 1 and stats["pinned_activities"] == 1 and stats["evictions"] == 1
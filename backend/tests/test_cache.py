@@ -0,0 +1,47 @@
+import asyncio
+import time
+import pytest
+from utils.cache import MemoryCache, NullCache, SQLiteCache
+
+@pytest.fixture(params=["memory", "sqlite"])
+def cache(request, tmp_path):
+    if request.param == "memory":
+        return MemoryCache(ttl_seconds=60, max_entries=2)
+    return SQLiteCache(str(tmp_path / "cache.db"), "test", ttl_seconds=60, max_entries=2)
+
+def test_values_are_isolated_from_callers(cache):
+    value = {"items": [1]}
+    cache.set("key", value)
+    value["items"].append("set")
+    cache.get("key")["items"].append("get")
+    assert cache.get("key") == {"items": [1]}
+
+def test_lru_eviction_and_stats(cache):
+    cache.set("a", 1)
+    time.sleep(0.01)
+    cache.set("b", 2)
+    time.sleep(0.01)
+    assert cache.get("a") == 1
+    time.sleep(0.01)
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    stats = cache.stats()
+    assert stats["hits"] == 3 and stats["misses"] == 1 and stats["evictions"] == 1
+
+def test_expired_entries_are_misses(cache):
+    cache.set("key", "value", ttl_seconds=-1)
+    assert cache.get("key") is None
+
+def test_async_access(cache):
+    async def roundtrip():
+        await cache.aset("key", {"a": 1})
+        return await cache.aget("key")
+
+    assert asyncio.run(roundtrip()) == {"a": 1}
+
+def test_null_cache_never_stores():
+    cache = NullCache()
+    cache.set("key", 1)
+    assert cache.get("key") is None
+    assert asyncio.run(cache.aget("key")) is None
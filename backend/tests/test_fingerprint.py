@@ -0,0 +1,22 @@
+from models.schemas import VacationInfo
+from utils.fingerprint import vacation_fingerprint
+
+def _with(vacation_info: VacationInfo, **changes) -> VacationInfo:
+    return vacation_info.model_copy(update=changes)
+
+def test_ignores_names_and_order(vacation_info):
+    travelers = [
+        traveler.model_copy(update={"name": f"Outro {index}", "interests": list(reversed(traveler.interests))})
+        for index, traveler in enumerate(reversed(vacation_info.travelers))
+    ]
+    shuffled = _with(vacation_info, travelers=travelers, destination="  paris ")
+    assert vacation_fingerprint(shuffled) == vacation_fingerprint(vacation_info)
+
+def test_changes_with_inputs_that_affect_the_plan(vacation_info):
+    base = vacation_fingerprint(vacation_info)
+    assert vacation_fingerprint(_with(vacation_info, budget=101)) != base
+    assert vacation_fingerprint(_with(vacation_info, destination="Lisboa")) != base
+    assert vacation_fingerprint(vacation_info, {"planner": "solver"}) != base
+
+def test_none_options_are_ignored(vacation_info):
+    assert vacation_fingerprint(vacation_info, {"prompt_mode": None}) == vacation_fingerprint(vacation_info)
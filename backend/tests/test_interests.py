@@ -0,0 +1,14 @@
+from models.schemas import Traveler
+from utils.interests import aggregate_interests, format_weighted_interests
+
+def test_weights_count_travelers_sharing_each_interest(vacation_info):
+    assert aggregate_interests(vacation_info.travelers) == {"art": 1, "music": 2}
+
+def test_repeated_interest_of_one_traveler_counts_once():
+    travelers = [Traveler(name="Ana", age=30, interests=["music", "music", "art"])]
+    assert list(aggregate_interests(travelers).items()) == [("art", 1), ("music", 1)]
+
+def test_format_weighted_interests():
+    assert format_weighted_interests([]) == "variados"
+    assert format_weighted_interests(["art", "music"]) == "art, music"
+    assert format_weighted_interests(["art", "music"], {"art": 1, "music": 2}) == "art (1 viajante), music (2 viajantes)"
@@ -0,0 +1,29 @@
+import pytest
+from utils.json_repair import JSONRepairError, close_truncated_json, extract_json_text, loads_tolerant
+
+def test_valid_json_is_not_repaired():
+    assert loads_tolerant('{"a": [1, 2]}') == ({"a": [1, 2]}, False)
+
+def test_extracts_json_from_code_fence_and_prose():
+    assert extract_json_text('Segue o plano:\n```json\n{"a": 1}\n```') == '{"a": 1}'
+    assert loads_tolerant('Aqui está: [1, 2] fim') == ([1, 2], False)
+
+def test_unclosed_code_fence():
+    assert loads_tolerant('```json\n{"a": 1}') == ({"a": 1}, False)
+
+def test_trailing_commas_are_removed():
+    assert loads_tolerant('{"a": [1, 2,], "b": 3,}') == ({"a": [1, 2], "b": 3}, True)
+
+def test_truncated_json_drops_the_incomplete_item():
+    value, repaired = loads_tolerant('{"days": [{"d": 1}, {"d": 2}, {"d": 3, "x": "cor')
+    assert repaired
+    assert value == {"days": [{"d": 1}, {"d": 2}, {"d": 3}]}
+
+def test_brackets_inside_strings_are_ignored():
+    assert close_truncated_json('{"a": "x]}", "b": [1, "y{') == '{"a": "x]}", "b": [1]}'
+
+def test_without_json():
+    with pytest.raises(JSONRepairError):
+        loads_tolerant("sem json aqui")
+    with pytest.raises(JSONRepairError):
+        loads_tolerant('{"a": ')
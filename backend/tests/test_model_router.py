@@ -0,0 +1,82 @@
+import asyncio
+import pytest
+from services import model_router
+from services.model_router import LLMResponse, ModelRouter
+from utils.rate_limiter import RateLimitExceeded
+
+MESSAGES = [{"role": "user", "content": "Gere o itinerário"}]
+
+class CompleteOnlyBackend:
+    """Backend sem streaming, como o Gemini"""
+
+    available = True
+
+    def __init__(self, provider: str, text: str = '{"ok": true}'):
+        self.provider = provider
+        self.text = text
+        self.timeouts = []
+
+    def complete(self, model, messages, timeout=None, quota=None, **options):
+        self.timeouts.append(timeout)
+        return LLMResponse(self.text, self.provider, model)
+
+    async def acomplete(self, model, messages, timeout=None, quota=None, **options):
+        return self.complete(model, messages, timeout, quota, **options)
+
+class FailingStreamBackend(CompleteOnlyBackend):
+    def stream(self, model, messages, timeout=None, quota=None, **options):
+        raise ConnectionError("conexão recusada")
+
+    async def astream(self, model, messages, timeout=None, quota=None, **options):
+        raise ConnectionError("conexão recusada")
+
+class QuotaRefusedBackend(CompleteOnlyBackend):
+    def complete(self, model, messages, timeout=None, quota=None, **options):
+        raise RateLimitExceeded(self.provider, model, 7, upstream=True)
+
+def _router(**backends) -> ModelRouter:
+    return ModelRouter(backends, routes={"itinerary": [("openai", "gpt"), ("gemini", "flash")]},
+                       deadlines={"itinerary": 10})
+
+def test_stream_falls_back_to_a_single_chunk_without_streaming_backends():
+    router = _router(gemini=CompleteOnlyBackend("gemini"))
+    stream, provider, model = router.stream("itinerary", MESSAGES)
+    chunks = list(stream)
+    assert (provider, model) == ("gemini", "flash")
+    assert [chunk.choices[0].delta.content for chunk in chunks] == ['{"ok": true}']
+    assert chunks[0].usage is None
+
+def test_stream_fails_over_before_the_first_token():
+    router = _router(openai=FailingStreamBackend("openai"), gemini=CompleteOnlyBackend("gemini"))
+    _, provider, _ = router.stream("itinerary", MESSAGES)
+    assert provider == "gemini"
+
+    async def astream():
+        stream, provider, _ = await router.astream("itinerary", MESSAGES)
+        return provider, [chunk async for chunk in stream]
+
+    provider, chunks = asyncio.run(astream())
+    assert provider == "gemini" and len(chunks) == 1
+
+def test_quota_wait_does_not_shrink_the_attempt(monkeypatch):
+    clock = {"now": 0.0}
+    monkeypatch.setattr(model_router.time, "monotonic", lambda: clock["now"])
+
+    def slow_quota(*args):
+        clock["now"] += 3
+        return None, 0
+
+    monkeypatch.setattr(model_router, "_acquire_quota", slow_quota)
+    backend = CompleteOnlyBackend("gemini")
+    router = _router(gemini=backend)
+    response = router.complete("itinerary", MESSAGES)
+    # O timeout é calculado depois da espera pela cota e a latência registrada não a inclui
+    assert backend.timeouts == [7]
+    assert router._latencies[("gemini", "flash")][0] == 0
+    assert response.served_by()["provider"] == "gemini"
+
+def test_all_candidates_refused_by_quota_raise_the_shortest_retry_after():
+    router = _router(openai=QuotaRefusedBackend("openai"), gemini=QuotaRefusedBackend("gemini"))
+    with pytest.raises(RateLimitExceeded) as error:
+        router.complete("itinerary", MESSAGES)
+    assert error.value.upstream and error.value.retry_after == 7
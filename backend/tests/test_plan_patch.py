@@ -0,0 +1,53 @@
+import datetime
+import pytest
+from utils.plan_patch import PlanPatchError, apply_plan_patch
+
+DAY_1 = datetime.date(2030, 1, 1)
+
+def test_add_and_remove_adjust_cost_and_changed_dates(travel_plan, make_activity):
+    new_plan, changed = apply_plan_patch(travel_plan, [
+        {"op": "add_activity", "date": "2030-01-01", "activity": make_activity("a3", start="14:00", end="15:00", price=7),
+         "reasons": ["Perto do hotel"]},
+        {"op": "remove_activity", "date": "2030-01-01", "activity_id": "a1"}
+    ])
+    assert changed == {DAY_1}
+    assert new_plan.total_cost == travel_plan.total_cost - 10 + 7
+    assert [r.activity.activity_id for r in new_plan.itinerary_days[0].activity_recommendations] == ["a3"]
+    # O plano original não é alterado
+    assert travel_plan.itinerary_days[0].activity_recommendations[0].activity.activity_id == "a1"
+
+def test_replace_activity(travel_plan, make_activity):
+    new_plan, _ = apply_plan_patch(travel_plan, [
+        {"op": "replace_activity", "date": "2030-01-02", "activity_id": "a2",
+         "activity": make_activity("a4", date="2030-01-02", price=5)}
+    ])
+    assert new_plan.total_cost == travel_plan.total_cost - 20 + 5
+
+def test_reason_string_is_not_split_into_characters(travel_plan, make_activity):
+    new_plan, _ = apply_plan_patch(travel_plan, [
+        {"op": "update_reasons", "date": "2030-01-01", "activity_id": "a1", "reasons": "Ótima para o grupo"},
+        {"op": "add_activity", "date": "2030-01-02", "activity": make_activity("a5", date="2030-01-02", start="15:00",
+                                                                               end="16:00"), "reasons": "Novo motivo"}
+    ])
+    assert new_plan.itinerary_days[0].activity_recommendations[0].reasons_for_recommendation == ["Ótima para o grupo"]
+    assert new_plan.itinerary_days[1].activity_recommendations[1].reasons_for_recommendation == ["Novo motivo"]
+
+@pytest.mark.parametrize("reasons", [5, {"a": "b"}, ["ok", 3]])
+def test_invalid_reasons_reject_the_patch(travel_plan, reasons):
+    with pytest.raises(PlanPatchError):
+        apply_plan_patch(travel_plan, [
+            {"op": "update_reasons", "date": "2030-01-01", "activity_id": "a1", "reasons": reasons}
+        ])
+
+@pytest.mark.parametrize("operations", [
+    [],
+    "remove",
+    [{"op": "rename", "date": "2030-01-01"}],
+    [{"op": "remove_activity", "date": "01/01/2030", "activity_id": "a1"}],
+    [{"op": "remove_activity", "date": "2030-02-01", "activity_id": "a1"}],
+    [{"op": "remove_activity", "date": "2030-01-01", "activity_id": "nao-existe"}],
+    [{"op": "add_activity", "date": "2030-01-01", "activity": {"name": "incompleta"}}]
+])
+def test_invalid_operations(travel_plan, operations):
+    with pytest.raises(PlanPatchError):
+        apply_plan_patch(travel_plan, operations)
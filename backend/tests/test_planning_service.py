@@ -0,0 +1,67 @@
+import pytest
+from services.planning_service import ActivityPlanner
+
+class Weather:
+    def is_outdoor_friendly(self, condition: str) -> bool:
+        return condition not in ("rainy", "thunderstorm")
+
+DATES = ["2030-01-01", "2030-01-02", "2030-01-03"]
+
+@pytest.fixture
+def planner():
+    return ActivityPlanner(Weather(), max_per_day=3)
+
+def test_accepts_space_and_iso_separators(planner, make_activity):
+    activities = [make_activity("iso", separator="T"), make_activity("space", date="2030-01-02", separator=" ")]
+    selection = planner.select(DATES[:2], 100, [], activities, {"art": 1})
+    assert [a["activity_id"] for a in selection["days"]["2030-01-01"]] == ["iso"]
+    assert [a["activity_id"] for a in selection["days"]["2030-01-02"]] == ["space"]
+
+def test_one_activity_per_day_and_interest_coverage(planner, make_activity):
+    activities = [
+        make_activity("art-1", price=10),
+        make_activity("music-1", start="12:00", end="13:00", price=10, interests=["music"]),
+        make_activity("art-2", date="2030-01-02", price=5),
+        make_activity("art-3", date="2030-01-03", price=5)
+    ]
+    selection = planner.select(DATES, 100, [], activities, {"art": 1, "music": 2})
+    assert all(selection["days"][date] for date in DATES)
+    assert selection["uncovered_interests"] == []
+    assert selection["total_cost"] == 20
+    assert selection["unfunded_dates"] == [] and selection["budget_shortfall"] == 0
+
+def test_never_exceeds_the_budget(planner, make_activity):
+    activities = [
+        make_activity("a1", price=50),
+        make_activity("a2", date="2030-01-02", price=40),
+        make_activity("a3", date="2030-01-03", price=70),
+        make_activity("a4", date="2030-01-03", start="14:00", end="15:00", price=5)
+    ]
+    selection = planner.select(DATES, 30, [], activities, {"art": 1})
+    assert selection["total_cost"] <= 30
+    assert [a["activity_id"] for a in selection["days"]["2030-01-03"]] == ["a4"]
+    assert selection["unfunded_dates"] == ["2030-01-01", "2030-01-02"]
+    assert selection["budget_shortfall"] == 5 + 40 + 50 - 30
+
+def test_no_overlapping_activities(planner, make_activity):
+    activities = [
+        make_activity("a1", start="10:00", end="12:00", interests=["art"]),
+        make_activity("a2", start="11:00", end="13:00", interests=["music"]),
+        make_activity("a3", start="12:00", end="13:00", interests=["music"])
+    ]
+    selection = planner.select(DATES[:1], 100, [], activities, {"art": 1, "music": 1})
+    assert [a["activity_id"] for a in selection["days"]["2030-01-01"]] == ["a1", "a3"]
+
+def test_avoids_outdoor_activities_when_raining(planner, make_activity):
+    activities = [
+        make_activity("trilha", name="Trilha no parque", description="ao ar livre", interests=["hiking"]),
+        make_activity("museu", name="Museu", start="13:00", end="14:00", interests=["art"])
+    ]
+    weather = [{"date": "2030-01-01", "condition": "rainy"}]
+    selection = planner.select(DATES[:1], 100, weather, activities, {"hiking": 1, "art": 1})
+    assert [a["activity_id"] for a in selection["days"]["2030-01-01"]] == ["museu"]
+
+def test_invalid_intervals_are_dropped(planner, make_activity):
+    activities = [make_activity("invertida", start="12:00", end="11:00"), make_activity("sem-hora", start="", end="")]
+    selection = planner.select(DATES[:1], 100, [], activities, {"art": 1})
+    assert selection["days"]["2030-01-01"] == []
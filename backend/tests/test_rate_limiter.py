@@ -0,0 +1,57 @@
+import asyncio
+import pytest
+from utils import rate_limiter
+from utils.rate_limiter import LLMRateLimiter, RateLimitExceeded, get_rate_limiter, llm_priority
+
+def test_rejects_when_the_wait_would_be_too_long():
+    limiter = LLMRateLimiter("openai", "gpt-test", rpm=2, max_wait_seconds=0.5)
+    limiter.acquire(10)
+    limiter.acquire(10)
+    with pytest.raises(RateLimitExceeded) as error:
+        limiter.acquire(10)
+    assert not error.value.upstream
+    assert error.value.retry_after >= 1
+    assert limiter.stats()["admitted"] == 2 and limiter.stats()["rejected"] == 1
+
+def test_token_budget_and_settle():
+    limiter = LLMRateLimiter("openai", "gpt-test", tpm=1000, max_wait_seconds=0.5)
+    limiter.acquire(800)
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire(800)
+    # A API informou um consumo menor que o estimado: a diferença volta para o balde
+    limiter.settle(800, 100)
+    limiter.acquire(800)
+
+def test_waits_for_refill_within_max_wait():
+    limiter = LLMRateLimiter("openai", "gpt-test", rpm=600, max_wait_seconds=1)
+    for _ in range(600):
+        limiter.acquire(1)
+    # 600 por minuto: uma nova ficha a cada 0,1s
+    limiter.acquire(1)
+
+    async def acquire():
+        await limiter.aacquire(1)
+
+    asyncio.run(acquire())
+    assert limiter.stats()["admitted"] == 602
+
+def test_priority_context():
+    assert rate_limiter.current_priority() == "default"
+    with llm_priority("interactive"):
+        assert rate_limiter.current_priority() == "interactive"
+    assert rate_limiter.current_priority() == "default"
+
+def test_per_model_limits_fall_back_to_provider(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "_limiters", {})
+    monkeypatch.setenv("OPENAI_RPM", "100")
+    monkeypatch.setenv("OPENAI_GPT_4O_MINI_RPM", "5")
+    monkeypatch.delenv("GEMINI_RPM", raising=False)
+    monkeypatch.delenv("GEMINI_TPM", raising=False)
+    assert get_rate_limiter("openai", "gpt-4o-mini").stats()["rpm"] == 5
+    assert get_rate_limiter("openai", "gpt-3.5-turbo").stats()["rpm"] == 100
+    assert get_rate_limiter("gemini", "gemini-2.0-flash") is None
+
+def test_upstream_message():
+    error = RateLimitExceeded("gemini", "gemini-2.0-flash", 0.2, upstream=True)
+    assert error.upstream and error.retry_after == 1
+    assert "recusou" in str(error)
@@ -0,0 +1,80 @@
+import asyncio
+import threading
+import time
+from utils.singleflight import AsyncSingleFlight, SingleFlight
+
+def test_concurrent_calls_share_one_execution_and_get_private_copies():
+    group = SingleFlight("test")
+    calls = []
+    results = {}
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"items": [1]}
+
+    def leader():
+        result = group.do("key", fetch)
+        # O líder altera o próprio resultado enquanto os demais ainda podem estar copiando
+        result["items"].append("leader")
+        results["leader"] = result
+
+    def follower(name):
+        time.sleep(0.05)
+        results[name] = group.do("key", fetch)
+
+    threads = [threading.Thread(target=leader)] + [
+        threading.Thread(target=follower, args=(f"follower-{index}",)) for index in range(3)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results["leader"] == {"items": [1, "leader"]}
+    followers = [results[f"follower-{index}"] for index in range(3)]
+    assert all(result == {"items": [1]} for result in followers)
+    assert len({id(result) for result in followers}) == 3
+    assert group.stats() == {"executed": 1, "coalesced": 3, "in_flight": 0}
+
+def test_exception_is_shared_and_key_is_released():
+    group = SingleFlight("errors")
+
+    def fail():
+        raise ValueError("falhou")
+
+    for _ in range(2):
+        try:
+            group.do("key", fail)
+        except ValueError as e:
+            assert str(e) == "falhou"
+    assert group.stats()["in_flight"] == 0
+    assert group.do("key", lambda: 42) == 42
+
+def test_async_followers_do_not_see_leader_mutations():
+    group = AsyncSingleFlight("test:async")
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"items": [1]}
+
+    async def leader():
+        result = await group.do("key", fetch)
+        result["items"].append("leader")
+        return result
+
+    async def follower():
+        await asyncio.sleep(0.01)
+        return await group.do("key", fetch)
+
+    async def main():
+        return await asyncio.gather(leader(), follower(), follower())
+
+    leader_result, *followers = asyncio.run(main())
+    assert len(calls) == 1
+    assert leader_result == {"items": [1, "leader"]}
+    assert followers == [{"items": [1]}, {"items": [1]}]
+    assert followers[0] is not followers[1]
@@ -0,0 +1,247 @@
+import asyncio
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+class MemoryCache:
+    """Cache em memória do processo com expiração (TTL) e limite de tamanho (LRU).
+
+    Como no SQLiteCache, quem lê ou grava recebe uma cópia: alterar o valor
+    retornado (ou o gravado) não altera a entrada armazenada.
+    """
+
+    def __init__(self, ttl_seconds: float = 1800, max_entries: int = 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+        # A entrada armazenada nunca é alterada, então a cópia pode ser feita fora do lock
+        return copy.deepcopy(value)
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """Versão para o event loop: a leitura em memória não bloqueia e é feita direto"""
+        return self.get(key)
+
+    async def aset(self, key: str, value: Any, ttl_seconds: Optional[float] = None):
+        self.set(key, value, ttl_seconds)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            size = len(self._entries)
+        return {
+            "backend": "memory",
+            "size": size,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+class SQLiteCache:
+    """Cache em arquivo SQLite compartilhável entre workers do mesmo host.
+
+    Os valores são serializados em JSON. A ordem LRU é mantida pela coluna
+    last_access e os contadores de acerto/erro são locais ao processo.
+    """
+
+    def __init__(self, path: str, namespace: str, ttl_seconds: float = 1800, max_entries: int = 1024):
+        self.path = path
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_cache_lru ON cache_entries (namespace, last_access)"
+        )
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = row
+            if expires_at < now:
+                self._conn.execute(
+                    "DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+                    (self.namespace, key)
+                )
+                self._conn.commit()
+                self.misses += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE cache_entries SET last_access = ? WHERE namespace = ? AND key = ?",
+                (now, self.namespace, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return json.loads(value)
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, key, json.dumps(value, default=str), now + ttl, now)
+            )
+            # Remove as entradas menos usadas além do limite
+            cursor = self._conn.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND key IN ("
+                "SELECT key FROM cache_entries WHERE namespace = ? "
+                "ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.namespace, self.namespace, self.max_entries)
+            )
+            self.evictions += max(cursor.rowcount, 0)
+            self._conn.commit()
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """Versão para o event loop: a consulta ao SQLite roda em uma thread"""
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: Any, ttl_seconds: Optional[float] = None):
+        await asyncio.to_thread(self.set, key, value, ttl_seconds)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key)
+            )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache_entries WHERE namespace = ?", (self.namespace,))
+            self._conn.commit()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            size = self._conn.execute(
+                "SELECT COUNT(*) FROM cache_entries WHERE namespace = ?", (self.namespace,)
+            ).fetchone()[0]
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "size": size,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+class NullCache:
+    """Cache desativado: nunca armazena nada"""
+
+    def __init__(self):
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None):
+        pass
+
+    async def aget(self, key: str) -> Optional[Any]:
+        return self.get(key)
+
+    async def aset(self, key: str, value: Any, ttl_seconds: Optional[float] = None):
+        pass
+
+    def delete(self, key: str):
+        pass
+
+    def clear(self):
+        pass
+
+    def stats(self) -> Dict:
+        return {"backend": "none", "size": 0, "hits": 0, "misses": self.misses, "evictions": 0}
+
+def build_cache(namespace: str, default_ttl: float = 1800, default_max_entries: int = 1024,
+                default_backend: str = "memory"):
+    """Cria o cache de um namespace a partir das variáveis de ambiente.
+
+    Para o namespace "weather" são lidas WEATHER_CACHE_BACKEND (memory, sqlite
+    ou none), WEATHER_CACHE_TTL e WEATHER_CACHE_MAX_ENTRIES. O backend sqlite
+    usa o arquivo em CACHE_SQLITE_PATH.
+    """
+    prefix = namespace.upper()
+    backend = os.getenv(f"{prefix}_CACHE_BACKEND", default_backend).lower()
+    ttl = float(os.getenv(f"{prefix}_CACHE_TTL", str(default_ttl)))
+    max_entries = int(os.getenv(f"{prefix}_CACHE_MAX_ENTRIES", str(default_max_entries)))
+
+    if backend == "none":
+        return NullCache()
+    if backend == "sqlite":
+        path = os.getenv("CACHE_SQLITE_PATH", "agentsville_cache.db")
+        return SQLiteCache(path, namespace, ttl_seconds=ttl, max_entries=max_entries)
+    return MemoryCache(ttl_seconds=ttl, max_entries=max_entries)
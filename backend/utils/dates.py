@@ -0,0 +1,17 @@
+import datetime
+from typing import List, Union
+
+DateLike = Union[str, datetime.date]
+
+def _as_date(value: DateLike) -> datetime.date:
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(str(value)[:10])
+
+def date_range(start: DateLike, end: DateLike) -> List[str]:
+    """Datas de start a end (inclusive) no formato YYYY-MM-DD; vazio se end < start"""
+    start_date = _as_date(start)
+    days = (_as_date(end) - start_date).days
+    return [(start_date + datetime.timedelta(days=offset)).isoformat() for offset in range(days + 1)]
@@ -0,0 +1,25 @@
+import hashlib
+import json
+from typing import Dict, Optional
+from models.schemas import VacationInfo
+
+def vacation_fingerprint(vacation_info: VacationInfo, options: Optional[Dict] = None) -> str:
+    """Hash canônico de uma VacationInfo para uso como chave de cache.
+
+    Os nomes dos viajantes e a ordem em que viajantes e interesses aparecem
+    são ignorados, pois não alteram o plano gerado. Opções que afetam a
+    geração (como os modos de prompt) entram na chave.
+    """
+    canonical = {
+        "destination": " ".join(vacation_info.destination.lower().split()),
+        "date_of_arrival": vacation_info.date_of_arrival.isoformat(),
+        "date_of_departure": vacation_info.date_of_departure.isoformat(),
+        "budget": vacation_info.budget,
+        "travelers": sorted(
+            [traveler.age, sorted({interest.value for interest in traveler.interests})]
+            for traveler in vacation_info.travelers
+        ),
+        "options": {key: value for key, value in sorted((options or {}).items()) if value is not None}
+    }
+    encoded = json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
@@ -0,0 +1,245 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Dict
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+class CircuitOpenError(Exception):
+    """O circuito do upstream está aberto: a chamada falha imediatamente"""
+    pass
+
+class CircuitBreaker:
+    """Disjuntor por upstream.
+
+    Após failure_threshold falhas consecutivas o circuito abre e as chamadas
+    falham imediatamente por recovery_seconds. Depois disso uma única chamada
+    de teste é liberada (meio aberto): sucesso fecha o circuito, falha o
+    reabre.
+    """
+
+    def __init__(self, failure_threshold: int = 5, recovery_seconds: float = 30):
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == "open" and time.monotonic() - self._opened_at >= self.recovery_seconds:
+                return "half_open"
+            return self._state
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self._state == "closed":
+                return True
+
+            if time.monotonic() - self._opened_at < self.recovery_seconds or self._trial_in_flight:
+                self.rejected += 1
+                return False
+
+            self._state = "half_open"
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state = "closed"
+            self._consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive_failures += 1
+            self._trial_in_flight = False
+            if self._state == "half_open" or self._consecutive_failures >= self.failure_threshold:
+                self._state = "open"
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> Dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._consecutive_failures,
+            "rejected": self.rejected
+        }
+
+class HTTPClient:
+    """Cliente HTTP compartilhado para um upstream.
+
+    Usa uma sessão com pool de conexões keep-alive, timeouts separados de
+    conexão e leitura, novas tentativas com backoff exponencial e jitter, e um
+    CircuitBreaker que faz as chamadas falharem rápido quando o upstream não
+    está saudável.
+    """
+
+    def __init__(self, name: str, pool_size: int = 10, connect_timeout: float = 3.05,
+                 read_timeout: float = 10, max_retries: int = 2, backoff_base: float = 0.3,
+                 backoff_max: float = 3.0, failure_threshold: int = 5, recovery_seconds: float = 30):
+        self.name = name
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = CircuitBreaker(failure_threshold, recovery_seconds)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """Faz um GET com novas tentativas; levanta CircuitOpenError se o circuito estiver aberto"""
+        return self.request("GET", url, **kwargs)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(f"Circuito aberto para {self.name}")
+
+        kwargs.setdefault("timeout", self.timeout)
+        response = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.request(method, url, **kwargs)
+                if response.status_code not in RETRY_STATUS_CODES:
+                    self.breaker.record_success()
+                    return response
+                error = None
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            except requests.RequestException:
+                self.breaker.record_failure()
+                raise
+
+            if attempt < self.max_retries:
+                time.sleep(self._backoff(attempt))
+
+        self.breaker.record_failure()
+        if error is not None:
+            raise error
+        return response
+
+    def _backoff(self, attempt: int) -> float:
+        """Backoff exponencial com jitter completo"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def stats(self) -> Dict:
+        return {"name": self.name, "circuit": self.breaker.stats()}
+
+class AsyncHTTPClient:
+    """Versão assíncrona do HTTPClient, usada no modo ASGI.
+
+    Usa um httpx.AsyncClient com pool de conexões, as mesmas novas tentativas
+    com backoff e o mesmo CircuitBreaker do cliente síncrono do upstream. O
+    httpx só é importado quando o primeiro cliente assíncrono é criado.
+    """
+
+    def __init__(self, name: str, breaker: CircuitBreaker, pool_size: int = 100, connect_timeout: float = 3.05,
+                 read_timeout: float = 10, max_retries: int = 2, backoff_base: float = 0.3,
+                 backoff_max: float = 3.0):
+        import httpx
+
+        self._httpx = httpx
+        self.name = name
+        self.breaker = breaker
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        )
+
+    async def get(self, url: str, **kwargs):
+        """Faz um GET com novas tentativas; levanta CircuitOpenError se o circuito estiver aberto"""
+        return await self.request("GET", url, **kwargs)
+
+    async def request(self, method: str, url: str, **kwargs):
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(f"Circuito aberto para {self.name}")
+
+        response = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self.client.request(method, url, **kwargs)
+                if response.status_code not in RETRY_STATUS_CODES:
+                    self.breaker.record_success()
+                    return response
+                error = None
+            except self._httpx.TransportError as e:
+                error = e
+            except self._httpx.HTTPError:
+                self.breaker.record_failure()
+                raise
+
+            if attempt < self.max_retries:
+                await asyncio.sleep(random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt))))
+
+        self.breaker.record_failure()
+        if error is not None:
+            raise error
+        return response
+
+    async def aclose(self):
+        await self.client.aclose()
+
+_clients: Dict[str, HTTPClient] = {}
+_async_clients: Dict[str, AsyncHTTPClient] = {}
+_clients_lock = threading.Lock()
+
+def get_http_client(name: str) -> HTTPClient:
+    """Retorna o cliente compartilhado do upstream, criando-o a partir das variáveis HTTP_*"""
+    with _clients_lock:
+        client = _clients.get(name)
+        if client is None:
+            client = HTTPClient(
+                name,
+                pool_size=int(os.getenv("HTTP_POOL_SIZE", "10")),
+                connect_timeout=float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05")),
+                read_timeout=float(os.getenv("HTTP_READ_TIMEOUT", "10")),
+                max_retries=int(os.getenv("HTTP_MAX_RETRIES", "2")),
+                failure_threshold=int(os.getenv("HTTP_CIRCUIT_FAILURE_THRESHOLD", "5")),
+                recovery_seconds=float(os.getenv("HTTP_CIRCUIT_RECOVERY_SECONDS", "30"))
+            )
+            _clients[name] = client
+        return client
+
+def get_async_http_client(name: str) -> AsyncHTTPClient:
+    """Retorna o cliente assíncrono compartilhado do upstream (mesmo circuito do cliente síncrono)"""
+    breaker = get_http_client(name).breaker
+    with _clients_lock:
+        client = _async_clients.get(name)
+        if client is None:
+            client = AsyncHTTPClient(
+                name,
+                breaker,
+                pool_size=int(os.getenv("ASYNC_HTTP_POOL_SIZE", "100")),
+                connect_timeout=float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05")),
+                read_timeout=float(os.getenv("HTTP_READ_TIMEOUT", "10")),
+                max_retries=int(os.getenv("HTTP_MAX_RETRIES", "2"))
+            )
+            _async_clients[name] = client
+        return client
+
+async def close_async_http_clients():
+    """Fecha as conexões dos clientes assíncronos (no encerramento do servidor ASGI)"""
+    with _clients_lock:
+        clients = list(_async_clients.values())
+        _async_clients.clear()
+    for client in clients:
+        await client.aclose()
+
+def http_clients_health() -> Dict[str, Dict]:
+    """Estado dos circuitos de todos os upstreams já utilizados"""
+    with _clients_lock:
+        clients = list(_clients.values())
+    return {client.name: client.breaker.stats() for client in clients}
@@ -0,0 +1,25 @@
+from typing import Dict, List, Optional
+from models.schemas import Traveler
+
+def aggregate_interests(travelers: List[Traveler]) -> Dict[str, int]:
+    """Agrega os interesses dos viajantes em um conjunto canônico ordenado.
+
+    O valor de cada interesse é o número de viajantes que o compartilham.
+    """
+    weights: Dict[str, int] = {}
+    for traveler in travelers:
+        for interest in {interest.value for interest in traveler.interests}:
+            weights[interest] = weights.get(interest, 0) + 1
+
+    return dict(sorted(weights.items()))
+
+def format_weighted_interests(interests: Optional[List[str]], weights: Optional[Dict[str, int]] = None) -> str:
+    """Formata os interesses para prompts, ex.: "art (2 viajantes), music (6 viajantes)" """
+    if not interests:
+        return "variados"
+    if not weights:
+        return ", ".join(interests)
+    return ", ".join(
+        f"{interest} ({weights.get(interest, 1)} {'viajante' if weights.get(interest, 1) == 1 else 'viajantes'})"
+        for interest in interests
+    )
@@ -0,0 +1,86 @@
+import json
+import re
+from typing import Any, List, Tuple
+
+class JSONRepairError(ValueError):
+    """Não foi possível extrair um JSON da resposta do modelo"""
+    pass
+
+_TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+
+def extract_json_text(content: str) -> str:
+    """Localiza o JSON na resposta: bloco ```json (mesmo sem fechamento) ou o primeiro objeto/lista"""
+    text = content.strip()
+    if "```json" in text:
+        text = text.split("```json", 1)[1].split("```", 1)[0]
+    elif text.startswith("```"):
+        text = text.split("\n", 1)[-1].split("```", 1)[0]
+
+    starts = [index for index in (text.find("{"), text.find("[")) if index != -1]
+    if not starts:
+        raise JSONRepairError("Nenhum objeto JSON encontrado na resposta")
+    return text[min(starts):].strip()
+
+def remove_trailing_commas(text: str) -> str:
+    return _TRAILING_COMMA.sub(r"\1", text)
+
+def close_truncated_json(text: str) -> str:
+    """Fecha um JSON cortado no meio: descarta o último item incompleto e fecha as chaves abertas"""
+    stack: List[str] = []
+    in_string = False
+    escaped = False
+    last_safe = None
+
+    for position, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]":
+            if not stack:
+                break
+            stack.pop()
+            last_safe = (position + 1, list(stack))
+            if not stack:
+                break
+        elif char == ",":
+            last_safe = (position, list(stack))
+
+    if last_safe is None:
+        raise JSONRepairError("JSON truncado sem nenhum valor completo")
+
+    cut, open_brackets = last_safe
+    return text[:cut] + "".join(reversed(open_brackets))
+
+def loads_tolerant(content: str) -> Tuple[Any, bool]:
+    """Decodifica o JSON da resposta, reparando vírgulas sobrando e truncamento.
+
+    Retorna o valor e se foi preciso reparar o texto.
+    """
+    text = extract_json_text(content)
+    decoder = json.JSONDecoder()
+
+    try:
+        value, _ = decoder.raw_decode(text)
+        return value, False
+    except json.JSONDecodeError:
+        pass
+
+    without_commas = remove_trailing_commas(text)
+    for candidate in (lambda: without_commas, lambda: close_truncated_json(without_commas)):
+        try:
+            value, _ = decoder.raw_decode(candidate())
+            return value, True
+        except (json.JSONDecodeError, JSONRepairError):
+            continue
+
+    raise JSONRepairError("JSON inválido mesmo após reparo")
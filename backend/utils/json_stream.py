@@ -0,0 +1,80 @@
+import json
+from typing import List
+
+class ItineraryDayStreamParser:
+    """Extrai os objetos de "itinerary_days" de um JSON que chega em pedaços.
+
+    O texto recebido é acumulado e, a cada chamada de feed, retorna os dias
+    cujo objeto JSON já foi fechado. O texto anterior ao bloco JSON (como a
+    seção de ANÁLISE) é ignorado.
+    """
+
+    ARRAY_KEY = '"itinerary_days"'
+
+    def __init__(self):
+        self._buffer = ""
+        self._position = 0
+        self._in_array = False
+        self._array_closed = False
+        self._object_start = None
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, text: str) -> List[dict]:
+        """Adiciona texto ao buffer e retorna os dias completos encontrados"""
+        self._buffer += text
+        days = []
+
+        if not self._in_array and not self._array_closed:
+            if not self._find_array_start():
+                return days
+
+        while self._in_array and self._position < len(self._buffer):
+            char = self._buffer[self._position]
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                if self._depth == 0:
+                    self._object_start = self._position
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0 and self._object_start is not None:
+                    raw_day = self._buffer[self._object_start:self._position + 1]
+                    self._object_start = None
+                    try:
+                        days.append(json.loads(raw_day))
+                    except json.JSONDecodeError:
+                        pass
+            elif char == "]" and self._depth == 0:
+                self._in_array = False
+                self._array_closed = True
+
+            self._position += 1
+
+        return days
+
+    def _find_array_start(self) -> bool:
+        """Posiciona o cursor logo após o "[" de itinerary_days, se já tiver chegado"""
+        json_start = self._buffer.find("```json")
+        search_from = json_start if json_start != -1 else 0
+        key_index = self._buffer.find(self.ARRAY_KEY, search_from)
+        if key_index == -1:
+            return False
+
+        bracket_index = self._buffer.find("[", key_index + len(self.ARRAY_KEY))
+        if bracket_index == -1:
+            return False
+
+        self._position = bracket_index + 1
+        self._in_array = True
+        return True
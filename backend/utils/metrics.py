@@ -0,0 +1,250 @@
+import contextvars
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+def _label_key(labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+def _format_labels(key: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+class Counter:
+    """Contador monotônico com rótulos"""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def values(self) -> Dict[Tuple, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.values().items()):
+            lines.append(f"{self.name}{_format_labels(key)} {int(value) if float(value).is_integer() else value}")
+        return lines
+
+class Histogram:
+    """Histograma com buckets cumulativos, soma e contagem por conjunto de rótulos"""
+
+    def __init__(self, name: str, help_text: str, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, Dict] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def summary(self) -> Dict[Tuple, Dict]:
+        with self._lock:
+            return {key: {"sum": series["sum"], "count": series["count"], "counts": list(series["counts"])}
+                    for key, series in self._series.items()}
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self.summary().items()):
+            for bound, count in zip(self.buckets, series["counts"]):
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', f'{bound:g}'))} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {series['count']}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {series['sum']:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {series['count']}")
+        return lines
+
+class MetricsRegistry:
+    """Conjunto de métricas do processo, exportado no formato texto do Prometheus"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        with self._lock:
+            return self._metrics.setdefault(name, Counter(name, help_text))
+
+    def histogram(self, name: str, help_text: str, buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        with self._lock:
+            return self._metrics.setdefault(name, Histogram(name, help_text, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+STAGE_DURATION = registry.histogram(
+    "agentsville_stage_duration_seconds", "Duração de cada etapa do pipeline de itinerários"
+)
+UPSTREAM_DURATION = registry.histogram(
+    "agentsville_upstream_request_duration_seconds", "Duração das chamadas aos serviços externos"
+)
+UPSTREAM_REQUESTS = registry.counter(
+    "agentsville_upstream_requests_total", "Chamadas aos serviços externos por resultado"
+)
+LLM_TOKENS = registry.counter(
+    "agentsville_llm_tokens_total", "Tokens consumidos nas chamadas aos LLMs"
+)
+LLM_REPAIRS = registry.counter(
+    "agentsville_llm_repairs_total", "Respostas dos LLMs por resultado da extração e do reparo do JSON"
+)
+LLM_RATE_LIMITED = registry.counter(
+    "agentsville_llm_rate_limited_total", "Chamadas aos LLMs recusadas pelo limitador local de cota"
+)
+LLM_ROUTED = registry.counter(
+    "agentsville_llm_routed_total", "Tentativas do roteador de modelos por tarefa, modelo e resultado"
+)
+ERRORS = registry.counter(
+    "agentsville_errors_total", "Erros por etapa do pipeline"
+)
+HTTP_DURATION = registry.histogram(
+    "agentsville_http_request_duration_seconds", "Duração das requisições HTTP atendidas pela API"
+)
+
+# Etapas cronometradas durante a requisição atual (para o cabeçalho Server-Timing)
+_request_timings: contextvars.ContextVar = contextvars.ContextVar("request_timings", default=None)
+
+_upstream_state: Dict[str, Dict] = {}
+_upstream_lock = threading.Lock()
+
+def start_request_timings():
+    """Começa a coletar as etapas da requisição atual"""
+    _request_timings.set([])
+
+def request_timings() -> List[Tuple[str, float]]:
+    return list(_request_timings.get() or [])
+
+def server_timing_header(timings: List[Tuple[str, float]]) -> str:
+    """Formata as etapas como cabeçalho Server-Timing (durações em ms)"""
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings)
+
+@contextmanager
+def stage_span(stage: str):
+    """Cronometra uma etapa do pipeline e conta erros da etapa"""
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except Exception:
+        outcome = "error"
+        ERRORS.inc(stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_DURATION.observe(elapsed, stage=stage, outcome=outcome)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((stage, elapsed))
+
+@contextmanager
+def upstream_span(upstream: str):
+    """Cronometra uma chamada a um serviço externo e atualiza sua saúde"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        _record_upstream(upstream, time.perf_counter() - started, "error", str(e))
+        raise
+    else:
+        _record_upstream(upstream, time.perf_counter() - started, "ok")
+
+def _record_upstream(upstream: str, elapsed: float, outcome: str, error: Optional[str] = None):
+    UPSTREAM_DURATION.observe(elapsed, upstream=upstream, outcome=outcome)
+    UPSTREAM_REQUESTS.inc(upstream=upstream, outcome=outcome)
+    with _upstream_lock:
+        state = _upstream_state.setdefault(upstream, {
+            "requests": 0, "errors": 0, "consecutive_errors": 0,
+            "last_success_at": None, "last_error_at": None, "last_error": None
+        })
+        state["requests"] += 1
+        if outcome == "ok":
+            state["consecutive_errors"] = 0
+            state["last_success_at"] = time.time()
+        else:
+            state["errors"] += 1
+            state["consecutive_errors"] += 1
+            state["last_error_at"] = time.time()
+            state["last_error"] = error[:200] if error else None
+
+def record_llm_usage(provider: str, model: str, prompt_tokens: Optional[int], completion_tokens: Optional[int]):
+    """Soma os tokens informados pela API (response.usage)"""
+    if prompt_tokens:
+        LLM_TOKENS.inc(prompt_tokens, provider=provider, model=model, kind="prompt")
+    if completion_tokens:
+        LLM_TOKENS.inc(completion_tokens, provider=provider, model=model, kind="completion")
+
+def upstream_health() -> Dict[str, Dict]:
+    """Resumo por serviço externo: chamadas, erros e latência média"""
+    durations = UPSTREAM_DURATION.summary()
+    with _upstream_lock:
+        health = {name: dict(state) for name, state in _upstream_state.items()}
+
+    for name, state in health.items():
+        total = sum(series["sum"] for key, series in durations.items() if ("upstream", name) in key)
+        state["avg_latency_seconds"] = round(total / state["requests"], 4) if state["requests"] else None
+    return health
+
+def render_gauge(name: str, help_text: str, samples: List[Tuple[Dict[str, str], float]]) -> str:
+    """Formata valores instantâneos (lidos no momento da coleta) como gauge"""
+    return _render_samples(name, help_text, "gauge", samples)
+
+def render_counter(name: str, help_text: str, samples: List[Tuple[Dict[str, str], float]]) -> str:
+    """Formata contadores mantidos fora do registro (ex.: acertos dos caches) lidos no momento da coleta"""
+    return _render_samples(name, help_text, "counter", samples)
+
+def _render_samples(name: str, help_text: str, metric_type: str, samples: List[Tuple[Dict[str, str], float]]) -> str:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+    for labels, value in samples:
+        if value is not None:
+            lines.append(f"{name}{_format_labels(_label_key(labels))} {value}")
+    return "\n".join(lines) + "\n"
+
+def max_rss_bytes() -> Optional[int]:
+    """Pico de memória residente do processo (None onde não há o módulo resource)"""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KiB; macOS em bytes
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+def process_stats(startup_seconds: Optional[float]) -> Dict:
+    return {
+        "startup_seconds": startup_seconds,
+        "max_rss_bytes": max_rss_bytes(),
+        "loaded_modules": len(sys.modules)
+    }
@@ -0,0 +1,91 @@
+from typing import Dict, List, Set, Tuple
+import datetime
+from pydantic import ValidationError
+from models.schemas import TravelPlan, ActivityRecommendation, Activity
+
+PATCH_OPERATIONS = ("add_activity", "remove_activity", "replace_activity", "update_reasons")
+
+class PlanPatchError(Exception):
+    """Erro ao aplicar um patch de modificação ao plano"""
+    pass
+
+def apply_plan_patch(plan: TravelPlan, operations: List[Dict]) -> Tuple[TravelPlan, Set[datetime.date]]:
+    """Aplica operações de modificação a uma cópia do plano.
+
+    Retorna o novo plano e o conjunto de datas alteradas. O custo total é
+    ajustado pela diferença de preço das atividades adicionadas e removidas.
+    Qualquer operação inválida interrompe a aplicação com PlanPatchError.
+    """
+    if not isinstance(operations, list) or not operations:
+        raise PlanPatchError("Patch sem operações")
+
+    new_plan = plan.model_copy(deep=True)
+    days_by_date = {day.date: day for day in new_plan.itinerary_days}
+    changed_dates: Set[datetime.date] = set()
+    cost_delta = 0
+
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict):
+            raise PlanPatchError(f"Operação {index} inválida")
+
+        op = operation.get("op")
+        if op not in PATCH_OPERATIONS:
+            raise PlanPatchError(f"Operação desconhecida: {op}")
+
+        try:
+            date = datetime.date.fromisoformat(str(operation.get("date")))
+        except ValueError:
+            raise PlanPatchError(f"Data inválida na operação {index}: {operation.get('date')}")
+
+        day = days_by_date.get(date)
+        if day is None:
+            raise PlanPatchError(f"Data fora do itinerário: {date}")
+
+        if op == "add_activity":
+            recommendation = _build_recommendation(operation)
+            day.activity_recommendations.append(recommendation)
+            cost_delta += recommendation.activity.price
+        else:
+            position = _find_activity(day.activity_recommendations, operation.get("activity_id"))
+            current = day.activity_recommendations[position]
+
+            if op == "remove_activity":
+                day.activity_recommendations.pop(position)
+                cost_delta -= current.activity.price
+            elif op == "replace_activity":
+                recommendation = _build_recommendation(operation)
+                day.activity_recommendations[position] = recommendation
+                cost_delta += recommendation.activity.price - current.activity.price
+            else:
+                current.reasons_for_recommendation = _reasons(operation)
+
+        changed_dates.add(date)
+
+    new_plan.total_cost = plan.total_cost + cost_delta
+    return new_plan, changed_dates
+
+def _find_activity(recommendations: List[ActivityRecommendation], activity_id: str) -> int:
+    for position, recommendation in enumerate(recommendations):
+        if recommendation.activity.activity_id == activity_id:
+            return position
+    raise PlanPatchError(f"Atividade não encontrada: {activity_id}")
+
+def _reasons(operation: Dict) -> List[str]:
+    """Motivos da operação: um texto isolado vira lista de um item; outros tipos invalidam o patch"""
+    reasons = operation.get("reasons")
+    if reasons is None:
+        return []
+    if isinstance(reasons, str):
+        return [reasons] if reasons.strip() else []
+    if not isinstance(reasons, list) or not all(isinstance(reason, str) for reason in reasons):
+        raise PlanPatchError(f"Motivos inválidos: {reasons!r}")
+    return list(reasons)
+
+def _build_recommendation(operation: Dict) -> ActivityRecommendation:
+    try:
+        return ActivityRecommendation(
+            activity=Activity.model_validate(operation.get("activity")),
+            reasons_for_recommendation=_reasons(operation)
+        )
+    except ValidationError as e:
+        raise PlanPatchError(f"Atividade inválida: {e}")
@@ -0,0 +1,55 @@
+import textwrap
+import threading
+from typing import Dict, List
+from models.schemas import Interest
+
+# Vocabulário de interesses aceito pelos modelos, derivado do enum Interest
+INTEREST_VOCABULARY = tuple(interest.value for interest in Interest)
+
+_templates: Dict[str, "PromptTemplate"] = {}
+_templates_lock = threading.Lock()
+
+def estimate_prompt_tokens(text: str) -> int:
+    """Mesma estimativa do limitador de cota: ~4 caracteres por token"""
+    return len(text) // 4
+
+class PromptTemplate:
+    """Prompt com prefixo estático pré-compilado e sufixo preenchido por requisição.
+
+    O prefixo (instruções, schemas e vocabulário) é montado uma única vez, no
+    import, e vem sempre antes do contexto da requisição: assim o cache de
+    prompt dos provedores, que reaproveita prefixos idênticos, pode acertar.
+    O sufixo usa a sintaxe de str.format.
+    """
+
+    def __init__(self, name: str, prefix: str, suffix: str = ""):
+        self.name = name
+        self.prefix = textwrap.dedent(prefix).strip()
+        self.suffix = textwrap.dedent(suffix).strip()
+        self.prefix_tokens = estimate_prompt_tokens(self.prefix)
+        with _templates_lock:
+            _templates[name] = self
+
+    def render_suffix(self, **values) -> str:
+        return self.suffix.format(**values)
+
+    def render(self, **values) -> str:
+        """Prefixo estático seguido do sufixo preenchido, em um único texto"""
+        suffix = self.render_suffix(**values)
+        return f"{self.prefix}\n\n{suffix}" if suffix else self.prefix
+
+    def messages(self, **values) -> List[Dict]:
+        """Prefixo como mensagem de sistema e sufixo preenchido como mensagem do usuário"""
+        return [
+            {"role": "system", "content": self.prefix},
+            {"role": "user", "content": self.render_suffix(**values)}
+        ]
+
+def prompt_template_stats() -> Dict[str, Dict]:
+    """Tamanho do prefixo cacheável de cada template"""
+    with _templates_lock:
+        templates = dict(_templates)
+    return {
+        name: {"prefix_chars": len(template.prefix), "prefix_tokens": template.prefix_tokens}
+        for name, template in sorted(templates.items())
+    }
@@ -0,0 +1,238 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import math
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from utils.metrics import LLM_RATE_LIMITED
+
+# Ordem de atendimento na fila de cada modelo (menor passa na frente)
+PRIORITIES = {"interactive": 0, "default": 1, "bulk": 2}
+
+_priority: contextvars.ContextVar = contextvars.ContextVar("llm_priority", default="default")
+
+class RateLimitExceeded(Exception):
+    """Chamada recusada por cota: pelo limitador local (espera longa demais) ou pelo provedor (HTTP 429)"""
+
+    def __init__(self, provider: str, model: str, retry_after: float, upstream: bool = False):
+        if upstream:
+            message = f"O {provider} recusou a chamada ao {model} por limite de cota, tente novamente em instantes"
+        else:
+            message = f"Limite de chamadas ao {provider} ({model}) atingido, tente novamente em instantes"
+        super().__init__(message)
+        self.provider = provider
+        self.model = model
+        self.upstream = upstream
+        self.retry_after = max(1, math.ceil(retry_after))
+
+@contextmanager
+def llm_priority(priority: str):
+    """Define a prioridade das chamadas aos LLMs feitas no contexto atual (interactive, default ou bulk)"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def current_priority() -> str:
+    return _priority.get()
+
+def estimate_tokens(prompt: str, completion_tokens: Optional[int] = None) -> int:
+    """Estimativa de tokens de uma chamada: ~4 caracteres por token no prompt mais a resposta esperada"""
+    expected_completion = completion_tokens or int(os.getenv("LLM_ESTIMATED_COMPLETION_TOKENS", "1000"))
+    return len(prompt) // 4 + expected_completion
+
+class TokenBucket:
+    """Balde de fichas recarregado continuamente, com capacidade de um minuto de cota"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60
+        self.available = float(per_minute)
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Segundos até haver amount fichas disponíveis"""
+        missing = amount - self.available
+        return 0.0 if missing <= 0 else missing / self.rate
+
+class LLMRateLimiter:
+    """Limita as chamadas a um modelo por requisições e tokens por minuto.
+
+    As chamadas aguardam em uma fila de prioridade e só a primeira da fila
+    consome as fichas, então chamadas interativas passam à frente das
+    chamadas em lote. Se a espera estimada passar de max_wait_seconds, ou a
+    fila já tiver max_waiting chamadas, a chamada é recusada na hora com
+    RateLimitExceeded em vez de bloquear mais uma thread.
+    """
+
+    def __init__(self, provider: str, model: str, rpm: int = 0, tpm: int = 0,
+                 max_wait_seconds: float = 10, max_waiting: int = 50):
+        self.provider = provider
+        self.model = model
+        self.max_wait_seconds = max_wait_seconds
+        self.max_waiting = max_waiting
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self._cond = threading.Condition()
+        self._queue: List[List] = []
+        self._sequence = itertools.count()
+        self.admitted = 0
+        self.rejected = 0
+
+    def acquire(self, tokens: int, priority: Optional[str] = None):
+        """Aguarda a vez e a cota da chamada, ou levanta RateLimitExceeded"""
+        entry = self._enter(tokens, priority)
+        with self._cond:
+            while True:
+                wait = self._try_take(entry)
+                if wait == 0:
+                    return
+                until_deadline = max(0.0, entry[3] - time.monotonic())
+                self._cond.wait(timeout=min(wait, until_deadline) if wait is not None else until_deadline)
+
+    async def aacquire(self, tokens: int, priority: Optional[str] = None):
+        """Versão de acquire que aguarda no event loop"""
+        entry = self._enter(tokens, priority)
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try_take(entry)
+                if wait == 0:
+                    return
+                await asyncio.sleep(min(wait if wait is not None else 0.05, 0.25))
+        except asyncio.CancelledError:
+            with self._cond:
+                self._leave(entry)
+            raise
+
+    def settle(self, estimated_tokens: int, actual_tokens: Optional[int]):
+        """Corrige o balde de tokens com o consumo informado pela API"""
+        if self.tokens is None or not actual_tokens:
+            return
+        with self._cond:
+            self.tokens.refill(time.monotonic())
+            self.tokens.available = min(self.tokens.capacity, self.tokens.available - (actual_tokens - estimated_tokens))
+            self._cond.notify_all()
+
+    def _enter(self, tokens: int, priority: Optional[str]) -> List:
+        """Controle de admissão: entra na fila ou recusa com o tempo sugerido para nova tentativa"""
+        rank = PRIORITIES.get(priority or current_priority(), PRIORITIES["default"])
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            ahead = [queued for queued in self._queue if queued[0] <= rank]
+            wait = self._wait_time(sum(queued[2] for queued in ahead) + tokens, len(ahead) + 1)
+            if len(self._queue) >= self.max_waiting or wait > self.max_wait_seconds:
+                self._reject()
+                raise RateLimitExceeded(self.provider, self.model, wait)
+            # Prazo com margem para chamadas de maior prioridade que cheguem depois
+            entry = [rank, next(self._sequence), tokens, now + 2 * self.max_wait_seconds]
+            heapq.heappush(self._queue, entry)
+            return entry
+
+    def _try_take(self, entry: List) -> Optional[float]:
+        """Consome a cota se a chamada for a primeira da fila; senão retorna quanto esperar (None: aguardar a vez)"""
+        now = time.monotonic()
+        if now > entry[3]:
+            # Passou do prazo (ex.: chamadas de maior prioridade chegaram depois): desiste
+            self._leave(entry)
+            self._reject()
+            raise RateLimitExceeded(self.provider, self.model, self._wait_time(entry[2], 1))
+        if self._queue[0] is not entry:
+            return None
+
+        self._refill(now)
+        # Uma chamada maior que a cota de um minuto só precisa do balde cheio
+        tokens = min(entry[2], self.tokens.capacity) if self.tokens else 0
+        wait = self._wait_time(tokens, 1)
+        if wait > 0:
+            return wait
+
+        if self.requests:
+            self.requests.available -= 1
+        if self.tokens:
+            self.tokens.available -= tokens
+        heapq.heappop(self._queue)
+        self.admitted += 1
+        self._cond.notify_all()
+        return 0
+
+    def _reject(self):
+        self.rejected += 1
+        LLM_RATE_LIMITED.inc(provider=self.provider, model=self.model)
+
+    def _leave(self, entry: List):
+        if entry in self._queue:
+            self._queue.remove(entry)
+            heapq.heapify(self._queue)
+        self._cond.notify_all()
+
+    def _refill(self, now: float):
+        for bucket in (self.requests, self.tokens):
+            if bucket:
+                bucket.refill(now)
+
+    def _wait_time(self, tokens: float, requests: int) -> float:
+        waits = [0.0]
+        if self.requests:
+            waits.append(self.requests.wait_time(requests))
+        if self.tokens:
+            waits.append(self.tokens.wait_time(tokens))
+        return max(waits)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            self._refill(time.monotonic())
+            return {
+                "rpm": self.requests.capacity if self.requests else None,
+                "tpm": self.tokens.capacity if self.tokens else None,
+                "available_requests": round(self.requests.available, 1) if self.requests else None,
+                "available_tokens": round(self.tokens.available) if self.tokens else None,
+                "waiting": len(self._queue),
+                "admitted": self.admitted,
+                "rejected": self.rejected
+            }
+
+_limiters: Dict[str, Optional[LLMRateLimiter]] = {}
+_limiters_lock = threading.Lock()
+
+def _model_limit(provider: str, model: str, kind: str) -> int:
+    """{PROVIDER}_{MODEL}_{RPM|TPM} (ex.: OPENAI_GPT_4O_MINI_RPM), com {PROVIDER}_{RPM|TPM} como padrão"""
+    model_key = re.sub(r"[^A-Z0-9]+", "_", model.upper()).strip("_")
+    value = os.getenv(f"{provider.upper()}_{model_key}_{kind}", "")
+    if not value:
+        value = os.getenv(f"{provider.upper()}_{kind}", "0")
+    return int(value)
+
+def get_rate_limiter(provider: str, model: str) -> Optional[LLMRateLimiter]:
+    """Retorna o limitador do modelo a partir dos limites por modelo ou do provedor (None se não houver limites)"""
+    key = f"{provider}:{model}"
+    with _limiters_lock:
+        if key not in _limiters:
+            rpm = _model_limit(provider, model, "RPM")
+            tpm = _model_limit(provider, model, "TPM")
+            _limiters[key] = LLMRateLimiter(
+                provider,
+                model,
+                rpm=rpm,
+                tpm=tpm,
+                max_wait_seconds=float(os.getenv("LLM_RATE_MAX_WAIT_SECONDS", "10")),
+                max_waiting=int(os.getenv("LLM_RATE_MAX_WAITING", "50"))
+            ) if rpm or tpm else None
+        return _limiters[key]
+
+def rate_limiter_stats() -> Dict[str, Dict]:
+    """Estado dos limitadores já utilizados, por provedor e modelo"""
+    with _limiters_lock:
+        limiters = {key: limiter for key, limiter in _limiters.items() if limiter is not None}
+    return {key: limiter.stats() for key, limiter in limiters.items()}
@@ -0,0 +1,141 @@
+import asyncio
+import copy
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+class SingleFlight:
+    """Agrupa chamadas idênticas simultâneas em uma única execução.
+
+    Enquanto uma chamada com a mesma chave está em andamento, as demais
+    aguardam e recebem uma cópia do mesmo resultado (ou a mesma exceção).
+    Quando há quem espere, o resultado compartilhado é uma cópia feita antes
+    da liberação: o líder pode alterar o próprio resultado sem afetar os demais.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, func: Callable, *args, **kwargs) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self.executed += 1
+            else:
+                self.coalesced += 1
+                call.followers += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        result = None
+        try:
+            result = func(*args, **kwargs)
+            return result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            # Depois de sair do mapa ninguém mais entra na chamada; a cópia é feita antes de liberar quem espera
+            try:
+                if call.followers and call.error is None:
+                    call.result = copy.deepcopy(result)
+            except Exception as e:
+                call.error = e
+            finally:
+                call.done.set()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            in_flight = len(self._calls)
+        return {"executed": self.executed, "coalesced": self.coalesced, "in_flight": in_flight}
+
+class AsyncSingleFlight:
+    """Versão do SingleFlight para corrotinas de um mesmo event loop.
+
+    Chamadas com a mesma chave aguardam o resultado da primeira, sem ocupar
+    threads enquanto esperam, e recebem cópias de um resultado que o líder
+    não compartilha.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self._followers: Dict[Hashable, int] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, func: Callable[..., Awaitable], *args, **kwargs) -> Any:
+        call = self._calls.get(key)
+        if call is not None:
+            self.coalesced += 1
+            self._followers[key] = self._followers.get(key, 0) + 1
+            # shield: o cancelamento de quem espera não cancela a chamada compartilhada
+            return copy.deepcopy(await asyncio.shield(call))
+
+        self.executed += 1
+        call = asyncio.get_running_loop().create_future()
+        self._calls[key] = call
+        try:
+            result = await func(*args, **kwargs)
+            call.set_result(copy.deepcopy(result) if self._followers.get(key) else result)
+            return result
+        except Exception as e:
+            call.set_exception(e)
+            # Marca a exceção como consumida quando ninguém mais estiver esperando
+            call.exception()
+            raise
+        except BaseException:
+            call.cancel()
+            raise
+        finally:
+            del self._calls[key]
+            self._followers.pop(key, None)
+
+    def stats(self) -> Dict:
+        return {"executed": self.executed, "coalesced": self.coalesced, "in_flight": len(self._calls)}
+
+_groups: Dict[str, SingleFlight] = {}
+_groups_lock = threading.Lock()
+
+def get_singleflight(name: str) -> SingleFlight:
+    """Retorna o grupo de coalescência compartilhado com o nome informado"""
+    with _groups_lock:
+        group = _groups.get(name)
+        if group is None:
+            group = SingleFlight(name)
+            _groups[name] = group
+        return group
+
+def get_async_singleflight(name: str) -> AsyncSingleFlight:
+    """Retorna o grupo de coalescência assíncrono (aparece como "<name>:async" nas estatísticas)"""
+    with _groups_lock:
+        group = _groups.get(f"{name}:async")
+        if group is None:
+            group = AsyncSingleFlight(f"{name}:async")
+            _groups[group.name] = group
+        return group
+
+def singleflight_stats() -> Dict[str, Dict]:
+    """Contadores de chamadas executadas e coalescidas de todos os grupos"""
+    with _groups_lock:
+        groups = list(_groups.values())
+    return {group.name: group.stats() for group in groups}
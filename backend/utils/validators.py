@@ -1,4 +1,4 @@
-from typing import List
+from typing import Iterable, List, Optional
 from datetime import date, datetime
 from models.schemas import  VacationInfo, TravelPlan, Interest
 
@@ -64,6 +64,79 @@ class TripValidator:
         
         return errors
 
+    @staticmethod
+    def validate_itinerary_days(travel_plan: TravelPlan, dates: Iterable[date],
+                                vacation_info: Optional[VacationInfo] = None,
+                                previous_cost: Optional[float] = None) -> List[str]:
+        """Valida apenas os dias informados do plano (usado após modificações).
+
+        previous_cost é o custo do plano antes da modificação: se ele já
+        excedia o orçamento, a modificação só é recusada quando aumenta o custo.
+        """
+        errors = []
+        days_by_date = {day.date: day for day in travel_plan.itinerary_days}
+        
+        for day_date in sorted(dates):
+            day = days_by_date.get(day_date)
+            if day is None:
+                errors.append(f"Dia {day_date} não existe no plano")
+                continue
+            
+            if not day.activity_recommendations:
+                errors.append(f"Dia {day_date} deve ter pelo menos uma atividade")
+            
+            activities = sorted(
+                (rec.activity for rec in day.activity_recommendations),
+                key=lambda activity: activity.start_time
+            )
+            for activity in activities:
+                if activity.start_time.date() != day_date:
+                    errors.append(f"Atividade {activity.activity_id} não acontece em {day_date}")
+                if activity.end_time <= activity.start_time:
+                    errors.append(f"Atividade {activity.activity_id} termina antes de começar")
+            
+            for previous, current in zip(activities, activities[1:]):
+                if current.start_time < previous.end_time:
+                    errors.append(
+                        f"Atividades {previous.activity_id} e {current.activity_id} se sobrepõem em {day_date}"
+                    )
+        
+        # Validar orçamento
+        if vacation_info and travel_plan.total_cost > vacation_info.budget:
+            if previous_cost is None or previous_cost <= vacation_info.budget:
+                errors.append(f"Custo total ({travel_plan.total_cost}) excede o orçamento ({vacation_info.budget})")
+            elif travel_plan.total_cost > previous_cost:
+                errors.append(
+                    f"Custo total ({travel_plan.total_cost}) aumentou em um plano que já excedia "
+                    f"o orçamento ({vacation_info.budget})"
+                )
+        
+        return errors
+
+    @staticmethod
+    def validate_plan_dates(travel_plan: TravelPlan, expected_dates: Iterable[date]) -> List[str]:
+        """Valida se o plano tem exatamente um dia para cada data esperada, na ordem"""
+        errors = []
+        expected = sorted(expected_dates)
+        actual = [day.date for day in travel_plan.itinerary_days]
+        
+        missing = sorted(set(expected) - set(actual))
+        extra = sorted(set(actual) - set(expected))
+        duplicated = sorted({day_date for day_date in actual if actual.count(day_date) > 1})
+        if missing:
+            errors.append(f"Dias ausentes no plano: {[day_date.isoformat() for day_date in missing]}")
+        if extra:
+            errors.append(f"Dias fora do período da viagem: {[day_date.isoformat() for day_date in extra]}")
+        if duplicated:
+            errors.append(f"Dias repetidos no plano: {[day_date.isoformat() for day_date in duplicated]}")
+        if not errors and actual != expected:
+            errors.append("Dias do plano fora de ordem")
+        
+        if expected and (travel_plan.start_date != expected[0] or travel_plan.end_date != expected[-1]):
+            errors.append("Datas de início e fim do plano não coincidem com o período da viagem")
+        
+        return errors
+
     @staticmethod
     def validate_budget_distribution(travel_plan: TravelPlan, max_daily_budget: int = None) -> List[str]:
         """Valida a distribuição do orçamento ao longo dos dias"""
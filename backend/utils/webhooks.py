@@ -0,0 +1,167 @@
+import ipaddress
+import os
+import random
+import socket
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from utils.http_client import RETRY_STATUS_CODES, CircuitBreaker
+
+class InvalidCallbackURL(ValueError):
+    """callback_url recusado: esquema, host ou endereço não permitido"""
+    pass
+
+def _allowed_hosts() -> List[str]:
+    return [host.strip().lower() for host in os.getenv("WEBHOOK_ALLOWED_HOSTS", "").split(",") if host.strip()]
+
+def _is_public_address(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+def validate_callback_url(url: str) -> str:
+    """Valida o callback_url e retorna seu host; levanta InvalidCallbackURL se não for permitido.
+
+    Só aceita https (http apenas com WEBHOOK_ALLOW_HTTP=true), hosts da lista
+    WEBHOOK_ALLOWED_HOSTS quando ela estiver definida (o próprio host ou um
+    subdomínio) e hosts que resolvem apenas para endereços públicos: loopback,
+    redes privadas, link-local (metadados de nuvem) e reservados são
+    recusados, a menos que WEBHOOK_ALLOW_PRIVATE_NETWORKS=true.
+    """
+    if not isinstance(url, str):
+        raise InvalidCallbackURL("callback_url deve ser uma URL")
+
+    parts = urlsplit(url.strip())
+    allowed_schemes = ("https", "http") if os.getenv("WEBHOOK_ALLOW_HTTP", "false").lower() == "true" else ("https",)
+    if parts.scheme.lower() not in allowed_schemes:
+        raise InvalidCallbackURL(f"callback_url deve usar {' ou '.join(allowed_schemes)}")
+    if parts.username or parts.password:
+        raise InvalidCallbackURL("callback_url não pode conter credenciais")
+
+    host = (parts.hostname or "").rstrip(".").lower()
+    if not host:
+        raise InvalidCallbackURL("callback_url sem host")
+
+    allowed_hosts = _allowed_hosts()
+    if allowed_hosts and not any(host == allowed or host.endswith("." + allowed) for allowed in allowed_hosts):
+        raise InvalidCallbackURL(f"Host do callback_url não permitido: {host}")
+
+    if os.getenv("WEBHOOK_ALLOW_PRIVATE_NETWORKS", "false").lower() == "true":
+        return host
+
+    try:
+        port = parts.port or (443 if parts.scheme.lower() == "https" else 80)
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)}
+    except (socket.gaierror, ValueError) as e:
+        raise InvalidCallbackURL(f"Host do callback_url não resolvido: {host}") from e
+
+    if not addresses or not all(_is_public_address(address) for address in addresses):
+        raise InvalidCallbackURL(f"callback_url aponta para um endereço não público: {host}")
+    return host
+
+class WebhookNotifier:
+    """Envia os callbacks dos jobs em um pool próprio, com um disjuntor por host.
+
+    As novas tentativas e a espera por hosts lentos ficam fora do pool de
+    workers dos jobs, e um host de callback fora do ar só abre o próprio
+    circuito. A URL é validada de novo no envio, já que o DNS pode ter mudado
+    desde o enfileiramento. Redirecionamentos não são seguidos.
+    """
+
+    def __init__(self, max_workers: int = 2, max_hosts: int = 256, connect_timeout: float = 3.05,
+                 read_timeout: float = 10, max_retries: int = 2, backoff_base: float = 0.5,
+                 backoff_max: float = 5.0, failure_threshold: int = 5, recovery_seconds: float = 60):
+        self.max_hosts = max_hosts
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self._breakers: "OrderedDict[str, CircuitBreaker]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="webhooks")
+        self.sent = 0
+        self.failed = 0
+        self.rejected = 0
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @classmethod
+    def from_env(cls) -> "WebhookNotifier":
+        return cls(
+            max_workers=int(os.getenv("WEBHOOK_WORKERS", "2")),
+            read_timeout=float(os.getenv("WEBHOOK_TIMEOUT_SECONDS", "10")),
+            max_retries=int(os.getenv("WEBHOOK_MAX_RETRIES", "2")),
+            failure_threshold=int(os.getenv("HTTP_CIRCUIT_FAILURE_THRESHOLD", "5")),
+            recovery_seconds=float(os.getenv("WEBHOOK_CIRCUIT_RECOVERY_SECONDS", "60"))
+        )
+
+    def send(self, url: str, payload: Dict, label: str = ""):
+        """Agenda o POST do payload para a URL e retorna imediatamente"""
+        self._executor.submit(self._deliver, url, payload, label)
+
+    def _breaker(self, host: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = CircuitBreaker(self.failure_threshold, self.recovery_seconds)
+                self._breakers[host] = breaker
+                while len(self._breakers) > self.max_hosts:
+                    self._breakers.popitem(last=False)
+            else:
+                self._breakers.move_to_end(host)
+            return breaker
+
+    def _deliver(self, url: str, payload: Dict, label: str):
+        try:
+            host = validate_callback_url(url)
+        except InvalidCallbackURL as e:
+            print(f"Erro ao notificar callback {label}: {e}")
+            self._count("rejected")
+            return
+
+        breaker = self._breaker(host)
+        if not breaker.allow_request():
+            print(f"Erro ao notificar callback {label}: circuito aberto para {host}")
+            self._count("rejected")
+            return
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.post(url, json=payload, timeout=self.timeout, allow_redirects=False)
+                if response.status_code not in RETRY_STATUS_CODES:
+                    breaker.record_success()
+                    self._count("sent")
+                    return
+                error = f"HTTP {response.status_code}"
+            except requests.RequestException as e:
+                error = str(e)
+
+            if attempt < self.max_retries:
+                time.sleep(random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt))))
+
+        breaker.record_failure()
+        self._count("failed")
+        print(f"Erro ao notificar callback {label}: {error}")
+
+    def _count(self, outcome: str):
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            breakers = list(self._breakers.values())
+            stats = {"sent": self.sent, "failed": self.failed, "rejected": self.rejected}
+        stats["hosts"] = len(breakers)
+        stats["open_circuits"] = sum(1 for breaker in breakers if breaker.state != "closed")
+        return stats
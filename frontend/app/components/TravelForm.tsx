@@ -1,6 +1,6 @@
 'use client'
 import { useState } from 'react'
-import { generateItinerary } from '../services/api'
+import { streamItinerary } from '../services/api'
 
 interface TravelFormProps {
   onItineraryGenerated: (itinerary: any) => void
@@ -16,6 +16,7 @@ export default function TravelForm({ onItineraryGenerated, loading, setLoading }
     date_of_departure: '',
     budget: ''
   })
+  const [progress, setProgress] = useState('')
 
   const interestsMap: { [key: string]: string } = {
     'arte': 'art',
@@ -35,6 +36,7 @@ export default function TravelForm({ onItineraryGenerated, loading, setLoading }
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault()
     setLoading(true)
+    setProgress('Buscando clima e atividades...')
     
     try {
       const processedData = {
@@ -47,12 +49,22 @@ export default function TravelForm({ onItineraryGenerated, loading, setLoading }
         budget: parseInt(formData.budget)
       }
       
-      const result = await generateItinerary(processedData)
+      let daysReady = 0
+      const result = await streamItinerary(processedData, {
+        onProgress: (event) => {
+          if (event.source === 'itinerary') setProgress('Montando o itinerário...')
+        },
+        onDay: () => {
+          daysReady += 1
+          setProgress(`Montando o itinerário... ${daysReady} dia(s) pronto(s)`)
+        }
+      })
       onItineraryGenerated(result)
     } catch (error) {
       alert('Erro ao gerar itinerário: ' + error)
     } finally {
       setLoading(false)
+      setProgress('')
     }
   }
 
@@ -179,6 +191,9 @@ export default function TravelForm({ onItineraryGenerated, loading, setLoading }
       >
         {loading ? 'Gerando Itinerário...' : 'Gerar Itinerário'}
       </button>
+      {loading && progress && (
+        <p className="text-center mt-2 mb-0 small">{progress}</p>
+      )}
     </form>
   )
 }
@@ -37,3 +37,53 @@ export const getTripHistory = async () => {
     throw new Error(error.response?.data?.error || 'Erro ao buscar histórico')
   }
 }
+
+export interface StreamHandlers {
+  onProgress?: (progress: any) => void
+  onToken?: (text: string) => void
+  onDay?: (day: any) => void
+}
+
+// Gera o itinerário via Server-Sent Events, repassando o progresso aos handlers.
+// Resolve com o evento final "plan" (mesmo formato de generateItinerary).
+export const streamItinerary = async (vacationData: any, handlers: StreamHandlers = {}) => {
+  const response = await fetch(`${API_BASE_URL}/api/generate-itinerary/stream`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(vacationData),
+  })
+
+  if (!response.ok || !response.body) {
+    const data = await response.json().catch(() => ({}))
+    throw new Error(data.error || 'Erro ao gerar itinerário')
+  }
+
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+
+  while (true) {
+    const { done, value } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+
+    let separatorIndex
+    while ((separatorIndex = buffer.indexOf('\n\n')) !== -1) {
+      const rawEvent = buffer.slice(0, separatorIndex)
+      buffer = buffer.slice(separatorIndex + 2)
+
+      const eventName = rawEvent.match(/^event: (.*)$/m)?.[1]
+      const dataLine = rawEvent.match(/^data: (.*)$/m)?.[1]
+      if (!eventName || !dataLine) continue
+      const data = JSON.parse(dataLine)
+
+      if (eventName === 'progress') handlers.onProgress?.(data)
+      else if (eventName === 'token') handlers.onToken?.(data.text)
+      else if (eventName === 'day') handlers.onDay?.(data)
+      else if (eventName === 'plan') return data
+      else if (eventName === 'error') throw new Error(data.error || 'Erro ao gerar itinerário')
+    }
+  }
+
+  throw new Error('Conexão encerrada antes do itinerário ser concluído')
+}